@@ -0,0 +1,261 @@
+"""
+Runs the operations of the admin API as jobs in a background thread, so a request that starts one
+ returns right away with the ID of the job to follow it with.
+
+The jobs are stored in a database shared by the worker processes of the production server, so the
+ status of a job can be requested from any of them. Every job writes its output to a log file of
+ its own, which is read from a byte offset in chunks of at most JOB_LOG_CHUNK_BYTES, so following
+ a job never loads more of its log than the chunk that is requested.
+"""
+
+import codecs
+import concurrent.futures
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import IO, Callable, Dict, List, Optional
+
+import uuid6
+
+from constants import (
+    APP_DATA_DIR,
+    JOB_LOG_CHUNK_BYTES,
+    LOG_FOLDER,
+    MAIN_FOLDER,
+    datetime_now_local,
+)
+
+JOBS_DATABASE = APP_DATA_DIR / "jobs.sqlite3"
+JOB_LOG_FOLDER = LOG_FOLDER / "jobs"
+# The log of every git pull, appended to after each git-pull job.
+GIT_PULL_LOG = LOG_FOLDER / "gitpull.log"
+UNFINISHED_STATUSES = ("queued", "running")
+# The most bytes a UTF-8 character takes, a part of a log is never shorter so it always holds a
+#  whole character.
+MAX_CHARACTER_BYTES = 4
+
+with sqlite3.connect(JOBS_DATABASE) as _connection:
+    _cursor = _connection.cursor()
+    _cursor.execute("PRAGMA journal_mode=WAL")
+    _cursor.execute(
+        "CREATE TABLE IF NOT EXISTS [job] ([jobId] TEXT PRIMARY KEY, [operation] TEXT NOT NULL, \
+[status] TEXT NOT NULL, [created] REAL NOT NULL, [started] REAL, [finished] REAL, \
+[returnCode] INTEGER)"
+    )
+    _cursor.execute("CREATE INDEX IF NOT EXISTS [jobCreated] ON [job] ([created])")
+    _connection.commit()
+    _cursor.close()
+# Connections must not be inherited by the forked worker processes of the production server.
+_connection.close()
+
+_local = threading.local()
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns the connection to the jobs database of the current thread, opening it on first use.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(JOBS_DATABASE, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA synchronous=NORMAL")
+        _local.connection = connection
+    return connection
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    Returns the thread that runs the jobs one at a time, creating it on first use.
+    It's created lazily so the worker processes of the production server each start their own
+     thread after they are forked.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="admin-job")
+        return _executor
+
+
+def interrupt_unfinished_jobs() -> int:
+    """
+    Marks the jobs that were queued or running when the admin API stopped as interrupted, since
+     they will never finish. Has to be called once when the admin API starts, before it serves
+     any request.
+    Returns the number of jobs that were interrupted.
+    """
+    with sqlite3.connect(JOBS_DATABASE) as connection:
+        cursor = connection.execute(
+            "UPDATE [job] SET [status] = 'interrupted', [finished] = ? \
+WHERE [status] IN ('queued', 'running')",
+            (time.time(),),
+        )
+        interrupted = cursor.rowcount
+    connection.close()
+    return interrupted
+
+
+def log_path(job_id: str) -> Path:
+    """
+    Returns the path of the log file of a job.
+    """
+    return JOB_LOG_FOLDER / f"{job_id}.log"
+
+
+def git_pull(log_file: IO[bytes]) -> int:
+    """
+    Performs a git pull and writes its output with an isoformat datetime to the log of the job,
+     then appends it to the log of every git pull.
+    Returns the exit code of git.
+    """
+    log_file.write(f"{datetime_now_local().replace(microsecond=0).isoformat()}\n".encode())
+    log_file.flush()
+    return_code = subprocess.call(
+        ["git", "-C", str(MAIN_FOLDER.absolute()), "pull"],
+        stdin=subprocess.DEVNULL,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+    )
+    log_file.flush()
+    with open(log_file.name, "rb") as job_log, open(GIT_PULL_LOG, "ab") as git_pull_log:
+        shutil.copyfileobj(job_log, git_pull_log)
+    return return_code
+
+
+# The operations that can be run as a job, each writes its output to the log file it's given and
+#  returns an exit code that is 0 on success.
+OPERATIONS: Dict[str, Callable[[IO[bytes]], int]] = {"git-pull": git_pull}
+
+
+def to_dict(row: sqlite3.Row) -> dict:
+    """
+    Returns a job as it's returned by the admin API.
+    """
+    return {
+        "jobId": row["jobId"],
+        "operation": row["operation"],
+        "status": row["status"],
+        "created": row["created"],
+        "started": row["started"],
+        "finished": row["finished"],
+        "returnCode": row["returnCode"],
+    }
+
+
+def run_job(job_id: str, operation: str) -> None:
+    """
+    Runs an operation as a job, recording its status and writing its output and any exception it
+     raises to the log of the job.
+    """
+    connection = get_connection()
+    connection.execute(
+        "UPDATE [job] SET [status] = 'running', [started] = ? WHERE [jobId] = ?",
+        (time.time(), job_id),
+    )
+    return_code = None
+    with open(log_path(job_id), "ab") as log_file:
+        try:
+            return_code = OPERATIONS[operation](log_file)
+        except Exception:
+            log_file.write(traceback.format_exc().encode())
+    connection.execute(
+        "UPDATE [job] SET [status] = ?, [finished] = ?, [returnCode] = ? WHERE [jobId] = ?",
+        (
+            "succeeded" if return_code == 0 else "failed",
+            time.time(),
+            return_code,
+            job_id,
+        ),
+    )
+
+
+def submit_job(operation: str) -> dict:
+    """
+    Starts an operation as a job and returns it, without waiting for it to finish.
+    An operation runs once at a time, if it's already queued or running that job is returned.
+    """
+    connection = get_connection()
+    # The immediate transaction keeps the worker processes from both starting the operation.
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            "SELECT * FROM [job] WHERE [operation] = ? AND [status] IN ('queued', 'running')",
+            (operation,),
+        ).fetchone()
+        if row is not None:
+            connection.execute("COMMIT")
+            return to_dict(row)
+        job_id = str(uuid6.uuid7())
+        JOB_LOG_FOLDER.mkdir(exist_ok=True, parents=True)
+        log_path(job_id).touch()
+        connection.execute(
+            "INSERT INTO [job] ([jobId], [operation], [status], [created]) \
+VALUES (?, ?, 'queued', ?)",
+            (job_id, operation, time.time()),
+        )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    get_executor().submit(run_job, job_id, operation)
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Returns a job, or None if it doesn't exist.
+    """
+    row = (
+        get_connection()
+        .execute("SELECT * FROM [job] WHERE [jobId] = ?", (job_id,))
+        .fetchone()
+    )
+    return None if row is None else to_dict(row)
+
+
+def get_jobs(limit: int = 100) -> List[dict]:
+    """
+    Returns the most recently created jobs, newest first.
+    """
+    return [
+        to_dict(row)
+        for row in get_connection().execute(
+            "SELECT * FROM [job] ORDER BY [created] DESC LIMIT ?", (limit,)
+        )
+    ]
+
+
+def read_log(job: dict, offset: int = 0, limit: int = JOB_LOG_CHUNK_BYTES) -> dict:
+    """
+    Returns the part of the log of a job from a byte offset, of at most limit bytes, with the
+     offset to request the next part from and whether the log is complete.
+    A character split by the end of the part is returned with the next part. The limit is raised to
+     MAX_CHARACTER_BYTES if it's lower, so every part up to the end of the log holds at least one
+     character and following the log always advances.
+    """
+    limit = max(min(limit, JOB_LOG_CHUNK_BYTES), MAX_CHARACTER_BYTES)
+    with open(log_path(job["jobId"]), "rb") as log_file:
+        size = log_file.seek(0, 2)
+        log_file.seek(min(offset, size))
+        chunk = log_file.read(limit)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    next_offset = min(offset, size) + len(chunk)
+    at_end = next_offset == size
+    finished = job["status"] not in UNFINISHED_STATUSES
+    text = decoder.decode(chunk, final=at_end and finished)
+    next_offset -= len(decoder.getstate()[0])
+    return {
+        "jobId": job["jobId"],
+        "status": job["status"],
+        "offset": offset,
+        "nextOffset": next_offset,
+        "size": size,
+        "complete": finished and next_offset == size,
+        "data": text,
+    }
@@ -2,37 +2,102 @@
 Contains the views for the Admin API.
 """
 
-import os
-import platform
-import subprocess
+from flask import Blueprint, Response, abort, jsonify, request, url_for
 
-from flask import Blueprint, Response
-
-from constants import LOG_FOLDER, MAIN_FOLDER
+from admin_api.api.jobs import OPERATIONS, get_job, get_jobs, read_log, submit_job
+from constants import JOB_LOG_CHUNK_BYTES
 
 api = Blueprint("simple_page", __name__, template_folder="templates")
-os_name = platform.system()
+
+
+def get_non_negative_int(name: str, default: int) -> int:
+    """
+    Returns a query parameter as a non-negative integer, or the default if it's missing.
+    """
+    value = request.args.get(name, default)
+    try:
+        value = int(value)
+    except ValueError:
+        abort(Response(f"Invalid value for {name}: {value}", 400))
+    if value < 0:
+        abort(Response(f"Invalid value for {name}: {value}", 400))
+    return value
+
+
+def get_existing_job(job_id: str) -> dict:
+    """
+    Returns a job, or aborts with a 404 if it doesn't exist.
+    """
+    job = get_job(job_id)
+    if job is None:
+        abort(Response(f"Unknown job: {job_id}", 404))
+    return job
+
+
+def job_response(job: dict) -> Response:
+    """
+    Returns the response to starting a job, with the location to follow its status at.
+    """
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers["Location"] = url_for(".job", job_id=job["jobId"])
+    return response
 
 
 @api.route("/git-pull")
 def git_pull():
     """
-    Perform a git pull and log the result with an isoformate datetime.
+    Starts a git pull as a job and returns the job right away, its output is logged with an
+     isoformat datetime and can be followed with GET /jobs/<jobId>/log.
     """
-    log_file_path = LOG_FOLDER / "gitpull.log"
+    return job_response(submit_job("git-pull"))
+
+
+@api.route("/jobs", methods=["GET", "POST"])
+def jobs():
+    """
+    GET returns the most recent jobs, newest first, at most ?limit= (100 by default).
+
+    POST starts an operation as a job and returns the job with status 202 without waiting for it.
+     If the operation is already queued or running, that job is returned instead.
+    Expected application/json:
+    {
+        "operation": string,
+        // Mandatory, one of: "git-pull"
+    }
+    """
+    if request.method == "GET":
+        return jsonify(get_jobs(get_non_negative_int("limit", 100)))
+
+    data = request.get_json(silent=True) or {}
+    operation = data.get("operation")
+    if operation is None:
+        return abort(Response("Missing key: operation", 400))
+    if operation not in OPERATIONS:
+        return abort(Response(f"Invalid operation: {operation}", 400))
+    return job_response(submit_job(operation))
 
-    if os_name == "Windows":
-        subprocess.call(
-            [
-                "C:\\WINDOWS\\system32\\WindowsPowerShell\\v1.0\\powershell.exe",
-                f'(Get-Date -Format s) + "`n" + (git -C "{MAIN_FOLDER.absolute()}" pull) | Add-Content "{log_file_path.relative_to(MAIN_FOLDER)}"',
-            ]
-        )
-    elif os_name == "Linux":
-        os.system(
-            f'echo "$(date -Iseconds)\n$(git -C {repr(str(MAIN_FOLDER.absolute()))} pull)" >> {repr(str(log_file_path))}'
-        )
-    else:
-        raise OSError("Unexpected Operating System")
 
-    return Response(open(log_file_path, encoding="utf-8").read(), mimetype="text/plain")
+@api.route("/jobs/<job_id>")
+def job(job_id: str):
+    """
+    Returns the status of a job: queued, running, succeeded, failed or interrupted when the admin
+     API stopped before it finished, with the exit code of its operation once it's done.
+    """
+    return jsonify(get_existing_job(job_id))
+
+
+@api.route("/jobs/<job_id>/log")
+def job_log(job_id: str):
+    """
+    Returns the part of the log of a job from byte ?offset= (0 by default), of at most ?limit=
+     bytes (and at most JOB_LOG_CHUNK_BYTES, at least 4 so a part always holds a whole character).
+     Request the next part from the nextOffset of the response, until complete is true.
+    """
+    return jsonify(
+        read_log(
+            get_existing_job(job_id),
+            get_non_negative_int("offset", 0),
+            get_non_negative_int("limit", JOB_LOG_CHUNK_BYTES),
+        )
+    )
@@ -0,0 +1,287 @@
+"""
+Benchmarks the temperature API on a generated stream: the file lookups and data reads of the
+ pagination, and the latency and throughput of POST /api/streams over HTTP, for several range
+ sizes. The results are written to a JSON file that benchmarks.compare can compare to a baseline.
+
+Run from the project root, for example:
+    python -m benchmarks.benchmark_api --days 7 --ranges 1 24 168 --output baseline.json
+
+The stream is generated in a temporary directory, and the apps' own data (file index, pagination
+ and rollup databases) goes to another one, so a benchmark never touches the real streams.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from benchmarks.generate_data import generate_stream
+
+RESULTS_FOLDER = Path(__file__).parent / "results"
+STREAM = "benchmark"
+
+
+def summarize(seconds: List[float]) -> dict:
+    """
+    Returns the number of runs and the minimum, median, mean and 95th percentile of durations.
+    """
+    seconds = sorted(seconds)
+    return {
+        "runs": len(seconds),
+        "min": seconds[0],
+        "median": statistics.median(seconds),
+        "mean": statistics.fmean(seconds),
+        "p95": seconds[min(int(len(seconds) * 0.95), len(seconds) - 1)],
+    }
+
+
+def time_calls(function: Callable[[], object], repeat: int) -> dict:
+    """
+    Times a function repeatedly. The first call, which fills the caches, is reported separately
+     from the summary of the calls after it.
+    """
+    start = time.perf_counter()
+    result = function()
+    first = time.perf_counter() - start
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return {"first": first, "seconds": summarize(seconds), "result": result}
+
+
+def benchmark_pagination(
+    end_datetime: datetime.datetime, hours: int, repeat: int, items_per_page: int
+) -> List[dict]:
+    """
+    Returns the timings of the pagination functions for a range of hours up to the end datetime.
+    """
+    from temperature_api.api.pagination import Pagination
+
+    pagination = Pagination(
+        stream=STREAM,
+        start_datetime=end_datetime - datetime.timedelta(hours=hours),
+        end_datetime=end_datetime,
+        minimum_items_per_page=items_per_page,
+    )
+    results = []
+    for name, variant, function in (
+        ("get_all_file_paths", None, pagination.get_all_file_paths),
+        ("get_file_paths_for_page", None, pagination.get_file_paths_for_page),
+        ("get_data", "string", lambda: pagination.get_data(0, value_format="string")),
+        ("get_data", "typed", lambda: pagination.get_data(0, value_format="typed")),
+        ("get_binary", None, pagination.get_binary),
+    ):
+        timing = time_calls(function, repeat)
+        result = timing.pop("result")
+        if name == "get_data":
+            timing["rows"] = len(result["data"].get("Datetime", []))
+        elif name == "get_binary":
+            timing["bytes"] = len(result)
+        else:
+            timing["files"] = len(result)
+        results.append({"name": name, "variant": variant, "rangeHours": hours, **timing})
+    return results
+
+
+def benchmark_http(
+    url: str,
+    end_datetime: datetime.datetime,
+    hours: int,
+    concurrency: int,
+    duration: float,
+    items_per_page: int,
+    value_format: str,
+) -> dict:
+    """
+    Returns the latency and throughput of concurrent clients requesting the first page of a range
+     of hours from /streams for a number of seconds.
+    """
+    import requests
+
+    body = {
+        "stream": STREAM,
+        "startDatetime": (end_datetime - datetime.timedelta(hours=hours)).isoformat(),
+        "endDatetime": end_datetime.isoformat(),
+        "minimumItemsPerPage": items_per_page,
+        "paginationMode": "cursor",
+        "valueFormat": value_format,
+    }
+
+    def client():
+        session = requests.Session()
+        seconds = []
+        errors = 0
+        response_bytes = 0
+        stop = time.perf_counter() + duration
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            response = session.post(f"{url}/streams", json=body)
+            seconds.append(time.perf_counter() - start)
+            response_bytes = len(response.content)
+            if response.status_code != 200:
+                errors += 1
+        return seconds, errors, response_bytes
+
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        clients = list(executor.map(lambda _: client(), range(concurrency)))
+    seconds = [second for client_seconds, _, _ in clients for second in client_seconds]
+    return {
+        "name": "http_streams",
+        "variant": value_format,
+        "rangeHours": hours,
+        "concurrency": concurrency,
+        "requests": len(seconds),
+        "errors": sum(errors for _, errors, _ in clients),
+        "responseBytes": clients[0][2],
+        "requestsPerSecond": len(seconds) / duration,
+        "seconds": summarize(seconds),
+    }
+
+
+def start_server() -> str:
+    """
+    Serves the temperature API with a threaded server on a free port in a daemon thread.
+    Returns the address of the API.
+    """
+    from werkzeug.serving import make_server
+
+    from temperature_api import app
+
+    # Logging every request would take a large share of the time measured.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/api"
+
+
+def main(arguments: Optional[List[str]] = None) -> dict:
+    """
+    Generates the stream, runs the benchmarks and writes the results.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the temperature API.")
+    parser.add_argument("--days", type=float, default=7, help="Days of history")
+    parser.add_argument("--interval", type=float, default=10, help="Seconds between rows")
+    parser.add_argument("--columns", type=int, default=2, help="Number of numeric columns")
+    parser.add_argument(
+        "--ranges", type=int, nargs="+", default=[1, 24, 168], help="Range sizes in hours"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per function")
+    parser.add_argument(
+        "--items-per-page",
+        type=int,
+        default=1_000_000,
+        help="minimumItemsPerPage, by default large enough to serve every range on one page",
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent HTTP clients")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per HTTP benchmark")
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Compact the closed files and roll them up before benchmarking",
+    )
+    parser.add_argument(
+        "--url",
+        help="Address of a running temperature API to send the HTTP requests to instead of a \
+server started by the benchmark. It has to be started with DATA_DIR set to --data-dir.",
+    )
+    parser.add_argument(
+        "--data-dir", type=Path, help="Directory to generate the stream in, kept afterwards"
+    )
+    parser.add_argument("--output", type=Path, help="Path of the JSON results")
+    args = parser.parse_args(arguments)
+
+    data_dir = args.data_dir or Path(tempfile.mkdtemp(prefix="loggerdash-streams-"))
+    app_data_dir = Path(tempfile.mkdtemp(prefix="loggerdash-data-"))
+    # Has to be set before constants is imported by the modules of the API.
+    os.environ["DATA_DIR"] = str(data_dir)
+    os.environ["APP_DATA_DIR"] = str(app_data_dir)
+
+    end_datetime = datetime.datetime.utcnow().replace(microsecond=0)
+    rows = generate_stream(
+        data_dir, STREAM, args.days, args.interval, args.columns, end_datetime
+    )
+    print(f"Generated {rows} rows in {data_dir / STREAM}")
+
+    try:
+        if args.compact:
+            from temperature_api.api.column_store import compact_stream
+            from temperature_api.api.rollups import get_rollups
+
+            compact_stream(STREAM)
+            get_rollups(STREAM).update()
+
+        url = args.url or start_server()
+        results = []
+        for hours in args.ranges:
+            for result in benchmark_pagination(
+                end_datetime, hours, args.repeat, args.items_per_page
+            ):
+                print(
+                    f"{result['name']} {result['variant'] or ''} {hours}h: "
+                    f"first {result['first'] * 1000:.2f} ms, "
+                    f"median {result['seconds']['median'] * 1000:.2f} ms"
+                )
+                results.append(result)
+            for value_format in ("string", "typed", "binary"):
+                result = benchmark_http(
+                    url,
+                    end_datetime,
+                    hours,
+                    args.concurrency,
+                    args.duration,
+                    args.items_per_page,
+                    value_format,
+                )
+                print(
+                    f"http_streams {value_format} {hours}h: "
+                    f"{result['requestsPerSecond']:.1f} req/s, "
+                    f"median {result['seconds']['median'] * 1000:.2f} ms"
+                )
+                results.append(result)
+    finally:
+        shutil.rmtree(app_data_dir, ignore_errors=True)
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "configuration": {
+            "days": args.days,
+            "interval": args.interval,
+            "columns": args.columns,
+            "rows": rows,
+            "repeat": args.repeat,
+            "itemsPerPage": args.items_per_page,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "compact": args.compact,
+            "url": args.url,
+        },
+        "results": results,
+    }
+    output = args.output or RESULTS_FOLDER / f"benchmark_{end_datetime:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(exist_ok=True, parents=True)
+    output.write_text(json.dumps(report, indent=4), encoding="utf-8")
+    print(f"Wrote the results to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Benchmarks the startup of the three services: the time from starting a service until it answers
+ its first request, and the duration of the first request that has to do real work after that.
+ Every service is started the way its run script starts it, in the configured server mode.
+
+The temperature API and the dashboard are measured for generated streams of several sizes, with
+ the pagination table filled with expired paginations before every start, so a startup time that
+ grows with the data shows up as a difference between the sizes. With --target the benchmark
+ fails if the median time to the first response of any service exceeds it.
+
+Run from the project root, for example:
+    python -m benchmarks.benchmark_startup --days 1 30 --paginations 100000 --target 2
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import requests
+
+from benchmarks.benchmark_api import RESULTS_FOLDER, STREAM
+from benchmarks.generate_data import generate_stream
+
+MAIN_FOLDER = Path(__file__).parent.parent
+# Per service the app, the function its run script starts in every serving process, the path that
+#  is polled until the service answers and the first request that does real work.
+SERVICES = {
+    "temperature_api": {
+        "app": "temperature_api",
+        "on_start": ("temperature_api.api.pagination", "start_expiry_sweeper"),
+        "ready_path": "/api/streams",
+        "first_request": ("POST", "/api/streams"),
+    },
+    "dashboard_app": {
+        "app": "dashboard_app",
+        "on_start": ("dashboard_app.app.views", "start_prerenderer"),
+        "ready_path": "/dashboard/client",
+        "first_request": ("GET", "/dashboard/"),
+    },
+    "admin_api": {
+        "app": "admin_api",
+        "on_start": None,
+        "ready_path": "/api/jobs",
+        "first_request": None,
+    },
+}
+
+
+def free_port() -> int:
+    """
+    Returns a port that is free at the moment.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launch_command(service: str, port: int) -> List[str]:
+    """
+    Returns the command that serves a service on a port as its run script does.
+    """
+    specification = SERVICES[service]
+    lines = [f"from {specification['app']} import app", "from serving import serve"]
+    on_start = "None"
+    if specification["on_start"] is not None:
+        module, function = specification["on_start"]
+        lines.append(f"from {module} import {function}")
+        on_start = function
+    lines.append(f"serve(app, {port}, on_start={on_start})")
+    return [sys.executable, "-c", "\n".join(lines)]
+
+
+def start_service(service: str, port: int, environment: dict) -> subprocess.Popen:
+    """
+    Starts a service in a new process group, so the worker processes can be stopped with it.
+    """
+    return subprocess.Popen(
+        launch_command(service, port),
+        cwd=MAIN_FOLDER,
+        env=environment,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def stop_service(process: subprocess.Popen) -> None:
+    """
+    Stops a service and its worker processes.
+    """
+    if process.poll() is None:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+
+
+def wait_until_ready(
+    process: subprocess.Popen, url: str, start: float, timeout: float
+) -> requests.Response:
+    """
+    Polls a URL until the service answers it with any response.
+    Raises a RuntimeError if the service exits or doesn't answer within the timeout.
+    """
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"The service exited with {process.returncode} before answering")
+        try:
+            return requests.get(url, timeout=timeout)
+        except requests.exceptions.ConnectionError:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"The service didn't answer within {timeout}s") from None
+            time.sleep(0.01)
+
+
+def fill_paginations(database: Path, count: int) -> None:
+    """
+    Stores a number of expired paginations with a typical size in the pagination table, which
+     has to exist already.
+    """
+    expires = (datetime.datetime.now() - datetime.timedelta(days=1)).timestamp()
+    pagination = json.dumps(
+        {
+            "data": [{"path": f"{STREAM}/{STREAM}_{hour}.csv", "page": 0} for hour in range(24)],
+            "metadata": {"stream": STREAM},
+        }
+    )
+    with sqlite3.connect(database) as connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO [pagination] ([paginationId], [expires], [pagination]) \
+VALUES (?, ?, ?)",
+            ((f"benchmark-{index}", expires, pagination) for index in range(count)),
+        )
+
+
+def time_startup(
+    service: str,
+    environment: dict,
+    timeout: float,
+    first_request_body: Optional[dict] = None,
+) -> dict:
+    """
+    Starts a service and returns the seconds until it answered, the status of that response and
+     the duration of its first request that does real work, then stops it.
+    """
+    specification = SERVICES[service]
+    port = free_port()
+    address = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = start_service(service, port, environment)
+    try:
+        response = wait_until_ready(
+            process, address + specification["ready_path"], start, timeout
+        )
+        result = {"seconds": time.perf_counter() - start, "status": response.status_code}
+        if specification["first_request"] is not None:
+            method, path = specification["first_request"]
+            request_start = time.perf_counter()
+            response = requests.request(
+                method, address + path, json=first_request_body, timeout=timeout
+            )
+            result["firstRequestSeconds"] = time.perf_counter() - request_start
+            result["firstRequestStatus"] = response.status_code
+        return result
+    finally:
+        stop_service(process)
+
+
+def summarize_runs(runs: List[dict]) -> dict:
+    """
+    Returns the runs with the median and maximum time to the first response and the median
+     duration of the first request.
+    """
+    seconds = [run["seconds"] for run in runs]
+    summary = {
+        "median": statistics.median(seconds),
+        "max": max(seconds),
+        "runs": runs,
+    }
+    first_request_seconds = [
+        run["firstRequestSeconds"] for run in runs if "firstRequestSeconds" in run
+    ]
+    if first_request_seconds:
+        summary["firstRequestMedian"] = statistics.median(first_request_seconds)
+    return summary
+
+
+def main(arguments: Optional[List[str]] = None) -> dict:
+    """
+    Generates the streams, times the startups and writes the results.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the startup of the services.")
+    parser.add_argument(
+        "--days", type=float, nargs="+", default=[1, 30], help="Days of history per data size"
+    )
+    parser.add_argument("--interval", type=float, default=10, help="Seconds between rows")
+    parser.add_argument(
+        "--paginations",
+        type=int,
+        default=100_000,
+        help="Expired paginations stored before every start",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Starts per service and size")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait per start")
+    parser.add_argument(
+        "--services", nargs="+", choices=list(SERVICES), default=list(SERVICES)
+    )
+    parser.add_argument(
+        "--target",
+        type=float,
+        help="Fail if the median seconds to the first response of a service exceed this",
+    )
+    parser.add_argument("--output", type=Path, help="Path of the JSON results")
+    args = parser.parse_args(arguments)
+
+    end_datetime = datetime.datetime.utcnow().replace(microsecond=0)
+    first_request_body = {
+        "stream": STREAM,
+        "startDatetime": (end_datetime - datetime.timedelta(hours=1)).isoformat(),
+        "paginationMode": "cursor",
+    }
+    results = []
+    for days in args.days:
+        data_dir = Path(tempfile.mkdtemp(prefix="loggerdash-streams-"))
+        app_data_dir = Path(tempfile.mkdtemp(prefix="loggerdash-data-"))
+        api = None
+        try:
+            rows = generate_stream(data_dir, STREAM, days, args.interval, end_datetime=end_datetime)
+            environment = dict(
+                os.environ, DATA_DIR=str(data_dir), APP_DATA_DIR=str(app_data_dir)
+            )
+            # The first start creates the databases and builds the file index, it's reported
+            #  separately from the restarts after it.
+            cold = time_startup(
+                "temperature_api", environment, args.timeout, first_request_body
+            )
+            print(
+                f"temperature_api {days} days, first start: {cold['seconds']:.3f}s, "
+                f"first request {cold['firstRequestSeconds']:.3f}s"
+            )
+            api_port = free_port()
+            for service in args.services:
+                service_environment = environment
+                if service == "dashboard_app":
+                    # The dashboard needs a running temperature API to answer.
+                    if api is None:
+                        api = start_service("temperature_api", api_port, environment)
+                        wait_until_ready(
+                            api,
+                            f"http://127.0.0.1:{api_port}/api/streams",
+                            time.perf_counter(),
+                            args.timeout,
+                        )
+                    service_environment = dict(
+                        environment,
+                        TEMPERATURE_API_ADDRESS=f"http://127.0.0.1:{api_port}/api",
+                    )
+                runs = []
+                for _ in range(args.repeat):
+                    fill_paginations(app_data_dir / "pagination.sqlite3", args.paginations)
+                    runs.append(
+                        time_startup(
+                            service, service_environment, args.timeout, first_request_body
+                        )
+                    )
+                summary = summarize_runs(runs)
+                print(
+                    f"{service} {days} days: median {summary['median']:.3f}s, "
+                    f"max {summary['max']:.3f}s"
+                    + (
+                        f", first request {summary['firstRequestMedian']:.3f}s"
+                        if "firstRequestMedian" in summary
+                        else ""
+                    )
+                )
+                results.append(
+                    {
+                        "service": service,
+                        "days": days,
+                        "rows": rows,
+                        "firstStart": cold if service == "temperature_api" else None,
+                        **summary,
+                    }
+                )
+        finally:
+            if api is not None:
+                stop_service(api)
+            shutil.rmtree(data_dir, ignore_errors=True)
+            shutil.rmtree(app_data_dir, ignore_errors=True)
+
+    failures = [
+        result
+        for result in results
+        if args.target is not None and result["median"] > args.target
+    ]
+    report = {
+        "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "configuration": {
+            "days": args.days,
+            "interval": args.interval,
+            "paginations": args.paginations,
+            "repeat": args.repeat,
+            "serverMode": os.getenv("SERVER_MODE", "development"),
+            "target": args.target,
+        },
+        "results": results,
+    }
+    output = args.output or RESULTS_FOLDER / f"startup_{end_datetime:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(exist_ok=True, parents=True)
+    output.write_text(json.dumps(report, indent=4), encoding="utf-8")
+    print(f"Wrote the results to {output}")
+    for result in failures:
+        print(
+            f"{result['service']} with {result['days']} days took {result['median']:.3f}s to "
+            f"answer, more than the target of {args.target}s"
+        )
+    if failures:
+        sys.exit(1)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares two result files of benchmarks.benchmark_api and reports the benchmarks whose median
+ duration got slower than a threshold.
+
+Run from the project root, for example:
+    python -m benchmarks.compare baseline.json current.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Tuple
+
+
+def load_medians(path: Path) -> Dict[Tuple, float]:
+    """
+    Returns the median duration of every benchmark in a result file, keyed on its name, variant,
+     range and concurrency.
+    """
+    report = json.loads(path.read_text(encoding="utf-8"))
+    return {
+        (
+            result["name"],
+            result.get("variant"),
+            result["rangeHours"],
+            result.get("concurrency"),
+        ): result["seconds"]["median"]
+        for result in report["results"]
+    }
+
+
+def compare(baseline_path: Path, current_path: Path, threshold: float) -> int:
+    """
+    Prints the median durations of both files side by side.
+    Returns the number of benchmarks that are slower than the baseline by more than the threshold,
+     a fraction of the baseline.
+    """
+    baseline = load_medians(baseline_path)
+    current = load_medians(current_path)
+    regressions = 0
+    for key in sorted(baseline.keys() & current.keys(), key=str):
+        ratio = current[key] / baseline[key] if baseline[key] else float("inf")
+        regressed = ratio > 1 + threshold
+        regressions += regressed
+        name, variant, hours, concurrency = key
+        label = " ".join(
+            str(part)
+            for part in (name, variant, f"{hours}h", concurrency and f"x{concurrency}")
+            if part
+        )
+        print(
+            f"{label:<40} {baseline[key] * 1000:10.2f} ms {current[key] * 1000:10.2f} ms "
+            f"{ratio:6.2f}x{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares two benchmark result files.")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Fraction by which a median may get slower before it counts as a regression",
+    )
+    args = parser.parse_args()
+    sys.exit(1 if compare(args.baseline, args.current, args.threshold) else 0)
@@ -0,0 +1,79 @@
+"""
+Generates synthetic streams in the layout of the logger, one <stream>_<isoformat hour>.csv file per
+ hour with the colons of the hour replaced by dots, a Datetime column and a number of numeric
+ columns.
+
+Run from the project root, for example:
+    python -m benchmarks.generate_data /tmp/streams --days 7 --interval 10 --columns 2
+"""
+
+import argparse
+import datetime
+import math
+import random
+from pathlib import Path
+from typing import Optional
+
+
+def generate_stream(
+    data_dir: Path,
+    stream: str,
+    days: float = 7,
+    interval: float = 10,
+    columns: int = 2,
+    end_datetime: Optional[datetime.datetime] = None,
+    seed: int = 0,
+) -> int:
+    """
+    Writes days of history of a stream with a row every interval seconds, up to the end datetime
+     (by default now, in UTC, so the most recent file is still being written to).
+    Returns the number of rows written.
+    """
+    if end_datetime is None:
+        end_datetime = datetime.datetime.utcnow().replace(microsecond=0)
+    randomizer = random.Random(seed)
+    directory = data_dir / stream
+    directory.mkdir(exist_ok=True, parents=True)
+    header = ",".join(["Datetime"] + [f"Value{column}" for column in range(columns)])
+
+    hour = (end_datetime - datetime.timedelta(days=days)).replace(
+        minute=0, second=0, microsecond=0
+    )
+    rows = 0
+    while hour <= end_datetime:
+        lines = [header]
+        offset = 0.0
+        while offset < 3600:
+            datetime_ = hour + datetime.timedelta(seconds=offset)
+            if datetime_ > end_datetime:
+                break
+            # A daily cycle with noise, different per column.
+            phase = datetime_.timestamp() / 86400 * 2 * math.pi
+            values = [
+                f"{20 + 5 * math.sin(phase + column) + randomizer.gauss(0, 0.5):.2f}"
+                for column in range(columns)
+            ]
+            lines.append(",".join([datetime_.isoformat()] + values))
+            offset += interval
+        file_path = directory / f"{stream}_{hour.isoformat().replace(':', '.')}.csv"
+        file_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        rows += len(lines) - 1
+        hour += datetime.timedelta(hours=1)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates synthetic streams in the layout of the logger."
+    )
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--stream", default="benchmark")
+    parser.add_argument("--days", type=float, default=7, help="Days of history")
+    parser.add_argument("--interval", type=float, default=10, help="Seconds between rows")
+    parser.add_argument("--columns", type=int, default=2, help="Number of numeric columns")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    written = generate_stream(
+        args.data_dir, args.stream, args.days, args.interval, args.columns, seed=args.seed
+    )
+    print(f"Wrote {written} rows of {args.stream} to {args.data_dir / args.stream}")
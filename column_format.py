@@ -0,0 +1,65 @@
+"""
+Binary layout of a set of named, equally long column arrays, shared by the compacted files of the
+ temperature API and its binary responses, so the dashboard can read them without the API code.
+
+The layout is a magic number and the length of a JSON header, followed by the header and one 8
+ byte aligned, little-endian array per column. Next to any fields of its own the header contains
+ the number of rows and the name, dtype and offset of every column.
+"""
+
+import json
+import struct
+from typing import Dict, Tuple
+
+import numpy as np
+
+MAGIC = b"LDCOLS01"
+ALIGNMENT = 8
+
+
+def pack_columns(header: dict, arrays: Dict[str, np.ndarray]) -> bytes:
+    """
+    Returns the bytes of the columns with a header, to which the rows and columns are added.
+    """
+    arrays = {
+        name: array.astype(array.dtype.newbyteorder("<"), copy=False)
+        for name, array in arrays.items()
+    }
+    header = dict(header)
+    header["rows"] = len(next(iter(arrays.values()))) if arrays else 0
+    header["columns"] = []
+    offset = 0
+    for name, array in arrays.items():
+        header["columns"].append({"name": name, "dtype": array.dtype.str, "offset": offset})
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix_length = len(MAGIC) + 4 + len(header_bytes)
+    header_bytes += b" " * (-prefix_length % ALIGNMENT)
+
+    parts = [MAGIC, struct.pack("<I", len(header_bytes)), header_bytes]
+    for array in arrays.values():
+        parts.append(array.tobytes())
+        parts.append(b"\0" * (-array.nbytes % ALIGNMENT))
+    return b"".join(parts)
+
+
+def unpack_columns(buffer) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Returns the header and the columns of packed bytes, or of any other object supporting the
+     buffer protocol such as a memory map. The columns are views on the buffer, not copies.
+    Raises a ValueError if the buffer doesn't start with the magic number.
+    """
+    buffer = np.frombuffer(buffer, dtype=np.uint8)
+    if bytes(buffer[: len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a packed set of columns")
+    (header_length,) = struct.unpack("<I", bytes(buffer[len(MAGIC) : len(MAGIC) + 4]))
+    data_offset = len(MAGIC) + 4 + header_length
+    header = json.loads(bytes(buffer[len(MAGIC) + 4 : data_offset]))
+    columns = {}
+    for column in header["columns"]:
+        dtype = np.dtype(column["dtype"])
+        start = data_offset + column["offset"]
+        columns[column["name"]] = buffer[start : start + header["rows"] * dtype.itemsize].view(
+            dtype
+        )
+    return header, columns
@@ -32,7 +32,10 @@ MAIN_FOLDER = Path(__file__).parent
 load_dotenv(MAIN_FOLDER / ".env")
 
 os_name = platform.system()
-if os_name == "Windows":
+if os.getenv("DATA_DIR"):
+    # Lets the benchmarks point the apps at generated streams.
+    DATA_DIR = Path(os.getenv("DATA_DIR")).expanduser()
+elif os_name == "Windows":
     DATA_DIR = MAIN_FOLDER / "streams"
 elif os_name == "Linux":
     DATA_DIR = Path("~/scripts/prod/logs").expanduser()
@@ -41,10 +44,11 @@ else:
 
 DATA_DIR.mkdir(exist_ok=True, parents=True)
 
-APP_DATA_DIR = MAIN_FOLDER / "data"
+APP_DATA_DIR = Path(os.getenv("APP_DATA_DIR", default=MAIN_FOLDER / "data")).expanduser()
 APP_DATA_DIR.mkdir(exist_ok=True, parents=True)
 IMAGES_FOLDER = APP_DATA_DIR / "images"
 IMAGES_FOLDER.mkdir(exist_ok=True, parents=True)
+COLUMN_STORE_FOLDER = APP_DATA_DIR / "columns"
 
 LOG_FOLDER = MAIN_FOLDER / "logs"
 LOG_FOLDER.mkdir(exist_ok=True, parents=True)
@@ -52,3 +56,45 @@ LOG_FOLDER.mkdir(exist_ok=True, parents=True)
 TEMPERATURE_API_ADDRESS = os.getenv(
     "TEMPERATURE_API_ADDRESS", default="http://127.0.0.1:4001/api"
 )
+
+# Maximum number of bytes of parsed file data the temperature API keeps cached in memory.
+DATA_CACHE_MAX_BYTES = int(os.getenv("DATA_CACHE_MAX_BYTES", default=64 * 1024 * 1024))
+
+# Seconds a rendered dashboard image is served from memory before it is rendered again.
+DASHBOARD_RENDER_TTL = float(os.getenv("DASHBOARD_RENDER_TTL", default=60))
+# Seconds between two pre-renders of the standard dashboard windows.
+DASHBOARD_PRERENDER_INTERVAL = float(
+    os.getenv("DASHBOARD_PRERENDER_INTERVAL", default=30)
+)
+
+# Seconds between two checks for new rows by the push channel when inotify isn't available.
+PUSH_POLL_INTERVAL = float(os.getenv("PUSH_POLL_INTERVAL", default=1))
+# Seconds after which an idle push connection is sent a comment to keep it open.
+PUSH_HEARTBEAT_INTERVAL = float(os.getenv("PUSH_HEARTBEAT_INTERVAL", default=15))
+
+# "development" serves the apps with Flask's debug server, "production" with gunicorn, or with
+#  waitress on Windows.
+SERVER_MODE = os.getenv("SERVER_MODE", default="development")
+# Number of worker processes in production, each with its own caches and background threads.
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", default=2))
+# Number of threads per worker process that handle requests in production.
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", default=8))
+
+# Closed hourly files are archived into a bundle per "day" or per "month".
+ARCHIVE_PERIOD = os.getenv("ARCHIVE_PERIOD", default="month")
+# Days after the end of a period before its files are archived.
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", default=7))
+
+# Maximum number of bytes of the log of an admin job returned per request.
+JOB_LOG_CHUNK_BYTES = int(os.getenv("JOB_LOG_CHUNK_BYTES", default=64 * 1024))
+
+# Number of threads of the temperature API that read the streams of batch requests concurrently.
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", default=8))
+
+# Maximum number of points of the time grid of an aligned JSON or binary response, ndjson responses
+#  are streamed and have no maximum.
+ALIGN_MAX_POINTS = int(os.getenv("ALIGN_MAX_POINTS", default=100_000))
+
+# Fraction of the requests to the temperature API that are profiled with cProfile, 0 disables it.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", default=0))
+PROFILE_FOLDER = LOG_FOLDER / "profiles"
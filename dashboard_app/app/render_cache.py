@@ -0,0 +1,70 @@
+"""
+In-memory cache of rendered dashboard images.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+class RenderCache:
+    """
+    Keeps the most recent render of every key for a number of seconds.
+    Renders of the same key are done one at a time, so concurrent requests for an image that isn't
+     cached wait for a single render instead of each rendering it.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: Dict[Hashable, dict] = {}
+        self.render_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        """
+        Returns the render of a key if it is younger than the TTL.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry["rendered"] > self.ttl:
+            return None
+        return entry
+
+    def get_render_lock(self, key: Hashable) -> threading.Lock:
+        """
+        Returns the lock that renders of a key are done under.
+        """
+        with self.lock:
+            return self.render_locks.setdefault(key, threading.Lock())
+
+    def store(self, key: Hashable, render: Callable[[], dict]) -> dict:
+        """
+        Renders a key and stores the result, a dictionary with at least the image and its ETag.
+        Has to be called while holding the render lock of the key.
+        """
+        entry = render()
+        entry["rendered"] = time.monotonic()
+        with self.lock:
+            self.entries[key] = entry
+        return entry
+
+    def render(self, key: Hashable, render: Callable[[], dict]) -> dict:
+        """
+        Renders a key and stores the result, whether or not it is cached.
+        """
+        with self.get_render_lock(key):
+            return self.store(key, render)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], dict]) -> dict:
+        """
+        Returns the cached render of a key, rendering it if it isn't cached or has expired.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        with self.get_render_lock(key):
+            # Another request may have rendered it while this one was waiting.
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+            return self.store(key, render)
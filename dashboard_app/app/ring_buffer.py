@@ -0,0 +1,86 @@
+"""
+Client side copy of the most recent data of a stream, kept up to date with the tail endpoint of
+ the temperature API.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Maximum number of points kept per stream and window.
+RING_BUFFER_SIZE = 1_000_000
+
+
+class StreamBuffer:
+    """
+    Buffer of the timestamps, in epoch milliseconds, and the values of a stream, with the
+     high-water mark up to which it has data.
+    """
+
+    def __init__(self, max_points: int = RING_BUFFER_SIZE) -> None:
+        self.lock = threading.Lock()
+        self.max_points = max_points
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.values: Dict[str, np.ndarray] = {}
+        self.high_water_mark: Optional[str] = None
+
+    def reset(self) -> None:
+        """
+        Removes all points and the high-water mark.
+        """
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.values = {}
+        self.high_water_mark = None
+
+    def extend(
+        self,
+        timestamps: np.ndarray,
+        values: Dict[str, np.ndarray],
+        high_water_mark: Optional[str],
+    ) -> None:
+        """
+        Appends points to the buffer, dropping the oldest ones once it is full.
+        A change in the keys of the stream resets the buffer to the new points.
+        """
+        if len(timestamps) and self.values and set(values) != set(self.values):
+            self.reset()
+        if len(timestamps):
+            self.timestamps = np.concatenate([self.timestamps, timestamps])[-self.max_points :]
+            for key, key_values in values.items():
+                self.values[key] = np.concatenate(
+                    [self.values.get(key, np.empty(0)), key_values]
+                )[-self.max_points :]
+        if high_water_mark is not None:
+            self.high_water_mark = high_water_mark
+
+    def trim(self, start_timestamp: int) -> None:
+        """
+        Drops the points before the start timestamp in epoch milliseconds.
+        """
+        start = np.searchsorted(self.timestamps, start_timestamp, "left")
+        if start:
+            self.timestamps = self.timestamps[start:]
+            self.values = {key: key_values[start:] for key, key_values in self.values.items()}
+
+    def snapshot(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Returns the timestamps and the values per key.
+        The arrays are replaced rather than modified by later updates, so they can be used
+         without holding the lock.
+        """
+        return self.timestamps, dict(self.values)
+
+
+_buffers: Dict[Tuple[str, int], StreamBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_buffer(stream: str, hours: int) -> StreamBuffer:
+    """
+    Returns the buffer of a stream for a window of a number of hours, creating it on first use.
+    """
+    with _buffers_lock:
+        if (stream, hours) not in _buffers:
+            _buffers[(stream, hours)] = StreamBuffer()
+        return _buffers[(stream, hours)]
@@ -0,0 +1,405 @@
+/*
+Client-side rendered dashboard.
+
+The visible range is divided in tiles of TILE_BUCKETS time buckets, with the bucket width the
+ smallest of LEVELS that gives at most one bucket per pixel. Every tile is fetched once per stream
+ as the binary bucket aggregates of the temperature API and kept, so zooming and panning only fetch
+ the tiles that weren't visible at that resolution before. Until a tile arrives its range is drawn
+ from a coarser tile, if there is one.
+
+Datetimes are epoch milliseconds. Naive datetimes of the logger are treated as if they are in UTC,
+ as the temperature API does, so they are shown with the UTC methods of Date.
+*/
+
+"use strict";
+
+// Bucket widths in seconds, aligned to the epoch by the temperature API.
+const LEVELS = [
+    1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400,
+];
+const TILE_BUCKETS = 256;
+// Milliseconds after which a tile that reaches beyond the time it was fetched at is fetched again.
+const REFRESH_INTERVAL = 30_000;
+const MAXIMUM_RANGE = 7 * 24 * 3600_000;
+const MINIMUM_RANGE = 60_000;
+const COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2"];
+const PADDING = { left: 56, right: 12, top: 12, bottom: 36 };
+const MAGIC = "LDCOLS01";
+
+const canvas = document.getElementById("chart");
+const context = canvas.getContext("2d");
+const statusElement = document.getElementById("status");
+
+// Key stream|level|index to {columns, fetchedAt} once loaded, or {pending: true} while loading.
+const tiles = new Map();
+const view = { end: Date.now(), start: Date.now() - DASHBOARD.hours * 3600_000, live: true };
+
+/*
+Returns the header and the columns of a packed set of columns, laid out as in column_format.py.
+*/
+function unpackColumns(buffer) {
+    const bytes = new Uint8Array(buffer);
+    if (new TextDecoder().decode(bytes.subarray(0, MAGIC.length)) !== MAGIC) {
+        throw new Error("Not a packed set of columns");
+    }
+    const headerLength = new DataView(buffer).getUint32(MAGIC.length, true);
+    const dataOffset = MAGIC.length + 4 + headerLength;
+    const header = JSON.parse(
+        new TextDecoder().decode(bytes.subarray(MAGIC.length + 4, dataOffset))
+    );
+    const columns = {};
+    for (const column of header.columns) {
+        const start = dataOffset + column.offset;
+        if (column.dtype === "<i8") {
+            columns[column.name] = Float64Array.from(
+                new BigInt64Array(buffer, start, header.rows), Number
+            );
+        } else if (column.dtype === "<f8") {
+            columns[column.name] = new Float64Array(buffer, start, header.rows);
+        }
+    }
+    return { header, columns };
+}
+
+function toIsoformat(timestamp) {
+    // Naive, in the same clock as the logger.
+    return new Date(timestamp).toISOString().slice(0, -1);
+}
+
+function chooseLevel(start, end, pixels) {
+    for (const level of LEVELS) {
+        if ((end - start) / (level * 1000) <= pixels) {
+            return level;
+        }
+    }
+    return LEVELS[LEVELS.length - 1];
+}
+
+function tileSpan(level) {
+    return level * 1000 * TILE_BUCKETS;
+}
+
+async function fetchTile(stream, level, index) {
+    const key = `${stream}|${level}|${index}`;
+    const previous = tiles.get(key);
+    tiles.set(key, { ...previous, pending: true });
+    const start = index * tileSpan(level);
+    let columns = null;
+    try {
+        const response = await fetch(DASHBOARD.downsampleUrl, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({
+                stream,
+                startDatetime: toIsoformat(start),
+                endDatetime: toIsoformat(start + tileSpan(level) - 1),
+                bucketSeconds: level,
+            }),
+        });
+        // A tile without data is answered with a 400 and kept as empty.
+        if (response.ok) {
+            columns = unpackColumns(await response.arrayBuffer()).columns;
+        } else if (response.status !== 400) {
+            throw new Error(`${response.status} ${await response.text()}`);
+        }
+    } catch (error) {
+        statusElement.textContent = `Failed to fetch ${stream}: ${error.message}`;
+        tiles.delete(key);
+        return;
+    }
+    tiles.set(key, { columns: columns || {}, fetchedAt: Date.now() });
+    scheduleDraw();
+}
+
+function isStale(tile, level, index) {
+    return (
+        !tile.pending &&
+        tile.fetchedAt !== undefined &&
+        (index + 1) * tileSpan(level) > tile.fetchedAt &&
+        Date.now() - tile.fetchedAt > REFRESH_INTERVAL
+    );
+}
+
+/*
+Fetches the tiles of the visible range that aren't loaded yet or are stale.
+*/
+function fetchVisible(level) {
+    const span = tileSpan(level);
+    let loading = 0;
+    for (const stream of DASHBOARD.streams) {
+        for (let index = Math.floor(view.start / span); index * span <= view.end; index++) {
+            const tile = tiles.get(`${stream}|${level}|${index}`);
+            if (tile === undefined || isStale(tile, level, index)) {
+                fetchTile(stream, level, index);
+            }
+            if (tile === undefined || tile.pending) {
+                loading++;
+            }
+        }
+    }
+    statusElement.textContent = loading ? `Loading ${loading} tiles` : "";
+}
+
+/*
+Returns the loaded tile at the level, or the finest coarser one, that covers a timestamp.
+*/
+function findTile(stream, levelIndex, timestamp) {
+    for (let index = levelIndex; index < LEVELS.length; index++) {
+        const level = LEVELS[index];
+        const tile = tiles.get(`${stream}|${level}|${Math.floor(timestamp / tileSpan(level))}`);
+        if (tile !== undefined && tile.columns !== undefined) {
+            return tile;
+        }
+    }
+    return null;
+}
+
+/*
+Returns per series (stream:column) the parts of the visible range to draw, each the slice of a
+ tile's aggregates within a tile of the current level.
+*/
+function collectSeries(level) {
+    const levelIndex = LEVELS.indexOf(level);
+    const span = tileSpan(level);
+    const series = new Map();
+    for (const stream of DASHBOARD.streams) {
+        for (let index = Math.floor(view.start / span); index * span <= view.end; index++) {
+            const slotStart = index * span;
+            const tile = findTile(stream, levelIndex, slotStart);
+            if (tile === null || tile.columns.Datetime === undefined) {
+                continue;
+            }
+            const datetimes = tile.columns.Datetime;
+            let first = 0;
+            while (first < datetimes.length && datetimes[first] < slotStart) first++;
+            let last = first;
+            while (last < datetimes.length && datetimes[last] < slotStart + span) last++;
+            for (const name of Object.keys(tile.columns)) {
+                if (!name.endsWith(".mean")) {
+                    continue;
+                }
+                const column = name.slice(0, -".mean".length);
+                const label = `${stream}:${column}`;
+                if (!series.has(label)) {
+                    series.set(label, []);
+                }
+                series.get(label).push({
+                    datetimes: datetimes.subarray(first, last),
+                    min: tile.columns[`${column}.min`].subarray(first, last),
+                    mean: tile.columns[name].subarray(first, last),
+                    max: tile.columns[`${column}.max`].subarray(first, last),
+                });
+            }
+        }
+    }
+    return series;
+}
+
+function niceStep(range, count, steps) {
+    const rough = range / count;
+    if (steps !== undefined) {
+        return steps.find((step) => step >= rough) || steps[steps.length - 1];
+    }
+    const magnitude = 10 ** Math.floor(Math.log10(rough));
+    return [1, 2, 2.5, 5, 10].map((factor) => factor * magnitude).find((step) => step >= rough);
+}
+
+function formatDatetime(timestamp, step) {
+    const iso = new Date(timestamp).toISOString();
+    if (step >= 24 * 3600_000) {
+        return iso.slice(5, 10);
+    }
+    if (step >= 3600_000) {
+        return iso.slice(5, 16).replace("T", " ");
+    }
+    return iso.slice(11, step >= 60_000 ? 16 : 19);
+}
+
+function draw() {
+    const ratio = window.devicePixelRatio || 1;
+    const width = canvas.clientWidth;
+    const height = canvas.clientHeight;
+    if (canvas.width !== width * ratio || canvas.height !== height * ratio) {
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+    }
+    context.setTransform(ratio, 0, 0, ratio, 0, 0);
+    context.clearRect(0, 0, width, height);
+
+    const plotWidth = width - PADDING.left - PADDING.right;
+    const plotHeight = height - PADDING.top - PADDING.bottom;
+    const level = chooseLevel(view.start, view.end, plotWidth);
+    fetchVisible(level);
+    const series = collectSeries(level);
+
+    let minimum = Infinity;
+    let maximum = -Infinity;
+    for (const parts of series.values()) {
+        for (const part of parts) {
+            for (let index = 0; index < part.datetimes.length; index++) {
+                if (part.datetimes[index] + level * 1000 >= view.start && part.datetimes[index] <= view.end) {
+                    minimum = Math.min(minimum, part.min[index]);
+                    maximum = Math.max(maximum, part.max[index]);
+                }
+            }
+        }
+    }
+    if (minimum === Infinity) {
+        minimum = 0;
+        maximum = 1;
+    } else if (minimum === maximum) {
+        minimum -= 0.5;
+        maximum += 0.5;
+    }
+    const x = (timestamp) => PADDING.left + ((timestamp - view.start) / (view.end - view.start)) * plotWidth;
+    const y = (value) => PADDING.top + (1 - (value - minimum) / (maximum - minimum)) * plotHeight;
+
+    // Axes and grid.
+    context.strokeStyle = "#ddd";
+    context.fillStyle = "#333";
+    context.font = "12px sans-serif";
+    context.lineWidth = 1;
+    const timeStep = niceStep(view.end - view.start, plotWidth / 120, [
+        1000, 5000, 15_000, 30_000, 60_000, 300_000, 900_000, 1800_000, 3600_000,
+        3 * 3600_000, 6 * 3600_000, 12 * 3600_000, 24 * 3600_000,
+    ]);
+    context.textAlign = "center";
+    context.textBaseline = "top";
+    for (let tick = Math.ceil(view.start / timeStep) * timeStep; tick <= view.end; tick += timeStep) {
+        context.beginPath();
+        context.moveTo(x(tick), PADDING.top);
+        context.lineTo(x(tick), PADDING.top + plotHeight);
+        context.stroke();
+        context.fillText(formatDatetime(tick, timeStep), x(tick), PADDING.top + plotHeight + 6);
+    }
+    const valueStep = niceStep(maximum - minimum, 6);
+    context.textAlign = "right";
+    context.textBaseline = "middle";
+    for (let tick = Math.ceil(minimum / valueStep) * valueStep; tick <= maximum; tick += valueStep) {
+        context.beginPath();
+        context.moveTo(PADDING.left, y(tick));
+        context.lineTo(PADDING.left + plotWidth, y(tick));
+        context.stroke();
+        context.fillText(+tick.toFixed(6), PADDING.left - 6, y(tick));
+    }
+
+    // Per series a band from the minimum to the maximum of every bucket and a line of the means.
+    context.save();
+    context.beginPath();
+    context.rect(PADDING.left, PADDING.top, plotWidth, plotHeight);
+    context.clip();
+    const legend = [];
+    [...series.keys()].sort().forEach((label, seriesIndex) => {
+        const color = COLORS[seriesIndex % COLORS.length];
+        legend.push(`<span><i style="background:${color}"></i>${label}</span>`);
+        for (const part of series.get(label)) {
+            const count = part.datetimes.length;
+            if (!count) {
+                continue;
+            }
+            context.globalAlpha = 0.2;
+            context.fillStyle = color;
+            context.beginPath();
+            for (let index = 0; index < count; index++) {
+                context.lineTo(x(part.datetimes[index]), y(part.max[index]));
+            }
+            for (let index = count - 1; index >= 0; index--) {
+                context.lineTo(x(part.datetimes[index]), y(part.min[index]));
+            }
+            context.fill();
+            context.globalAlpha = 1;
+            context.strokeStyle = color;
+            context.lineWidth = 1.5;
+            context.beginPath();
+            for (let index = 0; index < count; index++) {
+                context.lineTo(x(part.datetimes[index]), y(part.mean[index]));
+            }
+            context.stroke();
+        }
+    });
+    context.restore();
+    document.getElementById("legend").innerHTML = legend.join("");
+}
+
+let drawRequested = false;
+
+function scheduleDraw() {
+    if (!drawRequested) {
+        drawRequested = true;
+        requestAnimationFrame(() => {
+            drawRequested = false;
+            draw();
+        });
+    }
+}
+
+function setRange(start, end) {
+    const range = Math.min(Math.max(end - start, MINIMUM_RANGE), MAXIMUM_RANGE);
+    const center = (start + end) / 2;
+    view.start = center - range / 2;
+    view.end = center + range / 2;
+    scheduleDraw();
+}
+
+canvas.addEventListener("wheel", (event) => {
+    event.preventDefault();
+    const plotWidth = canvas.clientWidth - PADDING.left - PADDING.right;
+    const fraction = Math.min(Math.max((event.offsetX - PADDING.left) / plotWidth, 0), 1);
+    const anchor = view.start + fraction * (view.end - view.start);
+    const factor = event.deltaY > 0 ? 1.25 : 0.8;
+    const range = Math.min(
+        Math.max((view.end - view.start) * factor, MINIMUM_RANGE), MAXIMUM_RANGE
+    );
+    view.start = anchor - fraction * range;
+    view.end = view.start + range;
+    view.live = false;
+    scheduleDraw();
+});
+
+let dragStart = null;
+canvas.addEventListener("pointerdown", (event) => {
+    dragStart = { x: event.clientX, start: view.start, end: view.end };
+    canvas.setPointerCapture(event.pointerId);
+    canvas.style.cursor = "grabbing";
+});
+canvas.addEventListener("pointermove", (event) => {
+    if (dragStart === null) {
+        return;
+    }
+    const plotWidth = canvas.clientWidth - PADDING.left - PADDING.right;
+    const shift = ((event.clientX - dragStart.x) / plotWidth) * (dragStart.end - dragStart.start);
+    view.start = dragStart.start - shift;
+    view.end = dragStart.end - shift;
+    view.live = false;
+    scheduleDraw();
+});
+canvas.addEventListener("pointerup", () => {
+    dragStart = null;
+    canvas.style.cursor = "grab";
+});
+
+for (const button of document.querySelectorAll("button[data-hours]")) {
+    button.addEventListener("click", () => {
+        const now = Date.now();
+        view.live = true;
+        setRange(now - Number(button.dataset.hours) * 3600_000, now);
+    });
+}
+document.getElementById("live").addEventListener("click", () => {
+    const now = Date.now();
+    view.live = true;
+    setRange(now - (view.end - view.start), now);
+});
+window.addEventListener("resize", scheduleDraw);
+
+// Follows new data while the view ends at the current time.
+setInterval(() => {
+    if (view.live) {
+        const range = view.end - view.start;
+        view.end = Date.now();
+        view.start = view.end - range;
+    }
+    scheduleDraw();
+}, 5000);
+
+scheduleDraw();
@@ -1,65 +1,313 @@
+import concurrent.futures
 import datetime
+import functools
+import hashlib
+import io
+import threading
+import time
+from typing import List, Optional
 
-import matplotlib
-import matplotlib.pyplot as plt
+import numpy as np
 import requests
-from flask import Blueprint, Response, send_file
+from flask import Blueprint, Response, abort, render_template, request
+from requests.adapters import HTTPAdapter
 
-from constants import IMAGES_FOLDER, TEMPERATURE_API_ADDRESS
+from column_format import unpack_columns
+from constants import (
+    DASHBOARD_PRERENDER_INTERVAL,
+    DASHBOARD_RENDER_TTL,
+    TEMPERATURE_API_ADDRESS,
+)
+from dashboard_app.app.render_cache import RenderCache
+from dashboard_app.app.ring_buffer import get_buffer
 
-dashboard = Blueprint("simple_page", __name__, template_folder="templates")
-matplotlib.use("agg")
+dashboard = Blueprint(
+    "simple_page", __name__, template_folder="templates", static_folder="static"
+)
 
+# Number of streams fetched from the temperature API at the same time.
+FETCH_WORKERS = 8
+# Seconds after which streams that haven't been fetched yet are left out of the dashboard.
+FETCH_DEADLINE = 30
+# Windows in hours that are pre-rendered in the background.
+STANDARD_WINDOWS = (1, 6, 24)
+# Largest window in hours that can be requested.
+MAXIMUM_WINDOW = 7 * 24
 
-@dashboard.route("/")
-def root():
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_maxsize=FETCH_WORKERS))
+session.mount("https://", HTTPAdapter(pool_maxsize=FETCH_WORKERS))
+executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=FETCH_WORKERS, thread_name_prefix="dashboard-fetch"
+)
+render_cache = RenderCache(DASHBOARD_RENDER_TTL)
+
+
+def post(path: str, body: dict, timeout: float) -> Optional[dict]:
+    """
+    Posts a request for binary values to the temperature API and returns the response with the
+     data as arrays, or None if it failed.
+    """
+    body = dict(body, valueFormat="binary")
+    try:
+        response = session.post(
+            TEMPERATURE_API_ADDRESS + path,
+            json=body,
+            timeout=timeout,
+        )
+    except requests.exceptions.RequestException as exception:
+        print(f"Failed to post to {path}: {exception}")
+        return None
+    try:
+        header, data = unpack_columns(response.content)
+    except ValueError:
+        print(response.content.decode(errors="replace"))
+        return None
+    r_json = header["response"]
+    r_json["data"] = data
+    return r_json
+
+
+def to_isoformat(timestamp: int, utcoffset: Optional[float]) -> str:
+    """
+    Returns the isoformat string of an epoch millisecond timestamp as the temperature API has it,
+     naive or with the UTC offset in seconds.
+    """
+    if utcoffset is None:
+        datetime_ = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=timestamp)
+    else:
+        datetime_ = datetime.datetime.fromtimestamp(
+            timestamp / 1000, datetime.timezone(datetime.timedelta(seconds=utcoffset))
+        )
+    return datetime_.isoformat()
+
+
+def fetch_stream(stream: str, hours: int, timeout: float):
+    """
+    Brings the buffer of a stream for a window up to date.
+    The whole window is only fetched the first time, or when the buffer fell behind by more than
+     the window, after that only the rows after the buffer's high-water mark are.
+    Returns the timestamps in epoch milliseconds and a dictionary with the values per key, or None
+     if it failed.
+    """
+    start_datetime = datetime.datetime.utcnow() - datetime.timedelta(hours=hours)
+    buffer = get_buffer(stream, hours)
+    with buffer.lock:
+        if (
+            buffer.high_water_mark is None
+            or datetime.datetime.fromisoformat(buffer.high_water_mark) < start_datetime
+        ):
+            r_json = post(
+                "/streams",
+                {
+                    "stream": stream,
+                    "startDatetime": start_datetime.isoformat(),
+                    # "endDatetime": datetime.utcnow().isoformat(),
+                    "minimumItemsPerPage": 1_000_000,
+                },
+                timeout,
+            )
+            if r_json is None:
+                return None
+            buffer.reset()
+            data = r_json["data"]
+            high_water_mark = None
+            if len(data.get("Datetime", [])):
+                high_water_mark = to_isoformat(
+                    int(data["Datetime"][-1]), r_json["metadata"].get("utcOffset")
+                )
+        else:
+            r_json = post(
+                "/tail", {"stream": stream, "since": buffer.high_water_mark}, timeout
+            )
+            if r_json is None:
+                return None
+            data = r_json["data"]
+            high_water_mark = r_json["metadata"]["highWaterMark"]
+        timestamps = data.pop("Datetime", np.empty(0, dtype=np.int64))
+        buffer.extend(timestamps, data, high_water_mark)
+        buffer.trim(np.datetime64(start_datetime, "ms").astype(np.int64))
+        return buffer.snapshot()
+
+
+def fetch_streams(streams: List[str], hours: int) -> dict:
+    """
+    Fetches the last hours of data of the streams concurrently.
+    Returns the timestamps and values per stream, streams that failed or weren't fetched within
+     the deadline are left out.
+    """
+    deadline = time.monotonic() + FETCH_DEADLINE
+    futures = {
+        executor.submit(fetch_stream, stream, hours, FETCH_DEADLINE): stream
+        for stream in streams
+    }
+    done, not_done = concurrent.futures.wait(
+        futures, timeout=max(deadline - time.monotonic(), 0)
+    )
+    for future in not_done:
+        print(f"Skipped {futures[future]}, it wasn't fetched within {FETCH_DEADLINE}s")
+        future.cancel()
+    return {
+        stream: future.result()
+        for future, stream in futures.items()
+        if future in done and future.result() is not None
+    }
+
+
+def render(streams: List[str], hours: int) -> dict:
+    """
+    Renders the dashboard image of the last hours of the streams.
+    Returns the PNG and an ETag derived from the data version, the number of points and the last
+     datetime of every stream, so an image of unchanged data keeps its ETag.
+    """
+    # matplotlib takes most of the import time of the app, it's imported by the first render so
+    #  the app starts without it. The pre-renderer does that first render in the background.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    stream_data = fetch_streams(streams, hours)
+    # A figure per render instead of pyplot's global one, so renders can run concurrently.
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    data_version = []
+    for stream, (timestamps, values) in stream_data.items():
+        data_version.append(
+            (stream, len(timestamps), int(timestamps[-1]) if len(timestamps) else None)
+        )
+        datetimes = timestamps.astype("datetime64[ms]")
+        for key, key_values in values.items():
+            axes.plot(datetimes, key_values, label=f"{stream}:{key}")
+    axes.tick_params(axis="x", labelrotation=45)
+    axes.legend()
+    figure.tight_layout()
+    image = io.BytesIO()
+    figure.savefig(image, format="png")
+    etag = hashlib.sha1(
+        repr((tuple(streams), hours, data_version)).encode("utf-8")
+    ).hexdigest()
+    return {"png": image.getvalue(), "etag": etag}
+
+
+def get_available_streams() -> Optional[List[str]]:
+    """
+    Returns the streams of the temperature API, or None if it can't be reached.
+    """
     try:
-        response = requests.get(TEMPERATURE_API_ADDRESS + "/streams", timeout=10)
+        response = session.get(TEMPERATURE_API_ADDRESS + "/streams", timeout=10)
     except requests.exceptions.ConnectionError:
-        return Response("Failed to get response from temperature API", 404)
+        return None
     if response.status_code != 200:
-        return Response("Failed to get response from temperature API", 404)
+        return None
+    return response.json()
 
-    return_ = []
-    image_path = IMAGES_FOLDER / "test.png"
-    for stream in response.json():
-        body = {
-            "stream": stream,
-            "startDatetime": (
-                datetime.datetime.utcnow() - datetime.timedelta(hours=1)
-            ).isoformat(),
-            # "endDatetime": datetime.utcnow().isoformat(),
-            "minimumItemsPerPage": 1_000_000,
-        }
-        print(body)
-        response = requests.post(
-            TEMPERATURE_API_ADDRESS + "/streams",
-            json=body,
-            timeout=30,
+
+def prerender() -> None:
+    """
+    Renders the standard windows into the render cache.
+    """
+    streams = get_available_streams()
+    if streams is None:
+        return
+    for hours in STANDARD_WINDOWS:
+        render_cache.render(
+            (tuple(streams), hours), functools.partial(render, streams, hours)
         )
-        try:
-            r_json = response.json()
-        except requests.exceptions.JSONDecodeError:
-            print(response.content.decode())
-            continue
-        print(r_json["metadata"])
-        data = r_json["data"]
-        print(data.keys())
-        return_.append(data)
-        for key in data.keys():
-            if key != "Datetime":
-                plt.plot(
-                    [
-                        datetime.datetime.fromisoformat(datetime_)
-                        for datetime_ in data["Datetime"]
-                    ],
-                    [float(value) for value in data[key]],
-                    label=f"{stream}:{key}",
-                )
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(image_path)
-    plt.close()
 
-    return send_file(image_path, mimetype="image/png")
+
+def start_prerenderer(interval=DASHBOARD_PRERENDER_INTERVAL) -> threading.Thread:
+    """
+    Starts a daemon thread that pre-renders the standard windows every interval seconds.
+    """
+
+    def run():
+        while True:
+            try:
+                prerender()
+            except Exception as exception:
+                print(f"Pre-rendering failed: {exception!r}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="dashboard-prerenderer", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_hours() -> int:
+    """
+    Returns the window in hours requested with ?hours=, one hour by default.
+    Aborts with a 400 response if it is invalid.
+    """
+    try:
+        hours = int(request.args.get("hours", 1))
+    except ValueError:
+        abort(Response(f"Invalid value for hours: {request.args.get('hours')}", 400))
+    if not 1 <= hours <= MAXIMUM_WINDOW:
+        abort(Response(f"hours needs to be in between 1 and {MAXIMUM_WINDOW}", 400))
+    return hours
+
+
+@dashboard.route("/")
+def root():
+    """
+    Returns a PNG of the last hours of data of all streams, one hour unless set with ?hours=.
+    Images are served from the render cache, with an ETag so unchanged images aren't resent.
+    """
+    hours = get_hours()
+    streams = get_available_streams()
+    if streams is None:
+        return Response("Failed to get response from temperature API", 404)
+
+    entry = render_cache.get_or_render(
+        (tuple(streams), hours), functools.partial(render, streams, hours)
+    )
+    if request.if_none_match.contains(entry["etag"]):
+        response = Response(status=304)
+    else:
+        response = Response(entry["png"], mimetype="image/png")
+    response.set_etag(entry["etag"])
+    response.cache_control.no_cache = True
+    return response
+
+
+@dashboard.route("/client")
+def client():
+    """
+    Returns the client-side rendered dashboard, a page that draws all streams in the browser from
+     the bucket aggregates of the temperature API, starting with the last hours (one hour unless
+     set with ?hours=). Zooming and panning only fetch the ranges that weren't loaded at the new
+     resolution yet, nothing is rendered on the server.
+    """
+    hours = get_hours()
+    streams = get_available_streams()
+    if streams is None:
+        return Response("Failed to get response from temperature API", 404)
+    return render_template("client.html", streams=streams, hours=hours)
+
+
+@dashboard.route("/downsample", methods=["POST"])
+def downsample_proxy():
+    """
+    Forwards a request of the client-side dashboard for the bucket aggregates of a stream to
+     POST /downsample of the temperature API, which the browser can't reach itself, and returns
+     them as binary values.
+    """
+    data = request.get_json()
+    body = {
+        key: data[key]
+        for key in ("stream", "startDatetime", "endDatetime", "bucketSeconds")
+        if key in data
+    }
+    body["valueFormat"] = "binary"
+    try:
+        response = session.post(
+            TEMPERATURE_API_ADDRESS + "/downsample", json=body, timeout=FETCH_DEADLINE
+        )
+    except requests.exceptions.RequestException as exception:
+        print(f"Failed to post to /downsample: {exception}")
+        return Response("Failed to get response from temperature API", 404)
+    return Response(
+        response.content,
+        status=response.status_code,
+        content_type=response.headers.get("Content-Type"),
+    )
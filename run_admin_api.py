@@ -3,6 +3,11 @@ Runs the Admin API.
 """
 
 from admin_api import app
+from admin_api.api.jobs import interrupt_unfinished_jobs
+from serving import serve
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=4444, debug=True)
+    # Once per start, before the worker processes are started, so no job of a running worker is
+    #  marked as interrupted.
+    interrupt_unfinished_jobs()
+    serve(app, 4444)
@@ -0,0 +1,11 @@
+"""
+Archives the closed hourly files of all streams into compressed bundles.
+"""
+
+from constants import DATA_DIR
+from temperature_api.api.archive import archive_stream
+
+if __name__ == "__main__":
+    for stream_dir in DATA_DIR.iterdir():
+        if stream_dir.is_dir():
+            print(f"Archived {archive_stream(stream_dir.name)} files of {stream_dir.name}")
@@ -0,0 +1,16 @@
+"""
+Compacts the closed hourly files of all streams into the column store and adds them to the
+ rollups.
+"""
+
+from constants import DATA_DIR
+from temperature_api.api.column_store import compact_stream
+from temperature_api.api.rollups import get_rollups
+
+if __name__ == "__main__":
+    for stream_dir in DATA_DIR.iterdir():
+        if stream_dir.is_dir():
+            print(f"Compacted {compact_stream(stream_dir.name)} files of {stream_dir.name}")
+            print(
+                f"Rolled up {get_rollups(stream_dir.name).update()} files of {stream_dir.name}"
+            )
@@ -1,4 +1,6 @@
 from dashboard_app import app
+from dashboard_app.app.views import start_prerenderer
+from serving import serve
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=4000, debug=True)
+    serve(app, 4000, on_start=start_prerenderer)
@@ -2,9 +2,9 @@
 Start the Temperature API Flask app.
 """
 
+from serving import serve
 from temperature_api import app
-from temperature_api.api.pagination import delete_expired
+from temperature_api.api.pagination import start_expiry_sweeper
 
 if __name__ == "__main__":
-    delete_expired()
-    app.run(host="0.0.0.0", port=4001, debug=True)
+    serve(app, 4001, on_start=start_expiry_sweeper)
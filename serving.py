@@ -0,0 +1,76 @@
+"""
+Serves the Flask apps, with Flask's development server or with a production WSGI server.
+
+In production the apps run under gunicorn with SERVER_WORKERS processes of SERVER_THREADS threads
+ each. gunicorn doesn't run on Windows, there the apps run under waitress with SERVER_THREADS
+ threads in a single process. Background threads, like the expiry sweeper, are started in every
+ worker process after it has been forked, since threads don't survive a fork.
+"""
+
+import os
+import platform
+from typing import Callable, Optional
+
+from flask import Flask
+
+from constants import SERVER_MODE, SERVER_THREADS, SERVER_WORKERS
+
+HOST = "0.0.0.0"
+
+
+def serve_gunicorn(
+    app: Flask, port: int, on_start: Optional[Callable[[], object]] = None
+) -> None:
+    """
+    Serves an app with gunicorn's threaded workers.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{HOST}:{port}")
+            self.cfg.set("workers", SERVER_WORKERS)
+            self.cfg.set("threads", SERVER_THREADS)
+            self.cfg.set("worker_class", "gthread")
+            if on_start is not None:
+                self.cfg.set("post_worker_init", lambda worker: on_start())
+
+        def load(self):
+            return app
+
+    Application().run()
+
+
+def serve_waitress(
+    app: Flask, port: int, on_start: Optional[Callable[[], object]] = None
+) -> None:
+    """
+    Serves an app with waitress in a single process.
+    """
+    import waitress
+
+    if on_start is not None:
+        on_start()
+    waitress.serve(app, host=HOST, port=port, threads=SERVER_THREADS)
+
+
+def serve(app: Flask, port: int, on_start: Optional[Callable[[], object]] = None) -> None:
+    """
+    Serves an app on a port in the configured server mode, calling on_start in every process that
+     handles requests before it starts serving.
+    """
+    if SERVER_MODE == "development":
+        # The reloader runs the app in a child process and only watches for changes in this one,
+        #  so only the child starts the background threads.
+        if on_start is not None and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            on_start()
+        app.run(host=HOST, port=port, debug=True, use_reloader=True)
+    elif SERVER_MODE == "production":
+        if platform.system() == "Windows":
+            serve_waitress(app, port, on_start)
+        else:
+            serve_gunicorn(app, port, on_start)
+    else:
+        raise ValueError(
+            f"Unexpected server mode {SERVER_MODE}, expected development or production"
+        )
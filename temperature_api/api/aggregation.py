@@ -0,0 +1,75 @@
+"""
+Vectorized aggregation of time series into fixed width time buckets.
+
+Aggregates are dictionaries of equally long arrays with the keys Datetime (the start of the bucket
+ in epoch microseconds), count, sum, min, max and last. Buckets are aligned to multiples of their
+ width since the epoch, so aggregates of a fine width can be merged into any multiple of it.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+AGGREGATE_KEYS = ("Datetime", "count", "sum", "min", "max", "last")
+
+
+def empty_aggregates() -> Dict[str, np.ndarray]:
+    """
+    Returns aggregates without any buckets.
+    """
+    return {
+        key: np.empty(0, dtype=np.int64 if key in ("Datetime", "count") else np.float64)
+        for key in AGGREGATE_KEYS
+    }
+
+
+def aggregate_buckets(
+    timestamps: np.ndarray, values: np.ndarray, bucket_microseconds: int
+) -> Dict[str, np.ndarray]:
+    """
+    Returns the aggregates of every non-empty time bucket of a time ordered series.
+    """
+    if not len(timestamps):
+        return empty_aggregates()
+    buckets = timestamps // bucket_microseconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)]
+    values = values.astype(np.float64)
+    return {
+        "Datetime": buckets[starts] * bucket_microseconds,
+        "count": ends - starts,
+        "sum": np.add.reduceat(values, starts),
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+        "last": values[ends - 1],
+    }
+
+
+def merge_buckets(
+    aggregates: Dict[str, np.ndarray], bucket_microseconds: int
+) -> Dict[str, np.ndarray]:
+    """
+    Merges time ordered aggregates into buckets of a width that is a multiple of theirs.
+    """
+    if not len(aggregates["Datetime"]):
+        return empty_aggregates()
+    buckets = aggregates["Datetime"] // bucket_microseconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)]
+    return {
+        "Datetime": buckets[starts] * bucket_microseconds,
+        "count": np.add.reduceat(aggregates["count"], starts),
+        "sum": np.add.reduceat(aggregates["sum"], starts),
+        "min": np.minimum.reduceat(aggregates["min"], starts),
+        "max": np.maximum.reduceat(aggregates["max"], starts),
+        "last": aggregates["last"][ends - 1],
+    }
+
+
+def concatenate_aggregates(
+    parts: List[Dict[str, np.ndarray]]
+) -> Dict[str, np.ndarray]:
+    """
+    Concatenates time ordered, non-overlapping aggregates.
+    """
+    return {key: np.concatenate([part[key] for part in parts]) for key in AGGREGATE_KEYS}
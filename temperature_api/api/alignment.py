@@ -0,0 +1,277 @@
+"""
+Resamples several streams onto one shared time grid, so their columns can be compared row by row.
+
+The grid has a point every step, aligned to multiples of the step since the epoch like the
+ buckets of the aggregates, between the start and end datetimes as far as the streams have data.
+ The value of a column at a grid point is the last value at or before it (forward fill) or the
+ linear interpolation between the values around it.
+The grid is resampled in chunks of at most an hour, the span of a file, while the sorted files of
+ every stream are read one after another. Per stream only the rows around the current chunk are
+ kept, so the memory used doesn't grow with the length of the range.
+"""
+
+import datetime
+import json
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from temperature_api.api.column_store import read_arrays, to_epoch_microseconds
+from temperature_api.api.encoding import encode_binary, typed_arrays
+from temperature_api.api.file_index import get_file_index
+
+# "ffill" takes the last value at or before a grid point, "linear" interpolates between the values
+#  around it.
+ALIGN_METHODS = ("ffill", "linear")
+# Seconds of the grid resampled at once.
+CHUNK_SECONDS = 3600
+
+
+class StreamReader:
+    """
+    Reads the numeric columns of a stream file by file, keeping the rows that are still needed to
+     resample the next points of the grid.
+    """
+
+    def __init__(
+        self,
+        stream: str,
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        columns: Optional[Sequence[str]] = None,
+    ) -> None:
+        self.stream = stream
+        self.columns = columns
+        # The file before the range holds the value to forward fill the start of the range with.
+        self.files = iter(
+            get_file_index(stream).files_between(
+                start_datetime - datetime.timedelta(hours=1), end_datetime
+            )
+        )
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.values: Dict[str, np.ndarray] = {}
+        self.utcoffset = None
+        self.exhausted = False
+        # The columns of the first file with rows are the columns of the stream.
+        while not self.exhausted and not self.values:
+            self.read_file()
+        self.names = list(self.values)
+
+    def read_file(self) -> None:
+        """
+        Appends the rows of the next file, columns of the stream that the file lacks are NaN.
+        """
+        item = next(self.files, None)
+        if item is None:
+            self.exhausted = True
+            return
+        arrays, utcoffset = read_arrays(item["path"], columns=self.columns)
+        timestamps = arrays.pop("Datetime", None)
+        if timestamps is None or not len(timestamps):
+            return
+        if self.utcoffset is None:
+            self.utcoffset = utcoffset
+        if not self.values:
+            self.timestamps = timestamps
+            self.values = {name: array.astype(np.float64) for name, array in arrays.items()}
+            return
+        self.timestamps = np.concatenate((self.timestamps, timestamps))
+        for name, values in self.values.items():
+            array = arrays.get(name)
+            if array is None:
+                array = np.full(len(timestamps), np.nan)
+            self.values[name] = np.concatenate((values, array.astype(np.float64)))
+
+    def discard_before(self, timestamp: int) -> None:
+        """
+        Drops the rows before the last row at or before a timestamp, which no grid point from that
+         timestamp on needs.
+        """
+        index = max(int(np.searchsorted(self.timestamps, timestamp, "right")) - 1, 0)
+        if index:
+            self.timestamps = self.timestamps[index:]
+            self.values = {name: values[index:] for name, values in self.values.items()}
+
+    def resample(
+        self, grid: np.ndarray, method: str, max_gap: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Returns the values of the columns at the points of a chunk of the grid, which has to come
+         after the chunks resampled before. Points without a row before them, or for "linear"
+         after them, and points in a gap of more than max_gap microseconds between rows are NaN.
+        """
+        self.discard_before(grid[0])
+        while not self.exhausted and (
+            not len(self.timestamps) or self.timestamps[-1] < grid[-1]
+        ):
+            self.read_file()
+            self.discard_before(grid[0])
+        if not len(self.timestamps):
+            return {name: np.full(len(grid), np.nan) for name in self.names}
+
+        # The index of the last row at or before every grid point, -1 if there is none.
+        previous = np.searchsorted(self.timestamps, grid, "right") - 1
+        valid = previous >= 0
+        if method == "linear":
+            following = np.minimum(previous + 1, len(self.timestamps) - 1)
+            exact = valid & (self.timestamps[np.maximum(previous, 0)] == grid)
+            valid &= exact | (self.timestamps[following] >= grid)
+            if max_gap is not None:
+                gaps = self.timestamps[following] - self.timestamps[np.maximum(previous, 0)]
+                valid &= exact | (gaps <= max_gap)
+        elif max_gap is not None:
+            valid &= grid - self.timestamps[np.maximum(previous, 0)] <= max_gap
+        resampled = {}
+        for name, values in self.values.items():
+            if method == "linear":
+                # Only the rows up to the end of the chunk are used, the rest of the buffered rows
+                #  would be passed to np.interp for nothing.
+                stop = int(np.searchsorted(self.timestamps, grid[-1], "right")) + 1
+                array = np.interp(grid, self.timestamps[:stop], values[:stop])
+            else:
+                array = values[np.maximum(previous, 0)]
+            resampled[name] = np.where(valid, array, np.nan)
+        return resampled
+
+
+class Alignment:
+    """
+    The columns of several streams resampled onto a shared time grid, as one table with the grid
+     as Datetime and a <stream>.<column> column per numeric column of every stream.
+    """
+
+    def __init__(
+        self,
+        streams: List[str],
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        step_seconds: float,
+        method: str = "ffill",
+        columns: Optional[Sequence[str]] = None,
+        max_gap_seconds: Optional[float] = None,
+    ) -> None:
+        self.streams = streams
+        self.start_datetime = start_datetime
+        self.end_datetime = end_datetime
+        self.step_seconds = step_seconds
+        self.step = max(int(step_seconds * 1_000_000), 1)
+        self.method = method
+        self.columns = columns
+        self.max_gap_seconds = max_gap_seconds
+        self.readers = [
+            StreamReader(stream, start_datetime, end_datetime, columns) for stream in streams
+        ]
+        self.readers = [reader for reader in self.readers if reader.names]
+
+        # The grid only covers the part of the range that the streams have files for.
+        start = to_epoch_microseconds(start_datetime)
+        end = to_epoch_microseconds(end_datetime)
+        hours = [
+            (files[0]["start_hour"], files[-1]["start_hour"] + datetime.timedelta(hours=1))
+            for files in (
+                get_file_index(reader.stream).files_between(start_datetime, end_datetime)
+                for reader in self.readers
+            )
+            if files
+        ]
+        if hours:
+            start = max(start, min(to_epoch_microseconds(first) for first, _ in hours))
+            end = min(end, max(to_epoch_microseconds(last) for _, last in hours))
+        self.first_point = -(-start // self.step) * self.step
+        self.points = max((end - self.first_point) // self.step + 1, 0) if hours else 0
+
+    def get_metadata(self) -> dict:
+        """
+        Returns everything but the data of the response, with the UTC offset of the datetimes of
+         the first stream in seconds.
+        """
+        return {
+            "metadata": {
+                "streams": [reader.stream for reader in self.readers],
+                "startDatetime": self.start_datetime.isoformat(),
+                "endDatetime": self.end_datetime.isoformat(),
+                "stepSeconds": self.step_seconds,
+                "method": self.method,
+                "columns": self.columns,
+                "maxGapSeconds": self.max_gap_seconds,
+                "points": self.points,
+                "utcOffset": self.readers[0].utcoffset if self.readers else None,
+            }
+        }
+
+    def iter_chunks(self) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Returns a generator of the table in consecutive chunks of the grid, with Datetime in epoch
+         microseconds and the values as floats, NaN where a stream has no value.
+        """
+        max_gap = (
+            None if self.max_gap_seconds is None else int(self.max_gap_seconds * 1_000_000)
+        )
+        chunk_points = max(CHUNK_SECONDS * 1_000_000 // self.step, 1)
+        for chunk_start in range(0, self.points, chunk_points):
+            grid = self.first_point + self.step * np.arange(
+                chunk_start, min(chunk_start + chunk_points, self.points), dtype=np.int64
+            )
+            chunk = {"Datetime": grid}
+            for reader in self.readers:
+                for name, values in reader.resample(grid, self.method, max_gap).items():
+                    chunk[f"{reader.stream}.{name}"] = values
+            yield chunk
+
+    def get_data(self, value_format: str = "typed") -> Union[dict, bytes]:
+        """
+        Returns the table with the metadata, with the "typed" value format as JSON numbers with
+         Datetime in epoch milliseconds and null where a stream has no value, with "binary" packed
+         with everything but the data in the header.
+        Returns a dictionary with a message if there's no data in the range.
+        """
+        if not self.points:
+            return self.no_data()
+        chunks = list(self.iter_chunks())
+        arrays = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+        return_value = self.get_metadata()
+        if value_format == "binary":
+            return encode_binary(return_value, typed_arrays(arrays))
+        return_value["data"] = to_nullable_lists(typed_arrays(arrays))
+        return return_value
+
+    def iter_ndjson(self) -> Union[dict, Iterator[str]]:
+        """
+        Returns a generator of newline delimited JSON, with the metadata on the first line and
+         every following line a chunk of the table as {"data": {column: [values]}} in the "typed"
+         value format, so only one chunk is held in memory at a time.
+        Returns a dictionary with a message if there's no data in the range.
+        """
+        if not self.points:
+            return self.no_data()
+
+        def generate():
+            yield json.dumps(self.get_metadata()) + "\n"
+            for chunk in self.iter_chunks():
+                yield json.dumps({"data": to_nullable_lists(typed_arrays(chunk))}) + "\n"
+
+        return generate()
+
+    def no_data(self) -> dict:
+        """
+        Returns the message for a range the streams have no data in.
+        """
+        return {
+            "message": f"No valid data found for streams={self.streams} and datetime range of \
+{self.start_datetime.isoformat()} to {self.end_datetime.isoformat()}"
+        }
+
+
+def to_nullable_lists(arrays: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """
+    Returns arrays as lists of Python numbers with None for NaN, which JSON can't represent.
+    """
+    lists = {}
+    for name, array in arrays.items():
+        values = array.tolist()
+        if array.dtype.kind == "f":
+            missing = np.flatnonzero(np.isnan(array)).tolist()
+            for index in missing:
+                values[index] = None
+        lists[name] = values
+    return lists
@@ -0,0 +1,129 @@
+"""
+Archives the closed hourly CSV files of the streams into compressed bundles, one per day or month,
+ as laid out in bundles.
+Archival is incremental: files that turn up for a period that already has a bundle are added to
+ it, and a CSV file is only removed once the bundle holding it has been written and verified.
+"""
+
+import datetime
+import os
+import shutil
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Dict, List
+
+from constants import ARCHIVE_AFTER_DAYS, ARCHIVE_PERIOD, DATA_DIR, datetime_now_local
+from temperature_api.api.bundles import BUNDLE_SUFFIX, get_members
+from temperature_api.api.file_index import file_datetime_from_file_path
+
+# The part of the bundle name per period, e.g. <stream>_2024-05.zip for a month.
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+COMPRESSION_LEVEL = 9
+CRC_BLOCK_SIZE = 1 << 20
+
+
+def period_end(start_hour: datetime.datetime, period: str) -> datetime.datetime:
+    """
+    Returns the start of the period after the one a start hour is in.
+    """
+    day = start_hour.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "day":
+        return day + datetime.timedelta(days=1)
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def file_crc(file_path: Path) -> int:
+    """
+    Returns the CRC-32 of a file, as zip files store it for their members.
+    """
+    crc = 0
+    with open(file_path, "rb") as file:
+        while block := file.read(CRC_BLOCK_SIZE):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+def write_bundle(bundle_path: Path, file_paths: List[Path]) -> None:
+    """
+    Adds files to a bundle, creating it if it doesn't exist yet.
+    A copy of the bundle is written, verified and synced before it replaces the bundle, so readers
+     never see a partly written one.
+    """
+    # A temporary file per process, so concurrent archivals don't write to the same file.
+    temporary_path = bundle_path.with_name(f"{bundle_path.name}.{os.getpid()}.tmp")
+    if bundle_path.exists():
+        shutil.copyfile(bundle_path, temporary_path)
+    try:
+        with zipfile.ZipFile(
+            temporary_path, "a", zipfile.ZIP_DEFLATED, compresslevel=COMPRESSION_LEVEL
+        ) as bundle:
+            for file_path in file_paths:
+                bundle.write(file_path, file_path.name)
+        with zipfile.ZipFile(temporary_path) as bundle:
+            for file_path in file_paths:
+                # Reading a member checks it against the CRC stored for it.
+                bundle.read(file_path.name)
+        with open(temporary_path, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(temporary_path, bundle_path)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+
+
+def archive_stream(
+    stream: str, period: str = ARCHIVE_PERIOD, after_days: float = ARCHIVE_AFTER_DAYS
+) -> int:
+    """
+    Archives the CSV files of a stream in periods that ended more than after_days ago. The most
+     recent file is never archived, it may still be written to.
+    Returns the number of files that were added to bundles.
+    """
+    if period not in PERIOD_FORMATS:
+        raise ValueError(f"Unexpected archive period {period}, expected day or month")
+    directory = DATA_DIR / stream
+    start_hours = {}
+    for file_path in directory.glob("*.csv"):
+        try:
+            start_hours[file_path] = file_datetime_from_file_path(stream, file_path)
+        except ValueError:
+            continue
+    if not start_hours:
+        return 0
+    newest_path = max(start_hours, key=start_hours.get)
+
+    now = datetime_now_local()
+    periods: Dict[str, List[Path]] = {}
+    for file_path, start_hour in sorted(start_hours.items(), key=lambda item: item[1]):
+        if file_path == newest_path:
+            continue
+        # Naive start hours are in local time.
+        local_now = (
+            now.astimezone(start_hour.tzinfo)
+            if start_hour.tzinfo is not None
+            else now.replace(tzinfo=None)
+        )
+        if period_end(start_hour, period) + datetime.timedelta(days=after_days) > local_now:
+            continue
+        periods.setdefault(start_hour.strftime(PERIOD_FORMATS[period]), []).append(file_path)
+
+    archived = 0
+    for name, file_paths in periods.items():
+        bundle_path = directory / f"{stream}_{name}{BUNDLE_SUFFIX}"
+        members = get_members(bundle_path) if bundle_path.exists() else {}
+        new_file_paths = [file_path for file_path in file_paths if file_path.name not in members]
+        if new_file_paths:
+            write_bundle(bundle_path, new_file_paths)
+            archived += len(new_file_paths)
+            members = get_members(bundle_path)
+        for file_path in file_paths:
+            info = members.get(file_path.name)
+            if (
+                info is not None
+                and info.file_size == file_path.stat().st_size
+                and info.CRC == file_crc(file_path)
+            ):
+                file_path.unlink()
+            else:
+                print(f"Kept {file_path}, it differs from its copy in {bundle_path.name}")
+    return archived
@@ -0,0 +1,84 @@
+"""
+Serves the first page of several streams in one request, reading the streams concurrently in a
+ pool of worker threads.
+"""
+
+import concurrent.futures
+import contextvars
+import datetime
+import threading
+from typing import Dict, List, Optional
+
+from constants import BATCH_WORKERS
+from temperature_api.api.cursor import CursorPagination
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    Returns the pool of worker threads that read the streams, creating it on first use.
+    It's created lazily so the worker processes of the production server each start their own
+     threads after they are forked.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                BATCH_WORKERS, thread_name_prefix="batch-reader"
+            )
+        return _executor
+
+
+def read_stream(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    minimum_items_per_page: int,
+    columns: Optional[List[str]],
+    value_format: str,
+) -> dict:
+    """
+    Returns the first page of a stream as POST /streams with cursor pagination would, or a
+     dictionary with a message if there's no data for it in the range.
+    """
+    pagination = CursorPagination(
+        stream=stream,
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+        minimum_items_per_page=minimum_items_per_page,
+        columns=columns,
+    )
+    return pagination.get_data(value_format=value_format)
+
+
+def get_batch(
+    streams: List[str],
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    minimum_items_per_page: int = 10_000,
+    columns: Optional[List[str]] = None,
+    value_format: str = "string",
+) -> Dict[str, dict]:
+    """
+    Returns the first page of each of the streams keyed by stream.
+    The streams are looked up and read by the worker pool at the same time, each in a copy of the
+     current context so the metrics recorded for it keep the endpoint of the request.
+    The next pages are requested per stream with the cursor in their bodyNextPage.
+    """
+    executor = get_executor()
+    futures = {
+        stream: executor.submit(
+            contextvars.copy_context().run,
+            read_stream,
+            stream,
+            start_datetime,
+            end_datetime,
+            minimum_items_per_page,
+            columns,
+            value_format,
+        )
+        for stream in dict.fromkeys(streams)
+    }
+    return {stream: future.result() for stream, future in futures.items()}
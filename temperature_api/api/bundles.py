@@ -0,0 +1,95 @@
+"""
+Compressed bundles of archived hourly files, and access to files whether they are archived or not.
+
+A bundle is a zip file in the stream directory, <stream>_<period>.zip, with every archived hourly
+ file as a deflate compressed member under its original name. The central directory of the zip is
+ the embedded index, so one hour is read without decompressing the rest of the bundle.
+An archived file is addressed by the path of its member inside the bundle,
+ <stream directory>/<stream>_<period>.zip/<stream>_<isoformat hour>.csv, so it goes through the
+ file index, the caches and the readers like any other file. Code that reads data files opens them
+ with open_file and stats them with stat_file instead of open and Path.stat.
+"""
+
+import io
+import os
+import threading
+import zipfile
+from pathlib import Path
+from typing import IO, Dict, NamedTuple, Tuple, Union
+
+BUNDLE_SUFFIX = ".zip"
+
+
+class MemberStat(NamedTuple):
+    """
+    The parts of os.stat_result the readers use, for a member of a bundle. The modification time
+     is that of the bundle, so caches of its members are invalidated when files are added to it.
+    """
+
+    st_size: int
+    st_mtime_ns: int
+
+
+_members: Dict[Path, Tuple[int, Dict[str, zipfile.ZipInfo]]] = {}
+_members_lock = threading.Lock()
+
+
+def is_archived(file_path: Path) -> bool:
+    """
+    Returns whether a path points to a member of a bundle.
+    """
+    return file_path.parent.suffix == BUNDLE_SUFFIX
+
+
+def stream_directory(file_path: Path) -> Path:
+    """
+    Returns the directory of the stream of a file, archived or not.
+    """
+    return file_path.parent.parent if is_archived(file_path) else file_path.parent
+
+
+def get_members(bundle_path: Path) -> Dict[str, zipfile.ZipInfo]:
+    """
+    Returns the members of a bundle by name.
+    The central directory is only read again once the bundle changed.
+    """
+    mtime = bundle_path.stat().st_mtime_ns
+    with _members_lock:
+        cached = _members.get(bundle_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with zipfile.ZipFile(bundle_path) as bundle:
+        members = {info.filename: info for info in bundle.infolist()}
+    with _members_lock:
+        _members[bundle_path] = (mtime, members)
+    return members
+
+
+def stat_file(file_path: Path) -> Union[os.stat_result, MemberStat]:
+    """
+    Returns the size and modification time of a file, archived or not.
+    Raises a FileNotFoundError if it doesn't exist.
+    """
+    if not is_archived(file_path):
+        return file_path.stat()
+    info = get_members(file_path.parent).get(file_path.name)
+    if info is None:
+        raise FileNotFoundError(f"No member {file_path.name} in {file_path.parent}")
+    return MemberStat(info.file_size, file_path.parent.stat().st_mtime_ns)
+
+
+def open_file(file_path: Path, text: bool = False) -> IO:
+    """
+    Opens a file, archived or not, for reading, as bytes or as UTF-8 text for the csv module.
+    """
+    if not is_archived(file_path):
+        if text:
+            return open(file_path, encoding="utf-8", newline="")
+        return open(file_path, "rb")
+    # The member stays readable after the bundle is closed, it holds its own reference to the
+    #  underlying file.
+    with zipfile.ZipFile(file_path.parent) as bundle:
+        file = bundle.open(file_path.name)
+    if text:
+        return io.TextIOWrapper(file, encoding="utf-8", newline="")
+    return file
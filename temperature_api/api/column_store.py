@@ -0,0 +1,379 @@
+"""
+Compacts closed hourly CSV files into a memory-mappable column format and reads them back.
+
+A compacted file is a packed set of columns as laid out by column_format. Its header also
+ contains the UTC offset of the timestamps and the size and modification time of the source CSV.
+ The Datetime column is stored as int64 microseconds since the epoch, the other columns as int64
+ or float64.
+Compacted files serve the typed, binary and aggregated reads. Values as strings are always read
+ from the CSV, which keeps them exactly as they were written.
+"""
+
+import csv
+import datetime
+import io
+import mmap
+import operator
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from column_format import pack_columns, unpack_columns
+from constants import COLUMN_STORE_FOLDER
+from temperature_api.api.bundles import open_file, stat_file, stream_directory
+from temperature_api.api.data_cache import columns_size, data_cache
+from temperature_api.api.file_index import get_file_index
+from temperature_api.api.metrics import metrics
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def columns_path(file_path: Path) -> Path:
+    """
+    Returns the path of the compacted version of a CSV file, archived or not.
+    """
+    return COLUMN_STORE_FOLDER / stream_directory(file_path).name / f"{file_path.stem}.cols"
+
+
+def to_epoch_microseconds(datetime_: datetime.datetime) -> int:
+    """
+    Returns the number of microseconds since the epoch for a datetime.
+    Naive datetimes are treated as if they are in UTC.
+    """
+    if datetime_.tzinfo is not None:
+        datetime_ = datetime_.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (datetime_ - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def from_epoch_microseconds(
+    microseconds: int, tzinfo: Optional[datetime.tzinfo] = None
+) -> datetime.datetime:
+    """
+    Returns the datetime for a number of microseconds since the epoch, naive (as if in UTC) unless
+     a timezone is given.
+    """
+    datetime_ = EPOCH + datetime.timedelta(microseconds=int(microseconds))
+    if tzinfo is None:
+        return datetime_
+    return datetime_.replace(tzinfo=datetime.timezone.utc).astimezone(tzinfo)
+
+
+def datetime_strings(timestamps: np.ndarray, utcoffset: Optional[float]) -> List[str]:
+    """
+    Returns isoformat strings for epoch microsecond timestamps, with the UTC offset in seconds
+     that the original datetimes had, or None for naive datetimes.
+    """
+    if utcoffset is None:
+        suffix = ""
+    else:
+        timezone = datetime.timezone(datetime.timedelta(seconds=utcoffset))
+        # The UTC offset part of an isoformat string, e.g. +01:00.
+        suffix = EPOCH.replace(tzinfo=timezone).isoformat()[len("1970-01-01T00:00:00") :]
+        timestamps = timestamps + int(utcoffset * 1_000_000)
+    datetimes = timestamps.astype("datetime64[us]")
+    if not (timestamps % 1_000_000).any():
+        datetimes = datetimes.astype("datetime64[s]")
+    return [string + suffix for string in np.datetime_as_string(datetimes).tolist()]
+
+
+def is_selected(name: str, columns: Optional[Sequence[str]]) -> bool:
+    """
+    Returns whether a column is part of a selection of columns, which always includes Datetime.
+    A selection of None includes every column.
+    """
+    return columns is None or name == "Datetime" or name in columns
+
+
+def cache_kind(kind: str, columns: Optional[Sequence[str]]) -> str:
+    """
+    Returns the kind of data cache entry for a selection of columns, so every selection is cached
+     separately from the complete file.
+    """
+    if columns is None:
+        return kind
+    return f"{kind}:{','.join(sorted(set(columns)))}"
+
+
+def read_csv_fields(
+    file_path: Path, columns: Optional[Sequence[str]] = None
+) -> Tuple[List[str], List[Sequence[str]]]:
+    """
+    Returns the names of the selected columns of a CSV file (all of them by default) and the
+     values of each of them, as sequences of strings.
+    Only the fields of the selected columns are picked out of every row as it's parsed.
+    A last line without a line ending is still being written, it's left out like the tail reader
+     does, as are rows without a field for every column, so the columns stay equally long.
+    """
+    with open_file(file_path, text=True) as file:
+        text = file.read()
+    if not text.endswith("\n"):
+        text = text[: text.rfind("\n") + 1]
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, [])
+    indices = [index for index, name in enumerate(header) if is_selected(name, columns)]
+    if not indices:
+        return [], []
+    names = [header[index] for index in indices]
+    if len(indices) == len(header):
+        rows = [row for row in reader if len(row) == len(header)]
+        return names, list(zip(*rows)) if rows else [() for _ in names]
+    pick = operator.itemgetter(*indices)
+    picked = [pick(row) for row in reader if len(row) == len(header)]
+    # With one index itemgetter returns the field itself, so the picked fields are the column.
+    if len(indices) == 1:
+        return names, [picked]
+    return names, list(zip(*picked)) if picked else [() for _ in names]
+
+
+def typed_column(values: List[str]) -> Optional[np.ndarray]:
+    """
+    Returns the values of a CSV column as an int64 or float64 array, or None if the column isn't
+     numeric.
+    """
+    for dtype in (np.int64, np.float64):
+        try:
+            return np.array(values, dtype=dtype)
+        except (ValueError, OverflowError):
+            continue
+    return None
+
+
+def compact_file(file_path: Path) -> bool:
+    """
+    Writes the compacted version of a CSV file.
+    Returns False if the file can't be compacted, because a column isn't numeric or the timestamps
+     don't share one UTC offset, in which case the CSV keeps being used.
+    """
+    stat_result = stat_file(file_path)
+    names, values = read_csv_fields(file_path)
+    if "Datetime" not in names:
+        return False
+
+    datetimes = [
+        datetime.datetime.fromisoformat(value)
+        for value in values[names.index("Datetime")]
+    ]
+    utcoffsets = {datetime_.utcoffset() for datetime_ in datetimes}
+    if len(utcoffsets) > 1:
+        return False
+    utcoffset = utcoffsets.pop() if utcoffsets else None
+
+    arrays = {}
+    for name, column_values in zip(names, values):
+        if name == "Datetime":
+            arrays[name] = np.array(
+                [to_epoch_microseconds(datetime_) for datetime_ in datetimes],
+                dtype=np.int64,
+            )
+            continue
+        array = typed_column(list(column_values))
+        if array is None:
+            return False
+        arrays[name] = array
+
+    header = {
+        "utcoffset": None if utcoffset is None else utcoffset.total_seconds(),
+        "source": {"size": stat_result.st_size, "mtime": stat_result.st_mtime_ns},
+    }
+    path = columns_path(file_path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    # A temporary file per process, so concurrent compactions don't write to the same file.
+    temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temporary_path, "wb") as file:
+        file.write(pack_columns(header, arrays))
+    os.replace(temporary_path, path)
+    return True
+
+
+def compact_stream(stream: str) -> int:
+    """
+    Compacts all closed files of a stream that haven't been compacted yet.
+    Every file but the most recent one is considered closed.
+    Returns the number of files that were compacted.
+    """
+    files = get_file_index(stream).all_files()
+    compacted = 0
+    for item in files[:-1]:
+        if read_columns(item["path"]) is not None:
+            continue
+        if compact_file(item["path"]):
+            compacted += 1
+    return compacted
+
+
+class ColumnFile:
+    """
+    Memory-mapped view on a compacted file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            self.header, self.columns = unpack_columns(
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            )
+        self.rows = self.header["rows"]
+
+
+def read_columns(file_path: Path) -> Optional[ColumnFile]:
+    """
+    Returns the compacted version of a CSV file, or None if it doesn't exist or the CSV changed
+     after it was compacted.
+    """
+    path = columns_path(file_path)
+    try:
+        column_file = ColumnFile(path)
+        stat_result = stat_file(file_path)
+    except (FileNotFoundError, ValueError):
+        return None
+    source = column_file.header["source"]
+    if source["size"] != stat_result.st_size or source["mtime"] != stat_result.st_mtime_ns:
+        return None
+    return column_file
+
+
+def parse_csv_arrays(
+    file_path: Path, columns: Optional[Sequence[str]] = None
+) -> Tuple[Dict[str, np.ndarray], Optional[float]]:
+    """
+    Returns the selected numeric columns of a CSV file as arrays, with the Datetime column as
+     epoch microseconds, and the UTC offset of the datetimes in seconds (None if they are naive).
+    """
+    metrics.count(bytes_read=stat_file(file_path).st_size)
+    names, values = read_csv_fields(file_path, columns)
+    arrays = {}
+    utcoffset = None
+    for name, column_values in zip(names, values):
+        if name == "Datetime":
+            datetimes = [datetime.datetime.fromisoformat(value) for value in column_values]
+            if datetimes and datetimes[0].utcoffset() is not None:
+                utcoffset = datetimes[0].utcoffset().total_seconds()
+            arrays[name] = np.array(
+                [to_epoch_microseconds(datetime_) for datetime_ in datetimes],
+                dtype=np.int64,
+            )
+            continue
+        array = typed_column(list(column_values))
+        if array is not None:
+            arrays[name] = array
+    return arrays, utcoffset
+
+
+def parse_string_columns(
+    file_path: Path, columns: Optional[Sequence[str]] = None
+) -> Dict[str, List[str]]:
+    """
+    Returns the selected columns of a file (all of them by default) as lists of strings, exactly
+     as they are in the CSV. The compacted version of a file can't be used for this, since it
+     doesn't keep how the numbers were written, e.g. 21.50 would become 21.5.
+    """
+    metrics.count(bytes_read=stat_file(file_path).st_size)
+    names, values = read_csv_fields(file_path, columns)
+    if not values or not values[0]:
+        return {}
+    return {name: list(column_values) for name, column_values in zip(names, values)}
+
+
+def read_string_columns(
+    file_path: Path, columns: Optional[Sequence[str]] = None
+) -> Dict[str, List[str]]:
+    """
+    Returns the selected columns of a file (all of them by default) as lists of strings, through
+     the data cache. Only the selected columns are converted to strings.
+    The returned lists may be shared with the cache and must not be modified.
+    """
+    string_columns = data_cache.get(
+        file_path,
+        cache_kind("strings", columns),
+        lambda path: parse_string_columns(path, columns),
+        columns_size,
+    )
+    metrics.count(files=1, rows=len(string_columns.get("Datetime", [])))
+    return string_columns
+
+
+def read_arrays(
+    file_path: Path,
+    start_datetime: Optional[datetime.datetime] = None,
+    end_datetime: Optional[datetime.datetime] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> Tuple[Dict[str, np.ndarray], Optional[float]]:
+    """
+    Returns the selected numeric columns of a file (all of them by default) as arrays, with the
+     Datetime column as epoch microseconds, and the UTC offset of the datetimes in seconds (None
+     if they are naive).
+    Only the rows in between the start and end datetimes, inclusive, are returned, found by binary
+     search over the timestamps.
+    The compacted version of the file is used when it exists, otherwise the parsed CSV goes
+     through the data cache. Columns that aren't numeric are left out.
+    """
+    column_file = read_columns(file_path)
+    if column_file is not None:
+        arrays = {
+            name: array
+            for name, array in column_file.columns.items()
+            if is_selected(name, columns)
+        }
+        utcoffset = column_file.header["utcoffset"]
+    else:
+        arrays, utcoffset = data_cache.get(
+            file_path,
+            cache_kind("arrays", columns),
+            lambda path: parse_csv_arrays(path, columns),
+            lambda value: columns_size(value[0]),
+        )
+    timestamps = arrays.get("Datetime")
+    if timestamps is None:
+        return {}, utcoffset
+    start = 0
+    stop = len(timestamps)
+    if start_datetime is not None:
+        start = np.searchsorted(timestamps, to_epoch_microseconds(start_datetime), "left")
+    if end_datetime is not None:
+        stop = np.searchsorted(timestamps, to_epoch_microseconds(end_datetime), "right")
+    arrays = {name: array[start:stop] for name, array in arrays.items()}
+    metrics.count(files=1, rows=len(timestamps))
+    if column_file is not None:
+        # Only the pages of the memory map that are used are read.
+        metrics.count(bytes_read=sum(array.nbytes for array in arrays.values()))
+    return arrays, utcoffset
+
+
+def concatenate_arrays(parts: Dict[str, List[np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Returns the arrays of a number of files concatenated per column.
+    Columns that are missing or not numeric in some files can't be aligned, so they're dropped.
+    """
+    if "Datetime" not in parts:
+        return {}
+    lengths = [len(array) for array in parts["Datetime"]]
+    return {
+        name: np.concatenate(arrays)
+        for name, arrays in parts.items()
+        if [len(array) for array in arrays] == lengths
+    }
+
+
+def load_range(
+    stream: str, start_datetime: datetime.datetime, end_datetime: datetime.datetime
+) -> Tuple[Dict[str, np.ndarray], Optional[float]]:
+    """
+    Returns the numeric columns of a stream between the start and end datetimes, inclusive, as
+     concatenated arrays, and the UTC offset of the datetimes in seconds.
+    """
+    files = get_file_index(stream).files_between(start_datetime, end_datetime)
+    parts: Dict[str, List[np.ndarray]] = {}
+    utcoffset = None
+    for index, item in enumerate(files):
+        # Only the first and last file can contain rows outside of the range.
+        boundary = index in (0, len(files) - 1)
+        arrays, utcoffset = read_arrays(
+            item["path"],
+            start_datetime if boundary else None,
+            end_datetime if boundary else None,
+        )
+        for name, array in arrays.items():
+            parts.setdefault(name, []).append(array)
+    return concatenate_arrays(parts), utcoffset
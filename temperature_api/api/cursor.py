@@ -0,0 +1,129 @@
+"""
+Stateless keyset pagination, where the request for the next page carries everything needed to
+ serve it in an opaque cursor.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from pathlib import Path
+from typing import List, Optional, Union
+
+from temperature_api.api.metrics import metrics
+from temperature_api.api.pagination import Pagination
+
+
+def encode_cursor(cursor: dict) -> str:
+    """
+    Encodes a cursor as a URL safe string.
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps(cursor, separators=(",", ":")).encode("utf-8")
+    ).decode("ascii")
+
+
+def decode_cursor(token: str) -> Optional[dict]:
+    """
+    Decodes a cursor into the keyword arguments of the CursorPagination of the page it points to,
+     or returns None if the cursor is invalid.
+    """
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return {
+            "stream": str(cursor["stream"]),
+            "start_datetime": datetime.datetime.fromisoformat(cursor["start"]),
+            "end_datetime": datetime.datetime.fromisoformat(cursor["end"]),
+            "minimum_items_per_page": int(cursor["minimumItemsPerPage"]),
+            "after": datetime.datetime.fromisoformat(cursor["after"]),
+            "page": int(cursor["page"]),
+            "columns": None
+            if cursor.get("columns") is None
+            else [str(column) for column in cursor["columns"]],
+        }
+    except (
+        AttributeError,
+        binascii.Error,
+        KeyError,
+        TypeError,
+        UnicodeError,
+        ValueError,
+    ):
+        return None
+
+
+class CursorPagination(Pagination):
+    """
+    Pagination that only looks up the files of the requested page.
+    The cursor of the next page holds the stream, the range, the page size, the selected columns
+     and the start hour of the last file served, so no pagination has to be stored and nothing
+     has to be loaded from the pagination database to continue.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        start_datetime=None,
+        end_datetime=None,
+        minimum_items_per_page=10_000,
+        after=None,
+        page=0,
+        columns=None,
+    ) -> None:
+        self.stream = stream
+        self.start_datetime = start_datetime
+        self.end_datetime = end_datetime
+        self.minimum_items_per_page = minimum_items_per_page
+        self.columns = columns
+        self.page = page
+        with metrics.timer("files"):
+            files = self.get_all_files(
+                None if after is None else after + datetime.timedelta(hours=1)
+            )
+            pages = self.plan_pages(files)
+        self.data = [item for item in pages if item["page"] == 0]
+        self.has_next_page = len(pages) > len(self.data)
+        self.last_start_hour = files[len(self.data) - 1]["start_hour"] if files else None
+
+    def get_page_file_paths(self, requested_page=0) -> Union[dict, List[Path]]:
+        """
+        Returns the files of the page the cursor points to, or a dictionary with a message if there
+         are none.
+        """
+        if not self.data:
+            return {
+                "message": f"No valid files found for stream={self.stream} and datetime range of \
+{self.start_datetime.isoformat()} to {self.end_datetime.isoformat()}"
+            }
+        return [item["path"] for item in self.data]
+
+    def get_page_metadata(self, requested_page=0) -> dict:
+        """
+        Returns everything but the data of the response for the page, with the cursor of the next
+         page if there is one.
+        """
+        return_value = {
+            "metadata": {
+                "stream": self.stream,
+                "startDatetime": self.start_datetime.isoformat(),
+                "endDatetime": self.end_datetime.isoformat(),
+                "minumumItemsPerPage": self.minimum_items_per_page,
+                "columns": self.columns,
+                "page": self.page,
+            }
+        }
+        if self.has_next_page:
+            return_value["bodyNextPage"] = {
+                "cursor": encode_cursor(
+                    {
+                        "stream": self.stream,
+                        "start": self.start_datetime.isoformat(),
+                        "end": self.end_datetime.isoformat(),
+                        "minimumItemsPerPage": self.minimum_items_per_page,
+                        "after": self.last_start_hour.isoformat(),
+                        "page": self.page + 1,
+                        "columns": self.columns,
+                    }
+                )
+            }
+        return return_value
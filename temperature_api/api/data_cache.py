@@ -0,0 +1,108 @@
+"""
+In-process cache of the parsed columns of data files, so that clients asking for (nearly) the same
+ window again don't re-read and re-parse the same files.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+
+from constants import DATA_CACHE_MAX_BYTES
+from temperature_api.api.bundles import stat_file
+
+
+def columns_size(columns: Dict[str, Any]) -> int:
+    """
+    Returns an estimate of the number of bytes used by a dictionary of columns, which are either
+     numpy arrays or lists of strings.
+    """
+    size = 0
+    for values in columns.values():
+        if isinstance(values, np.ndarray):
+            size += values.nbytes
+        else:
+            size += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+    return size
+
+
+class DataCache:
+    """
+    Least recently used cache of parsed file data, capped at a number of bytes.
+    Entries are keyed on the path, size and modification time of the file, so a file that is still
+     being written to is parsed again once it has grown.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        # The key of the cached version of every (path, kind), to drop it once the file changes.
+        self.keys: Dict[Tuple[str, str], Tuple] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        file_path: Path,
+        kind: str,
+        loader: Callable[[Path], Any],
+        sizer: Callable[[Any], int],
+    ) -> Any:
+        """
+        Returns the cached kind of data of a file, or loads and caches it with the loader.
+        """
+        stat_result = stat_file(file_path)
+        key = (str(file_path), kind, stat_result.st_size, stat_result.st_mtime_ns)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+        value = loader(file_path)
+        size = sizer(value)
+        if size > self.max_bytes:
+            return value
+        with self.lock:
+            old_key = self.keys.get(key[:2])
+            if old_key is not None and old_key in self.entries:
+                self.bytes -= self.entries.pop(old_key)[1]
+            if key not in self.entries:
+                self.entries[key] = (value, size)
+                self.keys[key[:2]] = key
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_key, (_, old_size) = self.entries.popitem(last=False)
+                self.keys.pop(old_key[:2], None)
+                self.bytes -= old_size
+        return value
+
+    def clear(self) -> None:
+        """
+        Removes all entries from the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.keys.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters and the size of the cache.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "maxBytes": self.max_bytes,
+            }
+
+
+data_cache = DataCache(DATA_CACHE_MAX_BYTES)
@@ -0,0 +1,244 @@
+"""
+Reduces the data of a stream to a limited number of points, either as aggregates over fixed time
+ buckets or by Largest-Triangle-Three-Buckets (LTTB) selection.
+"""
+
+import datetime
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from temperature_api.api.aggregation import aggregate_buckets, merge_buckets
+from temperature_api.api.column_store import (
+    datetime_strings,
+    load_range,
+    to_epoch_microseconds,
+)
+from temperature_api.api.encoding import encode_binary, typed_arrays
+from temperature_api.api.file_index import get_file_index
+from temperature_api.api.rollups import TIERS, aggregate_range, choose_tier
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Returns the indices of at most max_points points that preserve the visual shape of the series,
+     using the Largest-Triangle-Three-Buckets algorithm.
+    Points without a value (NaN) are never selected.
+    """
+    if values.dtype.kind == "f":
+        valid = ~np.isnan(values)
+        if not valid.all():
+            # A NaN would make the areas of a whole bucket NaN, so the points are selected from
+            #  the ones with a value.
+            kept = np.flatnonzero(valid)
+            return kept[lttb(timestamps[kept], values[kept], max_points)]
+    length = len(timestamps)
+    if max_points >= length or max_points < 3:
+        return np.arange(min(length, max(max_points, 0)))
+    x = (timestamps - timestamps[0]).astype(np.float64)
+    y = values.astype(np.float64)
+    # The first and last point are always kept, the rest is divided over max_points - 2 buckets.
+    edges = np.linspace(1, length - 1, max_points - 1).astype(np.int64)
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = length - 1
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        next_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+        previous = indices[bucket]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        indices[bucket + 1] = start + np.argmax(areas)
+    return indices
+
+
+def aggregate(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    bucket_seconds: float,
+) -> Tuple[Dict[str, Dict[str, np.ndarray]], Optional[float], Optional[int]]:
+    """
+    Returns the aggregates per column of the time buckets between the start and end datetimes,
+     inclusive, the UTC offset of the datetimes and the rollup tier that was used, if any.
+    """
+    bucket_microseconds = max(int(bucket_seconds * 1_000_000), 1)
+    tier = choose_tier(bucket_seconds)
+    if tier is not None:
+        columns, utcoffset = aggregate_range(stream, start_datetime, end_datetime, tier)
+        return (
+            {
+                name: merge_buckets(aggregates, bucket_microseconds)
+                for name, aggregates in columns.items()
+            },
+            utcoffset,
+            tier,
+        )
+    columns, utcoffset = load_range(stream, start_datetime, end_datetime)
+    timestamps = columns.pop("Datetime", None)
+    return (
+        {
+            name: aggregate_buckets(timestamps, values, bucket_microseconds)
+            for name, values in columns.items()
+        },
+        utcoffset,
+        None,
+    )
+
+
+def lttb_resolution(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    max_points: int,
+) -> Optional[int]:
+    """
+    Returns the coarsest rollup tier that still has at least max_points buckets in the part of
+     the range that the stream has files for, or None if the raw rows are needed.
+    """
+    files = get_file_index(stream).files_between(start_datetime, end_datetime)
+    if not files:
+        return None
+    span = min(
+        to_epoch_microseconds(end_datetime),
+        to_epoch_microseconds(files[-1]["start_hour"] + datetime.timedelta(hours=1)),
+    ) - max(
+        to_epoch_microseconds(start_datetime),
+        to_epoch_microseconds(files[0]["start_hour"]),
+    )
+    tiers = [tier for tier in TIERS if tier * 1_000_000 * max_points <= span]
+    return tiers[-1] if tiers else None
+
+
+def downsample_arrays(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    bucket_seconds: Optional[float] = None,
+    max_points: Optional[int] = None,
+) -> Tuple[Dict[str, Dict[str, np.ndarray]], Optional[float], Optional[int]]:
+    """
+    Returns the downsampled arrays per numeric column, the UTC offset of the datetimes and the
+     rollup tier that was used, if any.
+    With bucket_seconds every column has the start of its buckets as Datetime and the min, mean,
+     max and last value per bucket, with max_points the Datetime and values of the points LTTB
+     selected. Datetime is in epoch microseconds.
+    Both use the coarsest rollup tier that still satisfies the requested resolution, LTTB then
+     selects from the bucket means.
+    """
+    if bucket_seconds is not None:
+        columns, utcoffset, tier = aggregate(
+            stream, start_datetime, end_datetime, bucket_seconds
+        )
+        return (
+            {
+                name: {
+                    "Datetime": aggregates["Datetime"],
+                    "min": aggregates["min"],
+                    "mean": aggregates["sum"] / aggregates["count"],
+                    "max": aggregates["max"],
+                    "last": aggregates["last"],
+                }
+                for name, aggregates in columns.items()
+            },
+            utcoffset,
+            tier,
+        )
+    tier = lttb_resolution(stream, start_datetime, end_datetime, max_points)
+    if tier is not None:
+        aggregated_columns, utcoffset = aggregate_range(
+            stream, start_datetime, end_datetime, tier
+        )
+        series = {
+            name: (aggregates["Datetime"], aggregates["sum"] / aggregates["count"])
+            for name, aggregates in aggregated_columns.items()
+        }
+    else:
+        columns, utcoffset = load_range(stream, start_datetime, end_datetime)
+        timestamps = columns.pop("Datetime", None)
+        series = {name: (timestamps, values) for name, values in columns.items()}
+    downsampled = {}
+    for name, (timestamps, values) in series.items():
+        indices = lttb(timestamps, values, max_points)
+        downsampled[name] = {"Datetime": timestamps[indices], "values": values[indices]}
+    return downsampled, utcoffset, tier
+
+
+def flatten_buckets(columns: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Returns the bucket aggregates of all columns as one set of equally long arrays, with a shared
+     Datetime column and a <column>.<aggregate> column per aggregate.
+    Columns whose buckets differ from those of the first column can't be aligned, so they're
+     dropped.
+    """
+    arrays = {}
+    for name, aggregates in columns.items():
+        if "Datetime" not in arrays:
+            arrays["Datetime"] = aggregates["Datetime"]
+        elif not np.array_equal(arrays["Datetime"], aggregates["Datetime"]):
+            continue
+        for key, values in aggregates.items():
+            if key != "Datetime":
+                arrays[f"{name}.{key}"] = values
+    return arrays
+
+
+def downsample(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    bucket_seconds: Optional[float] = None,
+    max_points: Optional[int] = None,
+    value_format: str = "string",
+) -> Union[dict, bytes]:
+    """
+    Returns the downsampled data of a stream between the start and end datetimes, inclusive, as
+     described for downsample_arrays.
+    With the "string" value format the datetimes are isoformat strings, with "typed" they are in
+     epoch milliseconds and the UTC offset of the datetimes is added to the metadata. With
+     "binary", which is only available for buckets, the flattened buckets are returned packed
+     with everything but the data in the header.
+    Returns a dictionary with a message if there's no data in the range.
+    """
+    columns, utcoffset, tier = downsample_arrays(
+        stream, start_datetime, end_datetime, bucket_seconds, max_points
+    )
+    if not columns:
+        return {
+            "message": f"No valid data found for stream={stream} and datetime range of \
+{start_datetime.isoformat()} to {end_datetime.isoformat()}"
+        }
+    return_value = {
+        "metadata": {
+            "stream": stream,
+            "startDatetime": start_datetime.isoformat(),
+            "endDatetime": end_datetime.isoformat(),
+            "bucketSeconds": bucket_seconds,
+            "maxPoints": max_points,
+            "rollupSeconds": tier,
+        },
+    }
+    if value_format != "string":
+        return_value["metadata"]["utcOffset"] = utcoffset
+    if value_format == "binary":
+        return encode_binary(return_value, typed_arrays(flatten_buckets(columns)))
+
+    data = {}
+    for name, arrays in columns.items():
+        if value_format == "string":
+            datetimes = datetime_strings(arrays["Datetime"], utcoffset)
+        else:
+            datetimes = (arrays["Datetime"] // 1000).tolist()
+        values = {key: array.tolist() for key, array in arrays.items() if key != "Datetime"}
+        if bucket_seconds is not None:
+            # The buckets are the same for every column.
+            data["Datetime"] = datetimes
+            data[name] = values
+        else:
+            data[name] = {"Datetime": datetimes, **values}
+    return_value["data"] = data
+    return return_value
@@ -0,0 +1,65 @@
+"""
+Typed and binary encodings of response data, so clients get numbers and timestamps they can use
+ without parsing every value.
+"""
+
+import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from column_format import pack_columns
+from temperature_api.api.column_store import to_epoch_microseconds, typed_column
+
+# "string" returns the values as they are in the CSV files, "typed" as JSON numbers with the
+#  Datetime column in epoch milliseconds, "binary" as packed column arrays.
+VALUE_FORMATS = ("string", "typed", "binary")
+BINARY_MIMETYPE = "application/octet-stream"
+
+
+def typed_arrays(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Returns numeric columns with the Datetime column converted from epoch microseconds to epoch
+     milliseconds.
+    """
+    typed = dict(arrays)
+    if "Datetime" in typed:
+        typed["Datetime"] = typed["Datetime"] // 1000
+    return typed
+
+
+def arrays_from_strings(data: Dict[str, List[str]]) -> Dict[str, np.ndarray]:
+    """
+    Returns the numeric columns of string data as arrays, with the Datetime column as epoch
+     microseconds. Columns that aren't numeric are left out.
+    """
+    arrays = {}
+    for name, values in data.items():
+        if name == "Datetime":
+            arrays[name] = np.array(
+                [
+                    to_epoch_microseconds(datetime.datetime.fromisoformat(value))
+                    for value in values
+                ],
+                dtype=np.int64,
+            )
+            continue
+        array = typed_column(values)
+        if array is not None:
+            arrays[name] = array
+    return arrays
+
+
+def to_lists(arrays: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """
+    Returns arrays as lists of Python numbers, for JSON responses.
+    """
+    return {name: array.tolist() for name, array in arrays.items()}
+
+
+def encode_binary(response: dict, arrays: Dict[str, np.ndarray]) -> bytes:
+    """
+    Returns a packed set of the columns with the rest of the response, everything but the data,
+     under "response" in the header.
+    """
+    return pack_columns({"response": response}, arrays)
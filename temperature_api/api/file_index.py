@@ -0,0 +1,352 @@
+"""
+Keeps a persistent index of the hourly files of every stream so that requests don't have to glob
+ and parse the filenames of the whole stream directory.
+Files that were archived into bundles are indexed as the members of their bundle.
+"""
+
+import bisect
+import datetime
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from constants import APP_DATA_DIR, DATA_DIR
+from temperature_api.api.bundles import (
+    BUNDLE_SUFFIX,
+    MemberStat,
+    get_members,
+    open_file,
+    stat_file,
+)
+
+FILE_INDEX_DATABASE = APP_DATA_DIR / "file_index.sqlite3"
+COUNT_BLOCK_SIZE = 1 << 20
+
+with sqlite3.connect(FILE_INDEX_DATABASE) as _connection:
+    _cursor = _connection.cursor()
+    # Lets worker processes read the index while another one is updating it.
+    _cursor.execute("PRAGMA journal_mode=WAL")
+    _cursor.execute(
+        "CREATE TABLE IF NOT EXISTS [file_index] ([stream] TEXT, [name] TEXT, [startHour] TEXT, \
+[rows] INTEGER, [size] INTEGER, [mtime] INTEGER, PRIMARY KEY ([stream], [name]))"
+    )
+    _connection.commit()
+    _cursor.close()
+_connection.close()
+
+
+def file_datetime_from_file_path(stream: str, file_path: Path) -> datetime.datetime:
+    """
+    Returns the start hour of a file from a file name formatted as <stream>_<isoformat>.csv, with
+     the colons in the datetime replaced by dots.
+    """
+    return datetime.datetime.fromisoformat(
+        file_path.name.removesuffix(file_path.suffix)
+        .removeprefix(f"{stream}_")
+        .replace(".", ":")
+    )
+
+
+def count_rows(file_path: Path, offset: int = 0, rows: int = 0) -> int:
+    """
+    Returns the number of data rows (lines minus the header) in a file.
+    When an offset and the number of rows up to that offset are given only the bytes after the
+     offset are read.
+    """
+    with open_file(file_path) as file:
+        if offset:
+            file.seek(offset - 1)
+            previous_byte = file.read(1)
+            # A line that wasn't terminated at the offset was already counted as a row.
+            newlines = rows + (1 if previous_byte == b"\n" else 0)
+        else:
+            previous_byte = b""
+            newlines = 0
+        last_byte = previous_byte
+        while block := file.read(COUNT_BLOCK_SIZE):
+            newlines += block.count(b"\n")
+            last_byte = block[-1:]
+    # Mirrors len(file.readlines()) - 1, which also counts a final line without a newline.
+    lines = newlines + (1 if last_byte not in (b"", b"\n") else 0)
+    return max(lines - 1, 0)
+
+
+class FileIndex:
+    """
+    Sorted index of the files of one stream with the start hour, row count, byte size and
+     modification time of each file.
+    The directory is only rescanned when its modification time changes, between scans only the
+     most recent file is checked for growth.
+    """
+
+    def __init__(self, stream: str) -> None:
+        self.stream = stream
+        self.directory = DATA_DIR / stream
+        self.directory_mtime = None
+        self.lock = threading.Lock()
+        self.start_hours: List[datetime.datetime] = []
+        self.files: List[dict] = []
+        self.load()
+
+    def relative_name(self, file_path: Path) -> str:
+        """
+        Returns the name a file is stored under in the file index database, its path relative to
+         the stream directory, which includes the bundle for archived files.
+        """
+        return file_path.relative_to(self.directory).as_posix()
+
+    def load(self) -> None:
+        """
+        Loads the index of the stream from the file index database.
+        """
+        with sqlite3.connect(FILE_INDEX_DATABASE) as connection:
+            connection.row_factory = sqlite3.Row
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT * FROM [file_index] WHERE [stream] = ?", (self.stream,)
+            )
+            files = [
+                {
+                    "path": self.directory / row["name"],
+                    "start_hour": datetime.datetime.fromisoformat(row["startHour"]),
+                    "rows": row["rows"],
+                    "size": row["size"],
+                    "mtime": row["mtime"],
+                }
+                for row in cursor.fetchall()
+            ]
+            cursor.close()
+        self.set_files(files)
+
+    def set_files(self, files: List[dict]) -> None:
+        """
+        Replaces the files in the index, sorted by start hour.
+        """
+        self.files = sorted(files, key=lambda item: item["start_hour"])
+        self.start_hours = [item["start_hour"] for item in self.files]
+
+    def store(self, files: List[dict], removed_names: Optional[List[str]] = None) -> None:
+        """
+        Writes new or changed files to the file index database and removes deleted ones.
+        """
+        if not files and not removed_names:
+            return
+        with sqlite3.connect(FILE_INDEX_DATABASE) as connection:
+            cursor = connection.cursor()
+            cursor.executemany(
+                "INSERT INTO [file_index] ([stream], [name], [startHour], [rows], [size], [mtime]) \
+VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT ([stream], [name]) DO UPDATE SET [rows] = excluded.[rows], \
+[size] = excluded.[size], [mtime] = excluded.[mtime]",
+                [
+                    (
+                        self.stream,
+                        self.relative_name(item["path"]),
+                        item["start_hour"].isoformat(),
+                        item["rows"],
+                        item["size"],
+                        item["mtime"],
+                    )
+                    for item in files
+                ],
+            )
+            cursor.executemany(
+                "DELETE FROM [file_index] WHERE [stream] = ? AND [name] = ?",
+                [(self.stream, name) for name in removed_names or []],
+            )
+            connection.commit()
+            cursor.close()
+
+    @staticmethod
+    def update_file(item: dict, stat_result: Union[os.stat_result, MemberStat]) -> bool:
+        """
+        Updates the row count, size and modification time of a file if it changed on disk.
+        Returns whether the file changed.
+        """
+        if (
+            stat_result.st_size == item["size"]
+            and stat_result.st_mtime_ns == item["mtime"]
+        ):
+            return False
+        if item["size"] is not None and stat_result.st_size > item["size"]:
+            # The file was appended to, only count the rows that were added.
+            item["rows"] = count_rows(item["path"], item["size"], item["rows"])
+        else:
+            item["rows"] = count_rows(item["path"])
+        item["size"] = stat_result.st_size
+        item["mtime"] = stat_result.st_mtime_ns
+        return True
+
+    def scan(self) -> None:
+        """
+        Rescans the stream directory, adding new files, updating changed ones and removing the
+         ones that no longer exist.
+        """
+        known_files: Dict[str, dict] = {
+            self.relative_name(item["path"]): item for item in self.files
+        }
+        # Every file as its path and its size and modification time, the bundles first.
+        found_files: List[Tuple[Path, Union[os.stat_result, MemberStat]]] = []
+        csv_files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(BUNDLE_SUFFIX):
+                    bundle_path = self.directory / entry.name
+                    mtime = entry.stat().st_mtime_ns
+                    found_files.extend(
+                        (bundle_path / name, MemberStat(info.file_size, mtime))
+                        for name, info in get_members(bundle_path).items()
+                    )
+                elif entry.name.endswith(".csv"):
+                    csv_files.append((self.directory / entry.name, entry.stat()))
+        archived_names = {path.name for path, _ in found_files}
+        # A file that is also in a bundle is left over from an interrupted archival, it's removed
+        #  by the next one.
+        found_files.extend(
+            (path, stat_result)
+            for path, stat_result in csv_files
+            if path.name not in archived_names
+        )
+
+        files = []
+        changed_files = []
+        for path, stat_result in found_files:
+            item = known_files.pop(self.relative_name(path), None)
+            if item is None:
+                try:
+                    start_hour = file_datetime_from_file_path(self.stream, path)
+                except ValueError:
+                    continue
+                item = {
+                    "path": path,
+                    "start_hour": start_hour,
+                    "rows": 0,
+                    "size": None,
+                    "mtime": None,
+                }
+            if self.update_file(item, stat_result):
+                changed_files.append(item)
+            files.append(item)
+        self.set_files(files)
+        self.store(changed_files, list(known_files))
+
+    def refresh(self) -> None:
+        """
+        Brings the index up to date with the stream directory.
+        """
+        directory_mtime = self.directory.stat().st_mtime_ns
+        if directory_mtime != self.directory_mtime:
+            self.scan()
+            self.directory_mtime = directory_mtime
+        elif self.files:
+            # Only the most recent file is expected to still be written to.
+            item = self.files[-1]
+            try:
+                stat_result = stat_file(item["path"])
+            except FileNotFoundError:
+                self.scan()
+                return
+            if self.update_file(item, stat_result):
+                self.store([item])
+
+    def files_between(
+        self,
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+    ) -> List[dict]:
+        """
+        Returns the indexed files whose start hour lies in between the hours of the start and end
+         datetimes, inclusive, sorted by start hour.
+        """
+        with self.lock:
+            self.refresh()
+            start = bisect.bisect_left(
+                self.start_hours,
+                start_datetime.replace(minute=0, second=0, microsecond=0),
+            )
+            end = bisect.bisect_right(
+                self.start_hours,
+                end_datetime.replace(minute=0, second=0, microsecond=0),
+            )
+            return [dict(item) for item in self.files[start:end]]
+
+    def check_files(self, files: List[dict]) -> List[dict]:
+        """
+        Validates the cached row counts of some of the indexed files against their current size
+         and modification time, recounting the files that changed.
+        Returns the files with their current row counts. Files that are no longer indexed are
+         returned as they are.
+        """
+        checked = []
+        changed = []
+        with self.lock:
+            for file in files:
+                index = bisect.bisect_left(self.start_hours, file["start_hour"])
+                item = self.files[index] if index < len(self.files) else None
+                if item is None or item["path"] != file["path"]:
+                    checked.append(file)
+                    continue
+                try:
+                    if self.update_file(item, stat_file(item["path"])):
+                        changed.append(item)
+                except FileNotFoundError:
+                    pass
+                checked.append(dict(item))
+            self.store(changed)
+        return checked
+
+    def resolve_paths(self, file_paths: List[Path]) -> List[Optional[Path]]:
+        """
+        Returns the paths the files of the stream are indexed under now, found by their names,
+         which stay the same when a file is archived into a bundle.
+        Files that are no longer indexed are returned as None.
+        """
+        resolved = []
+        with self.lock:
+            self.refresh()
+            for file_path in file_paths:
+                index = bisect.bisect_left(
+                    self.start_hours, file_datetime_from_file_path(self.stream, file_path)
+                )
+                item = self.files[index] if index < len(self.files) else None
+                resolved.append(
+                    item["path"]
+                    if item is not None and item["path"].name == file_path.name
+                    else None
+                )
+        return resolved
+
+    def files_from(self, start_datetime: datetime.datetime) -> List[dict]:
+        """
+        Returns the indexed files that can hold rows at or after the start datetime, the last file
+         that starts at or before it and all files after that, sorted by start hour.
+        """
+        with self.lock:
+            self.refresh()
+            start = bisect.bisect_right(self.start_hours, start_datetime) - 1
+            return [dict(item) for item in self.files[max(start, 0) :]]
+
+    def all_files(self) -> List[dict]:
+        """
+        Returns all indexed files of the stream, sorted by start hour.
+        """
+        with self.lock:
+            self.refresh()
+            return [dict(item) for item in self.files]
+
+
+_file_indexes: Dict[str, FileIndex] = {}
+_file_indexes_lock = threading.Lock()
+
+
+def get_file_index(stream: str) -> FileIndex:
+    """
+    Returns the file index of a stream, loading it on first use.
+    """
+    with _file_indexes_lock:
+        if stream not in _file_indexes:
+            _file_indexes[stream] = FileIndex(stream)
+        return _file_indexes[stream]
@@ -0,0 +1,211 @@
+"""
+Collects the time spent in each phase of the requests to the API and the work they do, and formats
+ them in the Prometheus text format.
+Every worker process of the production server keeps its own metrics.
+"""
+
+import contextlib
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, List, Tuple
+
+# Upper bounds in seconds of the buckets of the histograms.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PREFIX = "temperature_api"
+
+# Endpoint of the request that is being handled, to label the metrics recorded while handling it.
+_endpoint: ContextVar[str] = ContextVar("endpoint", default="none")
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    """
+    Returns the label set of a sample, e.g. {endpoint="streams",phase="read"}.
+    """
+    escaped = (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Histogram:
+    """
+    Counts observations per bucket for every combination of label values.
+    """
+
+    def __init__(
+        self, name: str, description: str, label_names: Tuple[str, ...], buckets=BUCKETS
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # Per label values the counts per bucket, the sum and the count of the observations.
+        self.samples: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        """
+        Adds an observation.
+        """
+        with self.lock:
+            sample = self.samples.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def format(self) -> List[str]:
+        """
+        Returns the lines of the histogram in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            samples = [
+                (label_values, list(bucket_counts), total, count)
+                for label_values, (bucket_counts, total, count) in self.samples.items()
+            ]
+        for label_values, bucket_counts, total, count in sorted(samples):
+            labels = format_labels(self.label_names, label_values)
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    """
+    Sums amounts for every combination of label values.
+    """
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...]) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        self.samples: Dict[Tuple[str, ...], float] = {}
+
+    def increment(self, label_values: Tuple[str, ...], amount: float = 1) -> None:
+        """
+        Adds an amount.
+        """
+        with self.lock:
+            self.samples[label_values] = self.samples.get(label_values, 0) + amount
+
+    def format(self) -> List[str]:
+        """
+        Returns the lines of the counter in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            samples = sorted(self.samples.items())
+        for label_values, value in samples:
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+class Metrics:
+    """
+    The metrics of the API, labelled with the endpoint of the request they were recorded in.
+    """
+
+    def __init__(self) -> None:
+        self.request_seconds = Histogram(
+            f"{PREFIX}_request_seconds",
+            "Time spent handling requests.",
+            ("endpoint", "status"),
+        )
+        self.phase_seconds = Histogram(
+            f"{PREFIX}_phase_seconds",
+            "Time spent in each phase of handling requests.",
+            ("endpoint", "phase"),
+        )
+        self.files_touched = Counter(
+            f"{PREFIX}_files_touched_total", "Data files read.", ("endpoint",)
+        )
+        self.rows_scanned = Counter(
+            f"{PREFIX}_rows_scanned_total", "Rows in the data files read.", ("endpoint",)
+        )
+        self.bytes_read = Counter(
+            f"{PREFIX}_bytes_read_total",
+            "Bytes of data files parsed, files served from the data cache aren't counted.",
+            ("endpoint",),
+        )
+
+    @staticmethod
+    def set_endpoint(endpoint: str) -> Token:
+        """
+        Labels the metrics recorded in the current context with an endpoint.
+        Returns the token to reset it with.
+        """
+        return _endpoint.set(endpoint)
+
+    @staticmethod
+    def reset_endpoint(token: Token) -> None:
+        """
+        Restores the endpoint from before set_endpoint.
+        """
+        _endpoint.reset(token)
+
+    @staticmethod
+    def iter_labelled(iterator: Iterator) -> Iterator:
+        """
+        Returns a generator yielding from an iterator with the endpoint of the current request,
+         for streamed responses that are produced after the request handler returned.
+        """
+        endpoint = _endpoint.get()
+
+        def generate():
+            token = _endpoint.set(endpoint)
+            try:
+                yield from iterator
+            finally:
+                _endpoint.reset(token)
+
+        return generate()
+
+    @contextlib.contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        """
+        Records the time spent in the with block as a phase of the current request.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds.observe((_endpoint.get(), phase), time.perf_counter() - start)
+
+    def count(self, files: int = 0, rows: int = 0, bytes_read: int = 0) -> None:
+        """
+        Adds to the files touched, rows scanned and bytes read of the current request.
+        """
+        endpoint = (_endpoint.get(),)
+        if files:
+            self.files_touched.increment(endpoint, files)
+        if rows:
+            self.rows_scanned.increment(endpoint, rows)
+        if bytes_read:
+            self.bytes_read.increment(endpoint, bytes_read)
+
+    def format(self) -> str:
+        """
+        Returns all metrics in the Prometheus text format.
+        """
+        lines = []
+        for metric in (
+            self.request_seconds,
+            self.phase_seconds,
+            self.files_touched,
+            self.rows_scanned,
+            self.bytes_read,
+        ):
+            lines.extend(metric.format())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
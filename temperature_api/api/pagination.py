@@ -2,26 +2,73 @@
 See class docstring.
 """
 
+import bisect
 import csv
 import datetime
 import json
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 import uuid6
 
 from constants import APP_DATA_DIR, DATA_DIR, datetime_now_local
+from temperature_api.api.bundles import open_file
+from temperature_api.api.column_store import (
+    concatenate_arrays,
+    read_arrays,
+    read_string_columns,
+)
+from temperature_api.api.encoding import encode_binary, to_lists, typed_arrays
+from temperature_api.api.file_index import get_file_index
+from temperature_api.api.metrics import metrics
 
 PAGINATION_DATABASE = APP_DATA_DIR / "pagination.sqlite3"
+# Seconds between two sweeps of the expiry sweeper.
+PAGINATION_SWEEP_INTERVAL = 10 * 60
+# Expired paginations deleted per transaction, so a sweep never holds the write lock for long.
+PAGINATION_DELETE_BATCH = 1000
 
 with sqlite3.connect(PAGINATION_DATABASE) as _connection:
     _cursor = _connection.cursor()
+    _cursor.execute("PRAGMA journal_mode=WAL")
+    _columns = [
+        column[1] for column in _cursor.execute("PRAGMA table_info([pagination])")
+    ]
+    if _columns and "expires" not in _columns:
+        # The table of older versions has no key or expires column, all it holds are short-lived
+        #  paginations so it's replaced rather than migrated.
+        _cursor.execute("DROP TABLE [pagination]")
     _cursor.execute(
-        "CREATE TABLE IF NOT EXISTS [pagination] ([paginationId], [pagination])"
+        "CREATE TABLE IF NOT EXISTS [pagination] ([paginationId] TEXT PRIMARY KEY, \
+[expires] REAL NOT NULL, [pagination] TEXT NOT NULL)"
+    )
+    _cursor.execute(
+        "CREATE INDEX IF NOT EXISTS [paginationExpires] ON [pagination] ([expires])"
     )
     _connection.commit()
     _cursor.close()
+# Connections must not be inherited by the forked worker processes of the production server.
+_connection.close()
+
+_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns the connection to the pagination database of the current thread, opening it on first
+     use.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(PAGINATION_DATABASE)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA synchronous=NORMAL")
+        _local.connection = connection
+    return connection
 
 
 class Pagination:
@@ -36,6 +83,7 @@ class Pagination:
         end_datetime=None,
         minimum_items_per_page=10_000,
         serialized_pagination=None,
+        columns=None,
     ) -> None:
         if serialized_pagination is not None:
             self.deserialize(serialized_pagination)
@@ -46,12 +94,9 @@ class Pagination:
         self.start_datetime = start_datetime
         self.end_datetime = end_datetime
         self.minimum_items_per_page = minimum_items_per_page
-        all_file_paths = self.get_all_file_paths()
-        self.data = (
-            [{"path": path, "page": None} for path in all_file_paths]
-            if all_file_paths
-            else []
-        )
+        self.columns = columns
+        with metrics.timer("files"):
+            self.data = self.plan_pages(self.get_all_files())
 
     def to_dict(self) -> dict:
         """
@@ -75,6 +120,7 @@ class Pagination:
                 "startDatetime": self.start_datetime.isoformat(),
                 "endDatetime": self.end_datetime.isoformat(),
                 "minumumItemsPerPage": self.minimum_items_per_page,
+                "columns": self.columns,
             },
         }
 
@@ -105,6 +151,8 @@ class Pagination:
             dictionary_["metadata"]["endDatetime"]
         )
         self.minimum_items_per_page = dictionary_["metadata"]["minumumItemsPerPage"]
+        # Paginations stored before columns could be selected have all of them.
+        self.columns = dictionary_["metadata"].get("columns")
 
     def dump(self) -> None:
         """
@@ -112,31 +160,14 @@ class Pagination:
         INSERT if it doesn't yet exist.
         UPDATE if it does.
         """
-        with sqlite3.connect(PAGINATION_DATABASE) as connection:
-            connection.row_factory = sqlite3.Row
-            cursor = connection.cursor()
-            cursor.execute(
-                "SELECT * FROM [pagination] WHERE [paginationId] = ?",
-                (self.id,),
+        connection = get_connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO [pagination] ([paginationId], [expires], [pagination]) \
+VALUES (?, ?, ?) ON CONFLICT ([paginationId]) DO UPDATE SET [expires] = excluded.[expires], \
+[pagination] = excluded.[pagination]",
+                (self.id, self.expires.timestamp(), self.serialize()),
             )
-            if cursor.fetchone():
-                cursor.execute(
-                    "UPDATE [pagination] SET [pagination] = ? WHERE [paginationId] = ?",
-                    (
-                        self.serialize(),
-                        self.id,
-                    ),
-                )
-            else:
-                cursor.execute(
-                    "INSERT INTO [pagination] ([paginationId], [pagination]) VALUES (?, ?)",
-                    (
-                        self.id,
-                        self.serialize(),
-                    ),
-                )
-            connection.commit()
-            cursor.close()
 
     def is_expired(self) -> bool:
         """
@@ -144,33 +175,19 @@ class Pagination:
         """
         return self.expires < datetime_now_local()
 
-    def get_all_file_paths(self) -> List[Path]:
+    def get_all_files(self, from_datetime=None) -> List[dict]:
         """
-        Get all files for the selected stream that are timestamped in between the start and end
-         datetimes.
+        Get the file index entries, including their row counts, of all files for the selected
+         stream that are timestamped in between the start (or from) and end datetimes.
         """
-
-        def file_datetime_from_file_path(file_path):
-            return datetime.datetime.fromisoformat(
-                file_path.name.removesuffix(file_path.suffix)
-                .removeprefix(f"{self.stream}_")
-                .replace(".", ":")
-            )
-
-        file_paths = []
-        for file_path in (DATA_DIR / self.stream).glob("*.csv"):
-            file_datetime = file_datetime_from_file_path(file_path)
-            if (
-                self.start_datetime.replace(minute=0, second=0, microsecond=0)
-                <= file_datetime
-                <= self.end_datetime.replace(minute=0, second=0, microsecond=0)
-            ):
-                file_paths.append(file_path)
-
-        file_paths = sorted(file_paths, key=file_datetime_from_file_path)
+        files = get_file_index(self.stream).files_between(
+            from_datetime or self.start_datetime, self.end_datetime
+        )
+        if not files:
+            return files
         # Here we check if the last file, whether it actually has a row of data for us that we can
         #  return to the user.
-        with open(file_paths[-1], encoding="utf-8") as file:
+        with open_file(files[-1]["path"], text=True) as file:
             reader = csv.DictReader(file)
             # We don't expect to ever not get a row back, as files should never be empty/only have
             #  a header, but this excepts that case.
@@ -183,132 +200,338 @@ class Pagination:
                 <= datetime.datetime.fromisoformat(row["Datetime"])
                 <= self.end_datetime
             ):
-                file_paths.pop()
-        return file_paths
+                files.pop()
+        return files
 
-    def get_file_paths_for_page(self, requested_page=0) -> Union[dict, List[Path]]:
+    def get_all_file_paths(self) -> List[Path]:
+        """
+        Get all files for the selected stream that are timestamped in between the start and end
+         datetimes.
+        """
+        return [item["path"] for item in self.get_all_files()]
+
+    def assign_pages(self, files: List[dict]) -> List[dict]:
         """
         Assigns files to pages based on the minimum number of items per page set and the number of
-         lines per files.
+         rows per file known to the file index.
+        The page plan is made once, so requesting any page later on doesn't need to read files
+         other than the ones on that page.
+        """
+        data = []
+        page_nr = 0
+        items_selected = 0
+        for item in files:
+            data.append({"path": item["path"], "page": page_nr})
+            items_selected += item["rows"]
+            if items_selected >= self.minimum_items_per_page:
+                page_nr += 1
+                items_selected = 0
+        return data
+
+    def plan_pages(self, files: List[dict]) -> List[dict]:
+        """
+        Assigns files to pages as assign_pages does, after validating the row counts of the files
+         on the first page, the one that is served now, against the files on disk.
+        The row counts of the other files are taken from the file index as they are, it already
+         keeps the most recent file, the only one that is still written to, up to date.
+        """
+        checked = 0
+        while True:
+            pages = self.assign_pages(files)
+            first_page = sum(1 for item in pages if item["page"] == 0)
+            if first_page <= checked:
+                return pages
+            # Changed row counts can move the end of the first page, so the files it has after
+            #  assigning again are checked as well.
+            files[checked:first_page] = get_file_index(self.stream).check_files(
+                files[checked:first_page]
+            )
+            checked = first_page
+
+    def get_file_paths_for_page(self, requested_page=0) -> Union[dict, List[Path]]:
+        """
+        Returns the files assigned to the requested page.
         """
         if requested_page < 0:
             return {
                 "message": f"Invalid page number {requested_page}. \
 Page number needs to be 0 or greater."
             }
-        for page_nr in range(requested_page + 1):
-            if page_nr in (item["page"] for item in self.data):
-                continue
-            items_selected = 0
-            for item in self.data:
-                if item["page"] is not None:
-                    continue
-                # Subtracting one for the header.
-                items_selected += (
-                    len(open(item["path"], encoding="utf-8").readlines()) - 1
-                )
-                item["page"] = page_nr
-                if items_selected >= self.minimum_items_per_page:
-                    break
-        available_page_numbers = [item["page"] for item in self.data]
-        if requested_page not in available_page_numbers:
+        last_page = self.data[-1]["page"] if self.data else 0
+        if requested_page > last_page:
             return {
                 "message": f"Invalid page number, {requested_page} is greater than the number of \
-pages available ({max(available_page_numbers)})."
+pages available ({last_page})."
             }
         return [item["path"] for item in self.data if item["page"] == requested_page]
 
-    def get_data(self, requested_page=0) -> dict:
+    def read_file(self, file_path: Path, filter_rows: bool = True) -> dict:
         """
-        Returns a dictionary of lists containing all the present raw data for the paginated stream
-        between the start and end datetimes, inclusive, for the requested page.
-        If no page is specified, the first one is returned.
+        Returns a dictionary of lists with the raw data of the selected columns of a file between
+         the start and end datetimes, inclusive.
+        Rows in a file are ordered by time, so the rows in range are found by binary search.
+        Files that lie completely within the range can be read without filter_rows.
+        The parsed file comes from the data cache when it's there.
+        """
+        columns = read_string_columns(file_path, self.columns)
+        if not filter_rows or not columns:
+            return columns
+        start = bisect.bisect_left(
+            columns["Datetime"], self.start_datetime, key=datetime.datetime.fromisoformat
+        )
+        stop = bisect.bisect_right(
+            columns["Datetime"], self.end_datetime, key=datetime.datetime.fromisoformat
+        )
+        return {key: values[start:stop] for key, values in columns.items()}
+
+    def read_file_arrays(
+        self, file_path: Path, filter_rows: bool = True
+    ) -> Tuple[Dict[str, np.ndarray], Optional[float]]:
+        """
+        Returns the selected numeric columns of a file between the start and end datetimes,
+         inclusive, as arrays with the Datetime column in epoch microseconds, and the UTC offset of
+         the datetimes in seconds.
+        """
+        if not filter_rows:
+            return read_arrays(file_path, columns=self.columns)
+        return read_arrays(
+            file_path, self.start_datetime, self.end_datetime, self.columns
+        )
+
+    def get_page_file_paths(self, requested_page=0) -> Union[dict, List[Path]]:
+        """
+        Validates a request for a page and extends the expiry of the pagination.
+        Returns the files of the requested page, or a dictionary with a message if the page can't
+         be served.
         """
         if not self.data:
             return {
                 "message": f"No valid files found for stream={self.stream} and datetime range of \
 {self.start_datetime.isoformat()} to {self.end_datetime.isoformat()}"
             }
+        example_data = json.dumps(
+            {
+                "stream": self.stream,
+                "startDatetime": self.start_datetime.isoformat(),
+                "endDatetime": self.end_datetime.isoformat(),
+                "minimumItemsPerPage": self.minimum_items_per_page,
+                "columns": self.columns,
+            },
+            indent=4,
+        )
         if self.is_expired():
-            example_data = json.dumps(
-                {
-                    "stream": self.stream,
-                    "startDatetime": self.start_datetime.isoformat(),
-                    "endDatetime": self.end_datetime.isoformat(),
-                    "minimumItemsPerPage": self.minimum_items_per_page,
-                },
-                indent=4,
-            )
             return {
                 "message": f"This pagination ID has expired since {self.expires.isoformat()}. \
 Please send a fresh request. \
+Based on the data for this pagination ID that POST request would use the data: {example_data}"
+            }
+        if not self.resolve_paths():
+            return {
+                "message": f"The files of this pagination ID have changed since it was created. \
+Please send a fresh request. \
 Based on the data for this pagination ID that POST request would use the data: {example_data}"
             }
         self.expires = datetime_now_local() + datetime.timedelta(days=1)
-        file_paths = self.get_file_paths_for_page(requested_page)
-        if not isinstance(file_paths, list):
-            return file_paths
-        data = {}
+        return self.get_file_paths_for_page(requested_page)
+
+    def resolve_paths(self) -> bool:
+        """
+        Points the files of the pagination at the paths they are indexed under now, as files that
+         were archived since the pagination was created have moved into a bundle.
+        Returns False if any of the files no longer exists.
+        """
+        paths = get_file_index(self.stream).resolve_paths([item["path"] for item in self.data])
+        if None in paths:
+            return False
+        for item, path in zip(self.data, paths):
+            item["path"] = path
+        return True
+
+    def iter_data(self, file_paths: List[Path]) -> Iterator[dict]:
+        """
+        Yields a dictionary of lists with the data in range for each of the files, one file at a
+         time.
+        """
+        # Only the first and last file of the range can contain rows outside of it.
+        boundary_file_paths = (self.data[0]["path"], self.data[-1]["path"])
         for file_path in file_paths:
-            with open(file_path, encoding="utf-8") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    if (
-                        self.start_datetime
-                        <= datetime.datetime.fromisoformat(row["Datetime"])
-                        <= self.end_datetime
-                    ):
-                        for key, value in row.items():
-                            if key not in data:
-                                data[key] = []
-                            data[key].append(value)
-        self.dump()
+            yield self.read_file(file_path, filter_rows=file_path in boundary_file_paths)
+
+    def iter_arrays(
+        self, file_paths: List[Path]
+    ) -> Iterator[Tuple[Dict[str, np.ndarray], Optional[float]]]:
+        """
+        Yields the numeric columns in range and the UTC offset for each of the files, one file at
+         a time.
+        """
+        boundary_file_paths = (self.data[0]["path"], self.data[-1]["path"])
+        for file_path in file_paths:
+            yield self.read_file_arrays(
+                file_path, filter_rows=file_path in boundary_file_paths
+            )
+
+    def get_page_metadata(self, requested_page=0) -> dict:
+        """
+        Dumps the pagination and returns everything but the data of the response for a page.
+        """
+        with metrics.timer("dump"):
+            self.dump()
         return_value = self.to_dict()
-        return_value["data"] = data
+        del return_value["data"]
         return_value["metadata"]["page"] = requested_page
-        if any(item["page"] is None for item in self.data) or requested_page < max(
-            item["page"] for item in self.data
-        ):
+        if requested_page < self.data[-1]["page"]:
             return_value["bodyNextPage"] = {
                 "paginationId": self.id,
                 "page": requested_page + 1,
             }
         return return_value
 
+    def get_typed_page(
+        self, requested_page=0
+    ) -> Union[dict, Tuple[dict, Dict[str, np.ndarray]]]:
+        """
+        Returns everything but the data of the response for a page, and the numeric columns of
+         the page with the Datetime column in epoch milliseconds. The UTC offset of the datetimes
+         is added to the metadata.
+        Returns a dictionary with a message if the page can't be served.
+        """
+        file_paths = self.get_page_file_paths(requested_page)
+        if not isinstance(file_paths, list):
+            return file_paths
+        parts: Dict[str, List[np.ndarray]] = {}
+        utcoffset = None
+        with metrics.timer("read"):
+            for arrays, utcoffset in self.iter_arrays(file_paths):
+                for name, array in arrays.items():
+                    parts.setdefault(name, []).append(array)
+            arrays = typed_arrays(concatenate_arrays(parts))
+        return_value = self.get_page_metadata(requested_page)
+        return_value["metadata"]["utcOffset"] = utcoffset
+        return return_value, arrays
+
+    def get_binary(self, requested_page=0) -> Union[dict, bytes]:
+        """
+        Returns the response for a page as a packed set of the numeric columns, with everything
+         but the data in the header, or a dictionary with a message if the page can't be served.
+        """
+        typed_page = self.get_typed_page(requested_page)
+        if isinstance(typed_page, dict):
+            return typed_page
+        with metrics.timer("encode"):
+            return encode_binary(*typed_page)
+
+    def get_data(self, requested_page=0, value_format="string") -> dict:
+        """
+        Returns a dictionary of lists containing all the present raw data for the paginated stream
+        between the start and end datetimes, inclusive, for the requested page.
+        If no page is specified, the first one is returned.
+        With the "typed" value format only the numeric columns are returned, as numbers, with the
+         Datetime column in epoch milliseconds.
+        """
+        if value_format == "typed":
+            typed_page = self.get_typed_page(requested_page)
+            if isinstance(typed_page, dict):
+                return typed_page
+            return_value, arrays = typed_page
+            return_value["data"] = to_lists(arrays)
+            return return_value
+
+        file_paths = self.get_page_file_paths(requested_page)
+        if not isinstance(file_paths, list):
+            return file_paths
+        data = {}
+        with metrics.timer("read"):
+            for file_data in self.iter_data(file_paths):
+                for key, values in file_data.items():
+                    if key not in data:
+                        data[key] = []
+                    data[key].extend(values)
+        return_value = self.get_page_metadata(requested_page)
+        return_value["data"] = data
+        return return_value
+
+    def iter_ndjson(
+        self, requested_page=0, value_format="string"
+    ) -> Union[dict, Iterator[str]]:
+        """
+        Returns a generator of newline delimited JSON for the requested page, or a dictionary with
+         a message if the page can't be served.
+        The first line contains the pagination and metadata, every following line the data of one
+         file as {"data": {column: [values]}}, so only one file is held in memory at a time.
+        With the "typed" value format the lines hold the numeric columns of the files as in
+         get_data, with the UTC offset of the datetimes as "utcOffset".
+        """
+        file_paths = self.get_page_file_paths(requested_page)
+        if not isinstance(file_paths, list):
+            return file_paths
+
+        def generate():
+            yield json.dumps(self.get_page_metadata(requested_page)) + "\n"
+            if value_format == "typed":
+                for arrays, utcoffset in self.iter_arrays(file_paths):
+                    if arrays:
+                        yield json.dumps(
+                            {"data": to_lists(typed_arrays(arrays)), "utcOffset": utcoffset}
+                        ) + "\n"
+                return
+            for file_data in self.iter_data(file_paths):
+                if file_data:
+                    yield json.dumps({"data": file_data}) + "\n"
+
+        return generate()
+
 
 def load_pagination(pagination_id: str) -> Union[dict, Pagination]:
     """
     Loads a pagination object from the pagination database if it exists.
     """
-    with sqlite3.connect(PAGINATION_DATABASE) as connection:
-        connection.row_factory = sqlite3.Row
-        cursor = connection.cursor()
-        cursor.execute(
+    data = (
+        get_connection()
+        .execute(
             "SELECT [pagination] FROM [pagination] WHERE [paginationId] = ?",
             (pagination_id,),
         )
-        data = cursor.fetchone()
-        cursor.close()
+        .fetchone()
+    )
     if not data:
         return {"message": f"No pagination found for ID {pagination_id}"}
     return Pagination(serialized_pagination=data["pagination"])
 
 
-def delete_expired() -> None:
+def delete_expired(batch_size=PAGINATION_DELETE_BATCH) -> int:
     """
-    Deletes the expired paginations from the database.
+    Deletes the expired paginations from the database, batch_size at a time, so requests that
+     store a pagination don't wait for the whole sweep after a long downtime.
+    Returns the number of deleted paginations.
     """
-    with sqlite3.connect(PAGINATION_DATABASE) as connection:
-        connection.row_factory = sqlite3.Row
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM [pagination]")
-        for row in cursor.fetchall():
-            pagination = Pagination(serialized_pagination=row["pagination"])
-            if pagination.is_expired():
-                cursor.execute(
-                    "DELETE FROM [pagination] WHERE [paginationId] = ?",
-                    (row["paginationId"],),
-                )
-                print(f"Deleted {pagination.id=}, expired {pagination.expires}")
-        connection.commit()
-        cursor.close()
+    connection = get_connection()
+    now = datetime_now_local().timestamp()
+    deleted = 0
+    while True:
+        with connection:
+            cursor = connection.execute(
+                "DELETE FROM [pagination] WHERE [paginationId] IN (SELECT [paginationId] \
+FROM [pagination] WHERE [expires] < ? LIMIT ?)",
+                (now, batch_size),
+            )
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+    if deleted:
+        print(f"Deleted {deleted} expired paginations")
+    return deleted
+
+
+def start_expiry_sweeper(interval=PAGINATION_SWEEP_INTERVAL) -> threading.Thread:
+    """
+    Starts a daemon thread that deletes the expired paginations every interval seconds.
+    """
+
+    def sweep():
+        while True:
+            delete_expired()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=sweep, name="pagination-expiry-sweeper", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,38 @@
+"""
+Opt-in profiling of a sample of the requests with cProfile, enabled by setting
+ PROFILE_SAMPLE_RATE. The profiles can be inspected with pstats or a viewer like snakeviz.
+"""
+
+import cProfile
+import random
+import uuid
+from typing import Optional
+
+from constants import PROFILE_FOLDER, PROFILE_SAMPLE_RATE, datetime_now_local_str
+
+
+def start_profiler(sample_rate: float = PROFILE_SAMPLE_RATE) -> Optional[cProfile.Profile]:
+    """
+    Starts profiling the current thread for a sampled request.
+    Returns the profiler, or None if the request isn't sampled or another profiler is active.
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Since Python 3.12 only one profiler can be active at a time.
+        return None
+    return profiler
+
+
+def stop_profiler(profiler: cProfile.Profile, endpoint: str) -> None:
+    """
+    Stops a profiler and writes its statistics to the profile folder.
+    """
+    profiler.disable()
+    PROFILE_FOLDER.mkdir(exist_ok=True, parents=True)
+    profiler.dump_stats(
+        PROFILE_FOLDER / f"{datetime_now_local_str()}_{endpoint}_{uuid.uuid4().hex[:8]}.prof"
+    )
@@ -0,0 +1,283 @@
+"""
+Pushes the rows appended to a stream to subscribed clients as server-sent events.
+Every stream has a single reader that watches its directory and serializes new rows once, however
+ many clients are subscribed.
+"""
+
+import bisect
+import ctypes
+import ctypes.util
+import datetime
+import itertools
+import json
+import os
+import select
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+from constants import DATA_DIR, PUSH_HEARTBEAT_INTERVAL, PUSH_POLL_INTERVAL
+from temperature_api.api.file_index import get_file_index
+from temperature_api.api.tail import get_tail_reader
+
+# Number of events kept for subscribers that haven't sent the previous ones yet.
+PUSH_BACKLOG = 1024
+# inotify events of a file being created, written to or moved into the watched directory.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+
+def format_event(event: str, data: dict, event_id: Optional[str] = None) -> bytes:
+    """
+    Returns a server-sent event with JSON data.
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def rows_until(data: Dict[str, list], end_datetime: datetime.datetime) -> Dict[str, list]:
+    """
+    Returns the rows of data with a timestamp at or before the end datetime.
+    """
+    end = bisect.bisect_right(
+        data.get("Datetime", []), end_datetime, key=datetime.datetime.fromisoformat
+    )
+    return {key: values[:end] for key, values in data.items()}
+
+
+class DirectoryWatcher:
+    """
+    Waits for files in a directory to change, with inotify where the C library provides it and
+     otherwise by polling the modification times of the directory and its most recent file.
+    """
+
+    def __init__(self, directory: Path, poll_interval: float = PUSH_POLL_INTERVAL) -> None:
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0:
+                mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+                if libc.inotify_add_watch(fd, os.fsencode(directory), mask) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        except (AttributeError, OSError):
+            pass
+        self.newest_path = None
+        self.directory_mtime = None
+        self.signature = self.stat_signature()
+
+    def stat_signature(self) -> Tuple:
+        """
+        Returns the modification time of the directory and the size and modification time of its
+         most recent file, which change whenever a row is appended or a file is added.
+        """
+        directory_mtime = self.directory.stat().st_mtime_ns
+        if directory_mtime != self.directory_mtime:
+            self.directory_mtime = directory_mtime
+            self.newest_path = max(self.directory.glob("*.csv"), default=None)
+        if self.newest_path is None:
+            return (directory_mtime,)
+        try:
+            stat_result = self.newest_path.stat()
+        except FileNotFoundError:
+            self.directory_mtime = None
+            return (directory_mtime,)
+        return (directory_mtime, stat_result.st_size, stat_result.st_mtime_ns)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Blocks until a file in the directory changes or the timeout passes.
+        Returns whether a change was seen.
+        """
+        if self.fd is not None:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+            if not readable:
+                return False
+            # Only the fact that something changed matters, not the events themselves.
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+            return True
+
+        deadline = time.monotonic() + timeout
+        while True:
+            signature = self.stat_signature()
+            if signature != self.signature:
+                self.signature = signature
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self) -> None:
+        """
+        Releases the inotify file descriptor.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class StreamPublisher:
+    """
+    Reads the rows appended to a stream while it has subscribers and publishes them as events.
+    Each batch of new rows is read and serialized once into a shared backlog. Subscribers wait on
+     a condition and copy the events after the last one they sent, so publishing costs the same
+     regardless of the number of subscribers.
+    """
+
+    def __init__(self, stream: str) -> None:
+        self.stream = stream
+        self.condition = threading.Condition()
+        # Serializes reading new rows, so subscribers can join in between two reads.
+        self.read_lock = threading.Lock()
+        self.events: Deque[bytes] = deque(maxlen=PUSH_BACKLOG)
+        self.sequence = 0
+        self.subscribers = 0
+        self.thread: Optional[threading.Thread] = None
+        self.high_water_mark: Optional[datetime.datetime] = None
+
+    def find_high_water_mark(self) -> None:
+        """
+        Sets the high-water mark to the timestamp of the last row of the stream, if it has any.
+        """
+        files = get_file_index(self.stream).all_files()
+        if not files:
+            return
+        since = files[-1]["start_hour"] - datetime.timedelta(microseconds=1)
+        data = get_tail_reader(self.stream).read_appended(files[-1]["path"], since)
+        if data.get("Datetime"):
+            self.high_water_mark = datetime.datetime.fromisoformat(data["Datetime"][-1])
+        else:
+            self.high_water_mark = since
+
+    def subscribe(self) -> Tuple[int, Optional[datetime.datetime]]:
+        """
+        Registers a subscriber, starting the reader if it isn't running.
+        Returns the sequence number after which the events are new to the subscriber, and the
+         high-water mark up to which rows were published before those events.
+        """
+        with self.read_lock:
+            with self.condition:
+                stopped = self.thread is None
+            # Rows written while the reader was stopped were never published, they're history to
+            #  a new subscriber like the rows before them.
+            if self.high_water_mark is None or stopped:
+                self.find_high_water_mark()
+            with self.condition:
+                self.subscribers += 1
+                if self.thread is None:
+                    self.thread = threading.Thread(
+                        target=self.run, name=f"push-{self.stream}", daemon=True
+                    )
+                    self.thread.start()
+                return self.sequence, self.high_water_mark
+
+    def unsubscribe(self) -> None:
+        """
+        Removes a subscriber, the reader stops once there are none left.
+        """
+        with self.condition:
+            self.subscribers -= 1
+
+    def publish(self, data: Dict[str, list]) -> None:
+        """
+        Serializes new rows into an event and wakes up the subscribers.
+        """
+        event = format_event(
+            "rows",
+            {"stream": self.stream, "data": data},
+            event_id=data["Datetime"][-1],
+        )
+        with self.condition:
+            self.events.append(event)
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def read(self) -> None:
+        """
+        Publishes the rows after the high-water mark.
+        """
+        with self.read_lock:
+            if self.high_water_mark is None:
+                self.find_high_water_mark()
+                return
+            data = get_tail_reader(self.stream).read_since(self.high_water_mark)
+            if not data.get("Datetime"):
+                return
+            self.publish(data)
+            self.high_water_mark = datetime.datetime.fromisoformat(data["Datetime"][-1])
+
+    def run(self) -> None:
+        """
+        Reads new rows whenever the stream directory changes, until there are no subscribers.
+        """
+        watcher = DirectoryWatcher(DATA_DIR / self.stream)
+        try:
+            while True:
+                with self.condition:
+                    if self.subscribers <= 0:
+                        self.thread = None
+                        return
+                if watcher.wait(PUSH_HEARTBEAT_INTERVAL):
+                    try:
+                        self.read()
+                    except Exception as exception:
+                        print(f"Failed to read new rows of {self.stream}: {exception!r}")
+        finally:
+            watcher.close()
+
+    def iter_events(
+        self, sequence: int, heartbeat: float = PUSH_HEARTBEAT_INTERVAL
+    ) -> Iterator[bytes]:
+        """
+        Yields the events published after a sequence number, and a comment when nothing was
+         published for a heartbeat interval, until the client disconnects.
+        The subscriber has to unsubscribe once the generator is closed.
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.sequence > sequence, timeout=heartbeat)
+                missed = self.sequence - sequence
+                available = min(missed, len(self.events))
+                events = list(
+                    itertools.islice(
+                        self.events, len(self.events) - available, len(self.events)
+                    )
+                )
+                sequence = self.sequence
+            if missed > available:
+                # The client fell behind by more than the backlog.
+                yield format_event("gap", {"stream": self.stream})
+            if events:
+                yield b"".join(events)
+            else:
+                yield b": keep-alive\n\n"
+
+
+_publishers: Dict[str, StreamPublisher] = {}
+_publishers_lock = threading.Lock()
+
+
+def get_publisher(stream: str) -> StreamPublisher:
+    """
+    Returns the publisher of a stream, creating it on first use.
+    """
+    with _publishers_lock:
+        if stream not in _publishers:
+            _publishers[stream] = StreamPublisher(stream)
+        return _publishers[stream]
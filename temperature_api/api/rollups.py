@@ -0,0 +1,279 @@
+"""
+Maintains aggregate tables of every stream at a few fixed resolutions, so that queries over long
+ ranges don't have to read every hourly file they span.
+"""
+
+import datetime
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from constants import APP_DATA_DIR
+from temperature_api.api.aggregation import (
+    aggregate_buckets,
+    concatenate_aggregates,
+    empty_aggregates,
+)
+from temperature_api.api.column_store import (
+    from_epoch_microseconds,
+    load_range,
+    read_arrays,
+    to_epoch_microseconds,
+)
+from temperature_api.api.file_index import get_file_index
+
+ROLLUP_DATABASE = APP_DATA_DIR / "rollups.sqlite3"
+# Widths of the rollup tiers in seconds: 1 minute, 1 hour and 1 day.
+TIERS = (60, 60 * 60, 24 * 60 * 60)
+# Seconds to wait for another process that is rolling up a file.
+ROLLUP_LOCK_TIMEOUT = 60
+
+with sqlite3.connect(ROLLUP_DATABASE) as _connection:
+    _cursor = _connection.cursor()
+    # Lets worker processes read the rollups while another one is writing them.
+    _cursor.execute("PRAGMA journal_mode=WAL")
+    _cursor.execute(
+        "CREATE TABLE IF NOT EXISTS [rollup] ([stream] TEXT, [tier] INTEGER, [column] TEXT, \
+[bucket] INTEGER, [count] INTEGER, [sum] REAL, [min] REAL, [max] REAL, [last] REAL, \
+[lastTimestamp] INTEGER, PRIMARY KEY ([stream], [tier], [column], [bucket]))"
+    )
+    _cursor.execute(
+        "CREATE TABLE IF NOT EXISTS [rollup_file] ([stream] TEXT, [name] TEXT, [utcoffset] REAL, \
+PRIMARY KEY ([stream], [name]))"
+    )
+    _connection.commit()
+    _cursor.close()
+_connection.close()
+
+
+def choose_tier(bucket_seconds: float) -> Optional[int]:
+    """
+    Returns the coarsest rollup tier that buckets of the given width can be built from, or None if
+     the buckets are finer than, or not a multiple of, every tier.
+    """
+    for tier in reversed(TIERS):
+        if bucket_seconds >= tier and bucket_seconds % tier == 0:
+            return tier
+    return None
+
+
+class Rollups:
+    """
+    Aggregates of one stream at every rollup tier.
+    Closed files, all but the most recent file of a stream, are rolled up once each. Data that
+     hasn't been rolled up yet is aggregated from the files when queried.
+    """
+
+    def __init__(self, stream: str) -> None:
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.utcoffset = None
+        # Epoch microseconds up to which every file of the stream has been rolled up.
+        self.covered_until = None
+        with sqlite3.connect(ROLLUP_DATABASE) as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT [name], [utcoffset] FROM [rollup_file] WHERE [stream] = ?",
+                (self.stream,),
+            )
+            self.rolled_up = {}
+            for name, utcoffset in cursor.fetchall():
+                self.rolled_up[name] = utcoffset
+            cursor.close()
+
+    def roll_up_file(self, item: dict, cursor: sqlite3.Cursor) -> None:
+        """
+        Adds the aggregates of a file to every tier.
+        The file is registered as rolled up first, in the same transaction, so when multiple
+         processes roll up the same file only the first one succeeds and the others fail with an
+         IntegrityError before adding anything.
+        """
+        arrays, utcoffset = read_arrays(item["path"])
+        cursor.execute(
+            "INSERT INTO [rollup_file] ([stream], [name], [utcoffset]) VALUES (?, ?, ?)",
+            (self.stream, item["path"].name, utcoffset),
+        )
+        timestamps = arrays.pop("Datetime", np.empty(0, dtype=np.int64))
+        for tier in TIERS if len(timestamps) else ():
+            for column, values in arrays.items():
+                aggregates = aggregate_buckets(timestamps, values, tier * 1_000_000)
+                last_timestamps = timestamps[
+                    np.r_[
+                        np.flatnonzero(np.diff(timestamps // (tier * 1_000_000))),
+                        len(timestamps) - 1,
+                    ]
+                ]
+                # Hour and day buckets span multiple files, so their aggregates are merged.
+                cursor.executemany(
+                    "INSERT INTO [rollup] ([stream], [tier], [column], [bucket], [count], [sum], \
+[min], [max], [last], [lastTimestamp]) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) \
+ON CONFLICT ([stream], [tier], [column], [bucket]) DO UPDATE SET \
+[count] = [count] + excluded.[count], [sum] = [sum] + excluded.[sum], \
+[min] = MIN([min], excluded.[min]), [max] = MAX([max], excluded.[max]), \
+[last] = CASE WHEN excluded.[lastTimestamp] >= [lastTimestamp] THEN excluded.[last] ELSE [last] END, \
+[lastTimestamp] = MAX([lastTimestamp], excluded.[lastTimestamp])",
+                    zip(
+                        [self.stream] * len(last_timestamps),
+                        [tier] * len(last_timestamps),
+                        [column] * len(last_timestamps),
+                        aggregates["Datetime"].tolist(),
+                        aggregates["count"].tolist(),
+                        aggregates["sum"].tolist(),
+                        aggregates["min"].tolist(),
+                        aggregates["max"].tolist(),
+                        aggregates["last"].tolist(),
+                        last_timestamps.tolist(),
+                    ),
+                )
+        self.rolled_up[item["path"].name] = utcoffset
+
+    def update(self) -> int:
+        """
+        Rolls up the closed files that haven't been rolled up yet.
+        Returns the number of files that were rolled up by this process.
+        """
+        files = get_file_index(self.stream).all_files()
+        rolled_up = 0
+        with self.lock:
+            new_files = [
+                item for item in files[:-1] if item["path"].name not in self.rolled_up
+            ]
+            if new_files:
+                connection = sqlite3.connect(ROLLUP_DATABASE, timeout=ROLLUP_LOCK_TIMEOUT)
+                for item in new_files:
+                    try:
+                        # One transaction per file, so other processes don't wait for all of them.
+                        with connection:
+                            self.roll_up_file(item, connection.cursor())
+                        rolled_up += 1
+                    except sqlite3.IntegrityError:
+                        # Another process rolled up the file first.
+                        (utcoffset,) = connection.execute(
+                            "SELECT [utcoffset] FROM [rollup_file] WHERE [stream] = ? AND \
+[name] = ?",
+                            (self.stream, item["path"].name),
+                        ).fetchone()
+                        self.rolled_up[item["path"].name] = utcoffset
+                connection.close()
+            self.covered_until = None
+            for item in files:
+                if item["path"].name not in self.rolled_up:
+                    self.covered_until = to_epoch_microseconds(item["start_hour"])
+                    break
+                self.utcoffset = self.rolled_up[item["path"].name]
+        return rolled_up
+
+    def query(self, tier: int, start: int, stop: int) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Returns the aggregates per column of the buckets of a tier starting in between the start
+         and stop epoch microseconds, stop exclusive.
+        """
+        with sqlite3.connect(ROLLUP_DATABASE) as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT [column], [bucket], [count], [sum], [min], [max], [last] FROM [rollup] \
+WHERE [stream] = ? AND [tier] = ? AND [bucket] >= ? AND [bucket] < ? ORDER BY [column], [bucket]",
+                (self.stream, tier, start, stop),
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        columns = {}
+        if not rows:
+            return columns
+        names = np.array([row[0] for row in rows])
+        table = np.array([row[1:] for row in rows], dtype=np.float64)
+        for name in dict.fromkeys(names.tolist()):
+            selected = table[names == name]
+            columns[name] = {
+                "Datetime": selected[:, 0].astype(np.int64),
+                "count": selected[:, 1].astype(np.int64),
+                "sum": selected[:, 2],
+                "min": selected[:, 3],
+                "max": selected[:, 4],
+                "last": selected[:, 5],
+            }
+        return columns
+
+
+_rollups: Dict[str, Rollups] = {}
+_rollups_lock = threading.Lock()
+
+
+def get_rollups(stream: str) -> Rollups:
+    """
+    Returns the rollups of a stream, loading them on first use.
+    """
+    with _rollups_lock:
+        if stream not in _rollups:
+            _rollups[stream] = Rollups(stream)
+        return _rollups[stream]
+
+
+def aggregate_raw(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    tier: int,
+) -> Tuple[Dict[str, Dict[str, np.ndarray]], Optional[float]]:
+    """
+    Returns the aggregates per column at the resolution of a tier between the start and end
+     datetimes, inclusive, computed from the files, and the UTC offset of the datetimes.
+    """
+    columns, utcoffset = load_range(stream, start_datetime, end_datetime)
+    timestamps = columns.pop("Datetime", None)
+    return {
+        name: aggregate_buckets(timestamps, values, tier * 1_000_000)
+        for name, values in columns.items()
+    }, utcoffset
+
+
+def aggregate_range(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    tier: int,
+) -> Tuple[Dict[str, Dict[str, np.ndarray]], Optional[float]]:
+    """
+    Returns the aggregates per column at the resolution of a tier between the start and end
+     datetimes, inclusive, and the UTC offset of the datetimes.
+    Buckets that lie completely within the range and have been rolled up are read from the
+     rollups. Only the partial buckets at the edges of the range and the data that hasn't been
+     rolled up yet are aggregated from the files, so the number of files read doesn't grow with
+     the length of the range.
+    """
+    rollups = get_rollups(stream)
+    rollups.update()
+    tier_microseconds = tier * 1_000_000
+    start = to_epoch_microseconds(start_datetime)
+    end = to_epoch_microseconds(end_datetime)
+    rollup_start = -(-start // tier_microseconds) * tier_microseconds
+    rollup_stop = (end + 1) // tier_microseconds * tier_microseconds
+    if rollups.covered_until is not None:
+        rollup_stop = min(
+            rollup_stop, rollups.covered_until // tier_microseconds * tier_microseconds
+        )
+    if rollup_start >= rollup_stop:
+        return aggregate_raw(stream, start_datetime, end_datetime, tier)
+
+    tzinfo = start_datetime.tzinfo
+    utcoffset = rollups.utcoffset
+    parts = []
+    if start < rollup_start:
+        part, utcoffset = aggregate_raw(
+            stream, start_datetime, from_epoch_microseconds(rollup_start - 1, tzinfo), tier
+        )
+        parts.append(part)
+    parts.append(rollups.query(tier, rollup_start, rollup_stop))
+    if rollup_stop <= end:
+        part, utcoffset = aggregate_raw(
+            stream, from_epoch_microseconds(rollup_stop, tzinfo), end_datetime, tier
+        )
+        parts.append(part)
+    columns = {}
+    for name in dict.fromkeys(name for part in parts for name in part):
+        columns[name] = concatenate_aggregates(
+            [part.get(name, empty_aggregates()) for part in parts]
+        )
+    return columns, utcoffset
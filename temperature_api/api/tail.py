@@ -0,0 +1,138 @@
+"""
+Serves the rows of a stream that are newer than a timestamp, for clients that keep their own copy
+ of the data and only need what was appended since their last request.
+"""
+
+import bisect
+import csv
+import datetime
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from temperature_api.api.column_store import read_string_columns
+from temperature_api.api.file_index import get_file_index
+from temperature_api.api.metrics import metrics
+
+# Maximum number of (timestamp, byte offset) checkpoints remembered per file.
+MAXIMUM_CHECKPOINTS = 4096
+
+
+class TailReader:
+    """
+    Reads the rows that were appended to the files of a stream.
+    For the file that is being written to, the byte offset after the last row read is remembered
+     together with that row's timestamp. A request for rows newer than a remembered timestamp seeks
+     to its offset and only parses what comes after it.
+    """
+
+    def __init__(self, stream: str) -> None:
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.path = None
+        # The device and inode of the current file, a file replaced under the same path has
+        #  other ones.
+        self.file_id = None
+        self.header: List[str] = []
+        # Sorted (timestamp, byte offset) pairs of the current file.
+        self.checkpoints: List[Tuple[datetime.datetime, int]] = []
+
+    def reset(self, file_path: Path) -> None:
+        """
+        Switches to a new file, reading its header.
+        """
+        with open(file_path, "rb") as file:
+            header_line = file.readline()
+            stat_result = os.fstat(file.fileno())
+        self.path = file_path
+        self.file_id = (stat_result.st_dev, stat_result.st_ino)
+        self.header = next(csv.reader([header_line.decode("utf-8")]), [])
+        # The first checkpoint is the end of the header, before any timestamp.
+        self.checkpoints = [(None, len(header_line))]
+
+    def read_appended(self, file_path: Path, since: datetime.datetime) -> Dict[str, list]:
+        """
+        Returns the rows of the file that is being written to with a timestamp after since.
+        """
+        with self.lock:
+            stat_result = file_path.stat()
+            # The offsets don't apply to a file that was replaced or truncated.
+            if (
+                file_path != self.path
+                or (stat_result.st_dev, stat_result.st_ino) != self.file_id
+                or stat_result.st_size < self.checkpoints[-1][1]
+            ):
+                self.reset(file_path)
+            # The last checkpoint at or before since, the rows before it are all older.
+            index = bisect.bisect_right(
+                self.checkpoints, since, lo=1, key=lambda checkpoint: checkpoint[0]
+            )
+            offset = self.checkpoints[index - 1][1]
+            with open(file_path, "rb") as file:
+                file.seek(offset)
+                appended = file.read()
+            # A row that is still being written is left for the next request.
+            appended = appended[: appended.rfind(b"\n") + 1]
+            rows = [row for row in csv.reader(appended.decode("utf-8").splitlines()) if row]
+            metrics.count(files=1, rows=len(rows), bytes_read=len(appended))
+            if not rows:
+                return {}
+            header = self.header
+            datetime_index = header.index("Datetime")
+            last_datetime = datetime.datetime.fromisoformat(rows[-1][datetime_index])
+            if len(self.checkpoints) == 1 or last_datetime > self.checkpoints[-1][0]:
+                self.checkpoints.append((last_datetime, offset + len(appended)))
+                if len(self.checkpoints) > MAXIMUM_CHECKPOINTS:
+                    # Thin out the older half, keeping the header checkpoint.
+                    half = len(self.checkpoints) // 2
+                    self.checkpoints = (
+                        self.checkpoints[:1]
+                        + self.checkpoints[1:half:2]
+                        + self.checkpoints[half:]
+                    )
+        start = bisect.bisect_right(
+            rows,
+            since,
+            key=lambda row: datetime.datetime.fromisoformat(row[datetime_index]),
+        )
+        return {key: list(values) for key, values in zip(header, zip(*rows[start:]))}
+
+    def read_since(self, since: datetime.datetime) -> Dict[str, list]:
+        """
+        Returns the rows of the stream with a timestamp after since.
+        Closed files after since are read through the data cache, the file that is being written
+         to from the remembered offsets.
+        """
+        files = get_file_index(self.stream).files_from(since)
+        data: Dict[str, list] = {}
+        for index, item in enumerate(files):
+            if index == len(files) - 1:
+                file_data = self.read_appended(item["path"], since)
+            else:
+                columns = read_string_columns(item["path"])
+                if not columns:
+                    continue
+                start = bisect.bisect_right(
+                    columns["Datetime"], since, key=datetime.datetime.fromisoformat
+                )
+                file_data = {key: values[start:] for key, values in columns.items()}
+            for key, values in file_data.items():
+                if key not in data:
+                    data[key] = []
+                data[key].extend(values)
+        return data
+
+
+_tail_readers: Dict[str, TailReader] = {}
+_tail_readers_lock = threading.Lock()
+
+
+def get_tail_reader(stream: str) -> TailReader:
+    """
+    Returns the tail reader of a stream, creating it on first use.
+    """
+    with _tail_readers_lock:
+        if stream not in _tail_readers:
+            _tail_readers[stream] = TailReader(stream)
+        return _tail_readers[stream]
@@ -1,11 +1,30 @@
 """API exposing temperature logging data"""
 
+import time
 from datetime import datetime
+from typing import List, Optional, Tuple
 
-from flask import Blueprint, Response, abort, jsonify, request
+from flask import Blueprint, Response, abort, g, jsonify, request
 
-from constants import DATA_DIR
+from constants import ALIGN_MAX_POINTS, DATA_DIR
+from temperature_api.api.alignment import ALIGN_METHODS, Alignment
+from temperature_api.api.batch import get_batch
+from temperature_api.api.cursor import CursorPagination, decode_cursor
+from temperature_api.api.data_cache import data_cache
+from temperature_api.api.downsampling import downsample
+from temperature_api.api.encoding import (
+    BINARY_MIMETYPE,
+    VALUE_FORMATS,
+    arrays_from_strings,
+    encode_binary,
+    to_lists,
+    typed_arrays,
+)
+from temperature_api.api.metrics import metrics
 from temperature_api.api.pagination import Pagination, load_pagination
+from temperature_api.api.profiling import start_profiler, stop_profiler
+from temperature_api.api.push import format_event, get_publisher, rows_until
+from temperature_api.api.tail import get_tail_reader
 
 api = Blueprint("simple_page", __name__, template_folder="templates")
 
@@ -14,6 +33,43 @@ api = Blueprint("simple_page", __name__, template_folder="templates")
 # TODO: Serve data sorted by filename. DONE
 
 
+@api.before_request
+def start_request():
+    """
+    Labels the metrics recorded while handling the request with its endpoint, and starts
+     profiling it if it is sampled.
+    """
+    g.endpoint = request.endpoint.rsplit(".", 1)[-1] if request.endpoint else "unknown"
+    g.metrics_token = metrics.set_endpoint(g.endpoint)
+    g.start = time.perf_counter()
+    g.profiler = start_profiler()
+
+
+@api.after_request
+def finish_request(response: Response) -> Response:
+    """
+    Records the duration of the request and writes its profile, for a streamed response once its
+     body has been sent.
+    """
+    endpoint, start, profiler = g.endpoint, g.start, g.profiler
+
+    def finish():
+        metrics.request_seconds.observe(
+            (endpoint, str(response.status_code)), time.perf_counter() - start
+        )
+        if profiler is not None:
+            stop_profiler(profiler, endpoint)
+
+    if response.is_streamed:
+        # The body of a streamed response is generated after the view returned, it's closed once
+        #  the body was sent or the client disconnected.
+        response.call_on_close(finish)
+    else:
+        finish()
+    metrics.reset_endpoint(g.metrics_token)
+    return response
+
+
 def get_available_streams():
     """
     Returns a list of the streams of data that can be accessed.
@@ -21,6 +77,143 @@ def get_available_streams():
     return [item.name for item in DATA_DIR.iterdir() if item.is_dir()]
 
 
+def get_range(data: dict) -> Tuple[datetime, datetime]:
+    """
+    Returns the start datetime and end datetime of a request body.
+    Aborts with a 400 response if either of them is invalid.
+    """
+    start_datetime = data.get("startDatetime", "1900-01-01T00:00:00")
+    try:
+        start_datetime = datetime.fromisoformat(start_datetime)
+    except ValueError:
+        abort(
+            Response(
+                "Invalid start datetime, please use isoformat date or datetime.", 400
+            )
+        )
+
+    end_datetime = data.get("endDatetime", "2999-01-01T00:00:00")
+    try:
+        end_datetime = datetime.fromisoformat(end_datetime)
+    except ValueError:
+        abort(
+            Response(
+                "Invalid end datetime, please use isoformat date or datetime.", 400
+            )
+        )
+
+    if end_datetime <= start_datetime:
+        abort(
+            Response(
+                f"Invalid datetime range startDatetime={start_datetime.isoformat()} \
+endDatetime={end_datetime.isoformat()}\n\
+Please enter a valid datetime range with an endDatetime after the startDatetime",
+                400,
+            )
+        )
+
+    return start_datetime, end_datetime
+
+
+def get_stream_and_range(data: dict) -> Tuple[str, datetime, datetime]:
+    """
+    Returns the stream, start datetime and end datetime of a request body.
+    Aborts with a 400 response if any of them is missing or invalid.
+    """
+    stream = data.get("stream")
+    if stream is None:
+        abort(Response("Missing key: stream", 400))
+    if stream not in get_available_streams():
+        abort(Response("Invalid stream", 400))
+    return (stream, *get_range(data))
+
+
+def get_streams(data: dict) -> List[str]:
+    """
+    Returns the list of streams of a request body.
+    Aborts with a 400 response if it is missing, empty or has an invalid stream.
+    """
+    streams = data.get("streams")
+    if streams is None:
+        abort(Response("Missing key: streams", 400))
+    if not isinstance(streams, list) or not streams:
+        abort(Response("Invalid value for streams, expected a list of streams", 400))
+    available_streams = get_available_streams()
+    invalid_streams = [stream for stream in streams if stream not in available_streams]
+    if invalid_streams:
+        abort(Response(f"Invalid streams: {invalid_streams}", 400))
+    return streams
+
+
+def get_columns(data: dict) -> Optional[List[str]]:
+    """
+    Returns the columns selected in a request body, or None if all of them are requested.
+    Aborts with a 400 response if they aren't a list of strings.
+    """
+    columns = data.get("columns")
+    if columns is not None and (
+        not isinstance(columns, list)
+        or not all(isinstance(column, str) for column in columns)
+    ):
+        abort(Response("Invalid value for columns, expected a list of column names", 400))
+    return columns
+
+
+def get_value_format(data: dict) -> str:
+    """
+    Returns the value format of a request body.
+    Aborts with a 400 response if it is invalid.
+    """
+    value_format = data.get("valueFormat", "string")
+    if value_format not in VALUE_FORMATS:
+        abort(Response(f"Invalid value for valueFormat: {value_format}", 400))
+    return value_format
+
+
+def paginated_response(
+    pagination: Pagination, page_number: int, response_format: str, value_format: str
+):
+    """
+    Returns the response for a page of a pagination in the requested formats.
+    """
+    if value_format == "binary":
+        packed_data = pagination.get_binary(requested_page=page_number)
+        if isinstance(packed_data, dict):
+            return abort(Response(packed_data["message"], 400))
+        return Response(packed_data, mimetype=BINARY_MIMETYPE)
+
+    if response_format == "ndjson":
+        lines = pagination.iter_ndjson(requested_page=page_number, value_format=value_format)
+        if isinstance(lines, dict):
+            return abort(Response(lines["message"], 400))
+        return Response(metrics.iter_labelled(lines), mimetype="application/x-ndjson")
+
+    pageinated_data = pagination.get_data(
+        requested_page=page_number, value_format=value_format
+    )
+    if "message" in pageinated_data:
+        return abort(Response(pageinated_data["message"], 400))
+    with metrics.timer("serialize"):
+        return jsonify(pageinated_data)
+
+
+@api.route("/metrics")
+def metrics_endpoint():
+    """
+    Returns the request and phase timings and the files touched, rows scanned and bytes read per
+     endpoint in the Prometheus text format.
+    """
+    return Response(metrics.format(), mimetype="text/plain; version=0.0.4")
+
+
+@api.route("/cache")
+def cache():
+    """
+    Returns the hit and miss counters and the size of the cache of parsed file data.
+    """
+    return jsonify(data_cache.stats())
+
+
 @api.route("/streams", methods=["GET", "POST"])
 def streams():
     """
@@ -41,12 +234,30 @@ def streams():
         // Optional, default "2999-01-01T00:00:00", has to be in isoformat
         "minimumItemsPerPage": int,
         // Optional, default 10_000
+        "columns": [string],
+        // Optional, default all columns, the columns to return besides Datetime. Columns that
+        //  aren't in the files of the stream are left out.
         "pagination_id": UUIDv7,
         // Optional, used in pagination, will be part of the response if more data is requested
         //  than fits on one page.
         "page": int,
         // Optional, used in pagination, will be part of the response if more data is requested
         //  than fits on one page.
+        "paginationMode": string,
+        // Optional, default "id", "cursor" returns a stateless cursor in bodyNextPage instead of
+        //  a paginationId, which doesn't expire and isn't stored server side.
+        "cursor": string,
+        // Optional, used in cursor pagination, will be part of the response if more data is
+        //  requested than fits on one page.
+        "responseFormat": string,
+        // Optional, default "json", "ndjson" streams the page as newline delimited JSON, with the
+        //  pagination and metadata on the first line and the data of one file per line after.
+        "valueFormat": string,
+        // Optional, default "string" returns the values as they are in the files. "typed" returns
+        //  the numeric columns as numbers, with Datetime in epoch milliseconds and the UTC offset
+        //  of the datetimes in seconds as metadata.utcOffset. "binary" returns the typed columns
+        //  as application/octet-stream packed as in column_format.py, with the rest of the
+        //  response under "response" in the header, it can't be combined with "ndjson".
     }
     """
     if request.method == "GET":
@@ -59,62 +270,381 @@ def streams():
     except ValueError:
         return abort(Response(f"Invalid value for page: {data.get('page')}", 400))
 
+    response_format = data.get("responseFormat", "json")
+    if response_format not in ("json", "ndjson"):
+        return abort(Response(f"Invalid value for responseFormat: {response_format}", 400))
+    value_format = get_value_format(data)
+    if value_format == "binary" and response_format == "ndjson":
+        return abort(Response("valueFormat binary can't be combined with ndjson", 400))
+
+    cursor = data.get("cursor")
+    if cursor is not None:
+        cursor_arguments = decode_cursor(str(cursor))
+        if cursor_arguments is None:
+            return abort(Response(f"Invalid cursor: {cursor}", 400))
+        if cursor_arguments["stream"] not in get_available_streams():
+            return abort(Response("Invalid stream", 400))
+        return paginated_response(
+            CursorPagination(**cursor_arguments),
+            page_number,
+            response_format,
+            value_format,
+        )
+
     pagination_id = data.get("paginationId")
     if pagination_id is not None:
         pagination = load_pagination(pagination_id)
         if not isinstance(pagination, Pagination):
             return abort(Response(pagination["message"], 404))
-        pageinated_data = pagination.get_data(requested_page=page_number)
-        if "message" in pageinated_data:
-            return abort(Response(pageinated_data["message"], 400))
-        return pageinated_data
+        return paginated_response(pagination, page_number, response_format, value_format)
 
-    stream = data.get("stream")
-    if stream is None:
-        return abort(Response("Missing key: stream", 400))
-    if stream not in get_available_streams():
-        return abort(Response("Invalid stream", 400))
+    stream, start_datetime, end_datetime = get_stream_and_range(data)
 
-    start_datetime = data.get("startDatetime", "1900-01-01T00:00:00")
+    pagination_mode = data.get("paginationMode", "id")
+    if pagination_mode not in ("id", "cursor"):
+        return abort(Response(f"Invalid value for paginationMode: {pagination_mode}", 400))
+
+    minimum_items_per_page = data.get("minimumItemsPerPage", 10_000)
+    pagination = (CursorPagination if pagination_mode == "cursor" else Pagination)(
+        stream=stream,
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+        minimum_items_per_page=minimum_items_per_page,
+        columns=get_columns(data),
+    )
+    return paginated_response(pagination, page_number, response_format, value_format)
+
+
+@api.route("/batch", methods=["POST"])
+def batch():
+    """
+    Returns the first page of several streams between the same start and end datetimes
+     (inclusive) at once, keyed by stream. The streams are read concurrently.
+    Every stream has the response POST /streams gives with cursor pagination, with the cursor of
+     its next page in bodyNextPage, or a message if it has no data in the range.
+
+    Expected application/json:
+    {
+        "streams": [string],
+        // Mandatory, allowed values can be requested with GET method on /streams
+        "startDatetime": datetime,
+        // Optional, default "1900-01-01T00:00:00", has to be in isoformat
+        "endDatetime": datetime,
+        // Optional, default "2999-01-01T00:00:00", has to be in isoformat
+        "minimumItemsPerPage": int,
+        // Optional, default 10_000, per stream
+        "columns": [string],
+        // Optional, default all columns, as for POST on /streams
+        "valueFormat": string,
+        // Optional, default "string", "string" or "typed" as for POST on /streams
+    }
+    """
+    data = request.get_json()
+    streams = get_streams(data)
+    start_datetime, end_datetime = get_range(data)
+    columns = get_columns(data)
+    value_format = get_value_format(data)
+    if value_format == "binary":
+        return abort(Response("valueFormat binary can't be used for several streams", 400))
+    minimum_items_per_page = data.get("minimumItemsPerPage", 10_000)
+
+    with metrics.timer("batch"):
+        stream_data = get_batch(
+            streams,
+            start_datetime,
+            end_datetime,
+            minimum_items_per_page,
+            columns,
+            value_format,
+        )
+    with metrics.timer("serialize"):
+        return jsonify(
+            {
+                "metadata": {
+                    "streams": list(stream_data),
+                    "startDatetime": start_datetime.isoformat(),
+                    "endDatetime": end_datetime.isoformat(),
+                    "minumumItemsPerPage": minimum_items_per_page,
+                    "columns": columns,
+                },
+                "streams": stream_data,
+            }
+        )
+
+
+@api.route("/downsample", methods=["POST"])
+def downsample_stream():
+    """
+    Returns the data of a stream reduced to a limited number of points, for charts that don't
+     need every raw row.
+    Every numeric column is either aggregated per time bucket, returning the start of each
+     non-empty bucket and the min, mean, max and last value per column, or reduced to at most
+     maxPoints points per column by Largest-Triangle-Three-Buckets selection.
+
+    Expected application/json:
+    {
+        "stream": string,
+        // Mandatory, allowed values can be requested with GET method on /streams
+        "startDatetime": datetime,
+        // Optional, default "1900-01-01T00:00:00", has to be in isoformat
+        "endDatetime": datetime,
+        // Optional, default "2999-01-01T00:00:00", has to be in isoformat
+        "bucketSeconds": number,
+        // Either this or maxPoints is mandatory, width of the time buckets
+        "maxPoints": int,
+        // Either this or bucketSeconds is mandatory, maximum number of points per column
+        "valueFormat": string,
+        // Optional, default "string" returns the datetimes in isoformat. "typed" returns them in
+        //  epoch milliseconds with the UTC offset of the datetimes in seconds as
+        //  metadata.utcOffset. "binary" is only available with bucketSeconds and returns the
+        //  buckets as application/octet-stream packed as in column_format.py, with Datetime and a
+        //  <column>.<aggregate> array per aggregate, and the rest of the response under
+        //  "response" in the header.
+    }
+    """
+    data = request.get_json()
+    stream, start_datetime, end_datetime = get_stream_and_range(data)
+
+    bucket_seconds = data.get("bucketSeconds")
+    max_points = data.get("maxPoints")
+    if (bucket_seconds is None) == (max_points is None):
+        return abort(Response("Expected exactly one of: bucketSeconds, maxPoints", 400))
     try:
-        start_datetime = datetime.fromisoformat(start_datetime)
-    except ValueError:
+        if bucket_seconds is not None:
+            bucket_seconds = float(bucket_seconds)
+            if bucket_seconds <= 0:
+                raise ValueError
+        else:
+            max_points = int(max_points)
+            if max_points <= 0:
+                raise ValueError
+    except (TypeError, ValueError):
         return abort(
-            Response(
-                "Invalid start datetime, please use isoformat date or datetime.", 400
-            )
+            Response("bucketSeconds and maxPoints need to be positive numbers", 400)
         )
+    value_format = get_value_format(data)
+    if value_format == "binary" and bucket_seconds is None:
+        return abort(Response("valueFormat binary can only be used with bucketSeconds", 400))
 
-    end_datetime = data.get("endDatetime", "2999-01-01T00:00:00")
+    with metrics.timer("downsample"):
+        downsampled_data = downsample(
+            stream, start_datetime, end_datetime, bucket_seconds, max_points, value_format
+        )
+    if isinstance(downsampled_data, bytes):
+        return Response(downsampled_data, mimetype=BINARY_MIMETYPE)
+    if "message" in downsampled_data:
+        return abort(Response(downsampled_data["message"], 400))
+    with metrics.timer("serialize"):
+        return jsonify(downsampled_data)
+
+
+@api.route("/align", methods=["POST"])
+def align():
+    """
+    Returns several streams resampled onto one time grid, as a single table with the grid as
+     Datetime and a <stream>.<column> column per numeric column of every stream.
+    The grid has a point every stepSeconds, aligned to multiples of it since the epoch, between
+     the start and end datetimes (inclusive) as far as the streams have data. Streams without
+     data in the range are left out.
+
+    Expected application/json:
+    {
+        "streams": [string],
+        // Mandatory, allowed values can be requested with GET method on /streams
+        "startDatetime": datetime,
+        // Optional, default "1900-01-01T00:00:00", has to be in isoformat
+        "endDatetime": datetime,
+        // Optional, default "2999-01-01T00:00:00", has to be in isoformat
+        "stepSeconds": number,
+        // Mandatory, the time between two points of the grid
+        "method": string,
+        // Optional, default "ffill" takes the last value at or before a point, "linear"
+        //  interpolates between the values around it
+        "maxGapSeconds": number,
+        // Optional, default no limit, points in a gap of more than this between two rows of a
+        //  stream get no value for it instead of a filled or interpolated one
+        "columns": [string],
+        // Optional, default all columns, the columns of every stream as for POST on /streams
+        "responseFormat": string,
+        // Optional, default "json", "ndjson" streams the table as newline delimited JSON, with
+        //  the metadata on the first line and a chunk of at most an hour of the grid per line
+        //  after, it has no limit on the number of points.
+        "valueFormat": string,
+        // Optional, default "typed" returns the values as numbers, null where a stream has no
+        //  value, with Datetime in epoch milliseconds and the UTC offset of the datetimes of the
+        //  first stream in seconds as metadata.utcOffset. "binary" returns the table as
+        //  application/octet-stream packed as in column_format.py, NaN where a stream has no
+        //  value, with the rest of the response under "response" in the header.
+    }
+    """
+    data = request.get_json()
+    streams = get_streams(data)
+    start_datetime, end_datetime = get_range(data)
     try:
-        end_datetime = datetime.fromisoformat(end_datetime)
-    except ValueError:
+        step_seconds = float(data["stepSeconds"])
+        max_gap_seconds = data.get("maxGapSeconds")
+        if max_gap_seconds is not None:
+            max_gap_seconds = float(max_gap_seconds)
+        if step_seconds <= 0 or (max_gap_seconds is not None and max_gap_seconds <= 0):
+            raise ValueError
+    except KeyError:
+        return abort(Response("Missing key: stepSeconds", 400))
+    except (TypeError, ValueError):
         return abort(
-            Response(
-                "Invalid end datetime, please use isoformat date or datetime.", 400
-            )
+            Response("stepSeconds and maxGapSeconds need to be positive numbers", 400)
         )
+    method = data.get("method", "ffill")
+    if method not in ALIGN_METHODS:
+        return abort(Response(f"Invalid value for method: {method}", 400))
+    response_format = data.get("responseFormat", "json")
+    if response_format not in ("json", "ndjson"):
+        return abort(Response(f"Invalid value for responseFormat: {response_format}", 400))
+    value_format = data.get("valueFormat", "typed")
+    if value_format not in ("typed", "binary"):
+        return abort(Response(f"Invalid value for valueFormat: {value_format}", 400))
+    if value_format == "binary" and response_format == "ndjson":
+        return abort(Response("valueFormat binary can't be combined with ndjson", 400))
 
-    if end_datetime <= start_datetime:
+    with metrics.timer("files"):
+        alignment = Alignment(
+            streams,
+            start_datetime,
+            end_datetime,
+            step_seconds,
+            method,
+            get_columns(data),
+            max_gap_seconds,
+        )
+    if response_format == "ndjson":
+        lines = alignment.iter_ndjson()
+        if isinstance(lines, dict):
+            return abort(Response(lines["message"], 400))
+        return Response(metrics.iter_labelled(lines), mimetype="application/x-ndjson")
+    if alignment.points > ALIGN_MAX_POINTS:
         return abort(
             Response(
-                f"Invalid datetime range startDatetime={start_datetime.isoformat()} \
-endDatetime={end_datetime.isoformat()}\n\
-Please enter a valid datetime range with an endDatetime after the startDatetime",
+                f"The grid has {alignment.points} points, more than the maximum of \
+{ALIGN_MAX_POINTS}, please use a larger stepSeconds, a smaller range or responseFormat ndjson",
                 400,
             )
         )
 
-    minimum_items_per_page = data.get("minimumItemsPerPage", 10_000)
-    pagination = Pagination(
-        stream=stream,
-        start_datetime=start_datetime,
-        end_datetime=end_datetime,
-        minimum_items_per_page=minimum_items_per_page,
-    )
+    with metrics.timer("align"):
+        aligned_data = alignment.get_data(value_format)
+    if isinstance(aligned_data, bytes):
+        return Response(aligned_data, mimetype=BINARY_MIMETYPE)
+    if "message" in aligned_data:
+        return abort(Response(aligned_data["message"], 400))
+    with metrics.timer("serialize"):
+        return jsonify(aligned_data)
 
-    print(data)
-    pageinated_data = pagination.get_data(requested_page=page_number)
-    if "message" in pageinated_data:
-        return abort(Response(pageinated_data["message"], 400))
-    return jsonify(pagination.get_data(requested_page=page_number))
+
+@api.route("/tail", methods=["POST"])
+def tail():
+    """
+    Returns the rows of a stream with a timestamp after a high-water mark, for clients that only
+     need what was added since their last request.
+
+    Expected application/json:
+    {
+        "stream": string,
+        // Mandatory, allowed values can be requested with GET method on /streams
+        "since": datetime,
+        // Mandatory, has to be in isoformat, usually the highWaterMark of the previous response
+        "valueFormat": string,
+        // Optional, default "string", "typed" or "binary" as for POST on /streams
+    }
+    """
+    data = request.get_json()
+    stream = data.get("stream")
+    if stream is None:
+        return abort(Response("Missing key: stream", 400))
+    if stream not in get_available_streams():
+        return abort(Response("Invalid stream", 400))
+    try:
+        since = datetime.fromisoformat(data["since"])
+    except KeyError:
+        return abort(Response("Missing key: since", 400))
+    except (TypeError, ValueError):
+        return abort(Response("Invalid since, please use isoformat date or datetime.", 400))
+
+    value_format = get_value_format(data)
+
+    with metrics.timer("read"):
+        tail_data = get_tail_reader(stream).read_since(since)
+    return_value = {
+        "metadata": {
+            "stream": stream,
+            "since": since.isoformat(),
+            "highWaterMark": tail_data["Datetime"][-1]
+            if tail_data.get("Datetime")
+            else since.isoformat(),
+        }
+    }
+    with metrics.timer("serialize"):
+        if value_format == "string":
+            return_value["data"] = tail_data
+            return jsonify(return_value)
+        arrays = typed_arrays(arrays_from_strings(tail_data))
+        if value_format == "binary":
+            return Response(encode_binary(return_value, arrays), mimetype=BINARY_MIMETYPE)
+        return_value["data"] = to_lists(arrays)
+        return jsonify(return_value)
+
+
+@api.route("/push")
+def push():
+    """
+    Streams the rows appended to a stream as server-sent events, for clients that want new data
+     as soon as it is written instead of polling for it.
+    Every "rows" event holds the new rows in the same format as the data of /tail, and has the
+     timestamp of its last row as event id. A "gap" event means the connection fell too far behind
+     and rows were skipped, the client should refetch from its last event id.
+
+    Expected query parameters:
+     - stream: Mandatory, allowed values can be requested with GET method on /streams
+     - since: Optional, isoformat datetime, rows after it that were written before the connection
+        was made are sent first. The Last-Event-ID header of a reconnecting client takes
+        precedence.
+    """
+    stream = request.args.get("stream")
+    if stream is None:
+        return abort(Response("Missing key: stream", 400))
+    if stream not in get_available_streams():
+        return abort(Response("Invalid stream", 400))
+    since = request.headers.get("Last-Event-ID", request.args.get("since"))
+    if since is not None:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return abort(
+                Response("Invalid since, please use isoformat date or datetime.", 400)
+            )
+
+    publisher = get_publisher(stream)
+
+    def generate():
+        # Subscribing in the generator and unsubscribing in its finally means a client that
+        #  disconnects at any point, or a read that fails, can't leave the subscriber behind.
+        sequence, high_water_mark = publisher.subscribe()
+        try:
+            if since is not None and high_water_mark is not None and since < high_water_mark:
+                # Rows after the high-water mark are sent as events by the publisher.
+                catch_up = rows_until(
+                    get_tail_reader(stream).read_since(since), high_water_mark
+                )
+                if catch_up.get("Datetime"):
+                    yield format_event(
+                        "rows",
+                        {"stream": stream, "data": catch_up},
+                        event_id=catch_up["Datetime"][-1],
+                    )
+            yield from publisher.iter_events(sequence)
+        finally:
+            publisher.unsubscribe()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
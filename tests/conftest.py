@@ -0,0 +1,10 @@
+"""
+Points the apps at temporary directories before constants is imported, so the tests never touch
+ the configured streams or the application data.
+"""
+
+import os
+import tempfile
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="loggerdash-test-streams-")
+os.environ["APP_DATA_DIR"] = tempfile.mkdtemp(prefix="loggerdash-test-data-")
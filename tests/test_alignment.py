@@ -0,0 +1,75 @@
+"""
+Tests resampling streams onto a shared time grid.
+"""
+
+import datetime
+
+import pytest
+
+from constants import DATA_DIR
+from temperature_api.api.alignment import Alignment
+
+HOUR = datetime.datetime(2026, 10, 16, 3)
+
+
+def write_rows(stream: str, rows: dict) -> None:
+    """
+    Writes a file for HOUR with a Temperature per second after the start of the hour.
+    """
+    directory = DATA_DIR / stream
+    directory.mkdir(parents=True, exist_ok=True)
+    lines = ["Datetime,Temperature"] + [
+        f"{(HOUR + datetime.timedelta(seconds=second)).isoformat()},{value}"
+        for second, value in rows.items()
+    ]
+    (directory / f"{stream}_{HOUR.isoformat().replace(':', '.')}.csv").write_text(
+        "\n".join(lines) + "\n", encoding="utf-8"
+    )
+
+
+def align(streams: list, method: str, max_gap_seconds=None) -> dict:
+    """
+    Returns the data of the first minute of HOUR on a grid of 5 seconds.
+    """
+    return Alignment(
+        streams,
+        HOUR,
+        HOUR + datetime.timedelta(minutes=1),
+        5,
+        method,
+        max_gap_seconds=max_gap_seconds,
+    ).get_data()["data"]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def streams():
+    write_rows("aligned-a", {0: 0, 10: 10, 20: 20, 60: 60})
+    write_rows("aligned-b", {7: 1.5, 37: 7.5})
+
+
+def test_forward_fill():
+    data = align(["aligned-a", "aligned-b"], "ffill")
+    assert len(data["Datetime"]) == 13
+    assert data["Datetime"][1] - data["Datetime"][0] == 5000
+    assert data["aligned-a.Temperature"] == [0, 0, 10, 10, 20, 20, 20, 20, 20, 20, 20, 20, 60]
+    assert data["aligned-b.Temperature"] == [None, None, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5] + [7.5] * 5
+
+
+def test_linear():
+    data = align(["aligned-a", "aligned-b"], "linear")
+    assert data["aligned-a.Temperature"] == [0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
+    # Points after the last row of a stream have nothing to interpolate towards.
+    assert data["aligned-b.Temperature"] == pytest.approx(
+        [None, None, 2.1, 3.1, 4.1, 5.1, 6.1, 7.1, None, None, None, None, None]
+    )
+
+
+def test_gaps_longer_than_max_gap_stay_empty():
+    ffill = align(["aligned-a"], "ffill", max_gap_seconds=15)
+    assert ffill["aligned-a.Temperature"] == [
+        0, 0, 10, 10, 20, 20, 20, 20, None, None, None, None, 60
+    ]
+    linear = align(["aligned-a"], "linear", max_gap_seconds=15)
+    assert linear["aligned-a.Temperature"] == [
+        0, 5, 10, 15, 20, None, None, None, None, None, None, None, 60
+    ]
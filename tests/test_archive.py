@@ -0,0 +1,115 @@
+"""
+Tests archiving the hourly files of a stream into bundles.
+"""
+
+import datetime
+import zipfile
+
+import pytest
+
+from constants import DATA_DIR
+from temperature_api.api import archive
+from temperature_api.api.archive import archive_stream, write_bundle
+from temperature_api.api.pagination import Pagination, load_pagination
+
+# A day of files and the first hour of the next one, which is never archived as it's the newest.
+START = datetime.datetime(2020, 1, 1)
+HOURS = 25
+
+
+def write_hours(stream: str, hours: int = HOURS, rows: int = 10) -> None:
+    """
+    Writes hourly files from START with a row every ten seconds.
+    """
+    directory = DATA_DIR / stream
+    directory.mkdir(parents=True, exist_ok=True)
+    for hour in range(hours):
+        hour_start = START + datetime.timedelta(hours=hour)
+        lines = ["Datetime,Temperature"] + [
+            f"{(hour_start + datetime.timedelta(seconds=10 * row)).isoformat()},21.50"
+            for row in range(rows)
+        ]
+        (directory / f"{stream}_{hour_start.isoformat().replace(':', '.')}.csv").write_text(
+            "\n".join(lines) + "\n", encoding="utf-8"
+        )
+
+
+def test_archived_files_are_verified_and_removed():
+    write_hours("archived")
+    directory = DATA_DIR / "archived"
+    contents = {path.name: path.read_bytes() for path in directory.glob("*.csv")}
+
+    assert archive_stream("archived", "day", 0) == 24
+    bundle_path = directory / "archived_2020-01-01.zip"
+    with zipfile.ZipFile(bundle_path) as bundle:
+        assert bundle.testzip() is None
+        assert {name: bundle.read(name) for name in bundle.namelist()} == {
+            name: content for name, content in contents.items() if "2020-01-01" in name
+        }
+    assert [path.name for path in directory.glob("*.csv")] == [
+        "archived_2020-01-02T00.00.00.csv"
+    ]
+    assert not list(directory.glob("*.tmp"))
+
+
+def test_file_that_differs_from_its_copy_is_kept():
+    write_hours("differs")
+    directory = DATA_DIR / "differs"
+    changed_path = directory / "differs_2020-01-01T05.00.00.csv"
+    write_bundle(directory / "differs_2020-01-01.zip", [changed_path])
+    with open(changed_path, "a", encoding="utf-8") as file:
+        file.write("2020-01-01T05:59:50,21.60\n")
+
+    assert archive_stream("differs", "day", 0) == 23
+    assert changed_path.exists()
+    assert len(list(directory.glob("*.csv"))) == 2
+
+
+def test_interrupted_archival_is_finished_by_the_next(monkeypatch):
+    write_hours("interrupted")
+    directory = DATA_DIR / "interrupted"
+
+    def fail(*args):
+        raise OSError("Interrupted")
+
+    monkeypatch.setattr(archive.os, "replace", fail)
+    with pytest.raises(OSError):
+        archive_stream("interrupted", "day", 0)
+    monkeypatch.undo()
+    assert not list(directory.glob("*.zip*"))
+    assert len(list(directory.glob("*.csv"))) == HOURS
+
+    # Stopped after the bundle was written, before the files were removed.
+    write_bundle(
+        directory / "interrupted_2020-01-01.zip", sorted(directory.glob("*2020-01-01T*.csv"))
+    )
+    assert archive_stream("interrupted", "day", 0) == 0
+    assert len(list(directory.glob("*.csv"))) == 1
+    with zipfile.ZipFile(directory / "interrupted_2020-01-01.zip") as bundle:
+        assert len(bundle.namelist()) == 24
+
+
+def test_pagination_reads_files_archived_after_it_was_created():
+    write_hours("paginated")
+    arguments = {
+        "stream": "paginated",
+        "start_datetime": START,
+        "end_datetime": START + datetime.timedelta(hours=HOURS),
+        "minimum_items_per_page": 50,
+    }
+    expected = Pagination(**arguments).get_data(1)["data"]
+    pagination = Pagination(**arguments)
+    first_page = pagination.get_data(0)
+
+    archive_stream("paginated", "day", 0)
+    pagination = load_pagination(first_page["bodyNextPage"]["paginationId"])
+    page = pagination.get_data(1)
+    assert page["data"] == expected
+    assert all(
+        item["path"].parent.name == "paginated_2020-01-01.zip" for item in pagination.data[:-1]
+    )
+
+    # Files that are gone altogether can't be served.
+    bundle_path = DATA_DIR / "paginated" / "paginated_2020-01-01.zip"
+    bundle_path.unlink()
+    assert "message" in load_pagination(pagination.id).get_data(2)
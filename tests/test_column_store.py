@@ -0,0 +1,101 @@
+"""
+Tests reading hourly CSV files into columns.
+"""
+
+from constants import DATA_DIR
+from temperature_api import app
+from temperature_api.api.column_store import (
+    compact_file,
+    read_arrays,
+    read_columns,
+    read_csv_fields,
+    read_string_columns,
+)
+
+ROWS = [
+    "2026-10-16T01:00:00,21.50,45.1",
+    "2026-10-16T01:00:10,21.55,45.2",
+    "2026-10-16T01:00:20,21.60,45.0",
+    "2026-10-16T01:00:30,21.70,44.9",
+    "2026-10-16T01:00:40,21.65,44.8",
+]
+
+
+def write_hourly_file(stream: str, partial_line: str):
+    """
+    Writes an hourly file with the rows and a last line that may still be being written.
+    """
+    directory = DATA_DIR / stream
+    directory.mkdir(parents=True, exist_ok=True)
+    file_path = directory / f"{stream}_2026-10-16T01.00.00.csv"
+    file_path.write_text(
+        "\n".join(["Datetime,Temperature,Humidity"] + ROWS) + "\n" + partial_line,
+        encoding="utf-8",
+    )
+    return file_path
+
+
+def test_partial_last_line_is_left_out():
+    file_path = write_hourly_file("partial", "2026-10-16T01:00:50,21.")
+
+    strings = read_string_columns(file_path)
+    assert {name: len(values) for name, values in strings.items()} == {
+        "Datetime": 5,
+        "Temperature": 5,
+        "Humidity": 5,
+    }
+    assert strings["Temperature"] == [row.split(",")[1] for row in ROWS]
+
+    arrays, _ = read_arrays(file_path)
+    assert sorted(arrays) == ["Datetime", "Humidity", "Temperature"]
+    assert all(len(array) == 5 for array in arrays.values())
+
+
+def test_partial_last_line_in_responses():
+    write_hourly_file("partial_api", "2026-10-16T01:00:50,21.75,4")
+    client = app.test_client()
+    body = {"stream": "partial_api", "paginationMode": "cursor"}
+
+    strings = client.post("/api/streams", json=body).get_json()["data"]
+    assert {name: len(values) for name, values in strings.items()} == {
+        "Datetime": 5,
+        "Temperature": 5,
+        "Humidity": 5,
+    }
+
+    typed = client.post("/api/streams", json={**body, "valueFormat": "typed"}).get_json()
+    assert sorted(typed["data"]) == ["Datetime", "Humidity", "Temperature"]
+    assert typed["data"]["Humidity"] == [45.1, 45.2, 45.0, 44.9, 44.8]
+
+
+def test_compacted_file_keeps_string_values():
+    file_path = write_hourly_file("compacted", "")
+    assert compact_file(file_path)
+    assert read_columns(file_path) is not None
+
+    strings = read_string_columns(file_path)
+    assert strings["Temperature"] == ["21.50", "21.55", "21.60", "21.70", "21.65"]
+    assert strings["Datetime"] == [row.split(",")[0] for row in ROWS]
+
+    arrays, _ = read_arrays(file_path)
+    assert arrays["Temperature"].tolist() == [21.5, 21.55, 21.6, 21.7, 21.65]
+
+
+def test_only_selected_columns_are_read():
+    file_path = write_hourly_file("selected", "2026-10-16T01:00:50,21.75,4")
+    with open(file_path, "a", encoding="utf-8") as file:
+        # A complete line that lacks a field is left out as well.
+        file.write("4.7\n2026-10-16T01:01:00,21.80\n")
+
+    names, values = read_csv_fields(file_path, ["Humidity"])
+    assert names == ["Datetime", "Humidity"]
+    assert list(values[0]) == [row.split(",")[0] for row in ROWS] + ["2026-10-16T01:00:50"]
+    assert list(values[1]) == ["45.1", "45.2", "45.0", "44.9", "44.8", "44.7"]
+
+    names, values = read_csv_fields(file_path, [])
+    assert names == ["Datetime"]
+    assert len(values[0]) == 6
+
+    names, values = read_csv_fields(file_path)
+    assert names == ["Datetime", "Temperature", "Humidity"]
+    assert [len(column) for column in values] == [6, 6, 6]
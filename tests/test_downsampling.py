@@ -0,0 +1,61 @@
+"""
+Tests selecting points with Largest-Triangle-Three-Buckets.
+"""
+
+import numpy as np
+import pytest
+
+from temperature_api.api.downsampling import lttb
+
+
+def series(length: int):
+    """
+    Returns the timestamps and values of a noisy sine wave with a row every 10 seconds.
+    """
+    timestamps = np.arange(length, dtype=np.int64) * 10_000_000
+    values = np.sin(np.arange(length) / 25) + np.random.default_rng(length).normal(0, 0.1, length)
+    return timestamps, values
+
+
+@pytest.mark.parametrize("length, max_points", [(1000, 3), (1000, 100), (1000, 999), (7, 6)])
+def test_selects_max_points_including_first_and_last(length, max_points):
+    timestamps, values = series(length)
+    indices = lttb(timestamps, values, max_points)
+    assert len(indices) == max_points
+    assert indices[0] == 0
+    assert indices[-1] == length - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_keeps_the_peaks():
+    timestamps = np.arange(100, dtype=np.int64)
+    values = np.zeros(100)
+    values[37] = 5
+    values[71] = -5
+    assert {37, 71} <= set(lttb(timestamps, values, 10).tolist())
+
+
+@pytest.mark.parametrize("max_points", [10, 11, 50])
+def test_shorter_series_are_returned_as_they_are(max_points):
+    timestamps, values = series(10)
+    np.testing.assert_array_equal(lttb(timestamps, values, max_points), np.arange(10))
+
+
+def test_missing_values_are_skipped():
+    timestamps = np.arange(100, dtype=np.int64)
+    values = np.zeros(100)
+    values[37] = 5
+    values[71] = -5
+    values[[0, 40, 41, 55]] = np.nan
+    indices = lttb(timestamps, values, 10)
+    assert len(indices) == 10
+    assert indices[0] == 1
+    assert indices[-1] == 99
+    assert not np.isnan(values[indices]).any()
+    assert {37, 71} <= set(indices.tolist())
+
+
+def test_empty_columns():
+    timestamps, _ = series(50)
+    assert len(lttb(timestamps, np.full(50, np.nan), 10)) == 0
+    assert len(lttb(timestamps[:0], np.empty(0), 10)) == 0
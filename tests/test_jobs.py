@@ -0,0 +1,104 @@
+"""
+Tests running admin operations as jobs and reading their logs.
+"""
+
+import threading
+import time
+
+import pytest
+
+from admin_api.api import jobs
+from admin_api.api.jobs import get_job, log_path, read_log, submit_job
+
+TEXT = "pulled €5 ✓ done\n"
+
+
+@pytest.fixture(autouse=True)
+def job_log_folder(tmp_path, monkeypatch):
+    """
+    Writes the logs of the jobs to a folder that doesn't exist yet.
+    """
+    folder = tmp_path / "jobs"
+    monkeypatch.setattr(jobs, "JOB_LOG_FOLDER", folder)
+    return folder
+
+
+def write_log(job_id: str, content: bytes, status: str = "succeeded") -> dict:
+    """
+    Writes the log of a job and returns the job.
+    """
+    log_path(job_id).parent.mkdir(parents=True, exist_ok=True)
+    log_path(job_id).write_bytes(content)
+    return {"jobId": job_id, "status": status}
+
+
+def follow_log(job: dict, limit: int) -> list:
+    """
+    Reads the whole log of a job in parts of limit bytes, returning the parts.
+    """
+    parts = [read_log(job, 0, limit)]
+    while not parts[-1]["complete"]:
+        assert parts[-1]["nextOffset"] > parts[-1]["offset"]
+        parts.append(read_log(job, parts[-1]["nextOffset"], limit))
+    return parts
+
+
+def test_characters_split_by_a_part_are_returned_with_the_next():
+    job = write_log("split", TEXT.encode())
+    first = read_log(job, 0, 9)
+    # The € starts at byte 7 and takes three bytes.
+    assert first["data"] == "pulled "
+    assert first["nextOffset"] == 7
+    assert read_log(job, 7, 9)["data"] == "€5 ✓ "
+
+    for limit in (4, 5, 9, 1000):
+        assert "".join(part["data"] for part in follow_log(job, limit)) == TEXT
+
+
+@pytest.mark.parametrize("limit", [0, 1, 2, 3])
+def test_small_limits_still_advance(limit):
+    job = write_log(f"small-{limit}", "€€€".encode())
+    parts = follow_log(job, limit)
+    assert [part["data"] for part in parts] == ["€", "€", "€"]
+
+
+def test_unfinished_character_of_running_job_is_held_back():
+    job = write_log("running", "done €".encode()[:-1], status="running")
+    part = read_log(job, 0, 100)
+    assert part["data"] == "done "
+    assert part["nextOffset"] == 5
+    assert not part["complete"]
+
+
+def test_operation_is_started_once_at_a_time(monkeypatch, job_log_folder):
+    started = threading.Event()
+    release = threading.Event()
+
+    def wait(log_file) -> int:
+        started.set()
+        release.wait(5)
+        log_file.write(b"waited\n")
+        return 0
+
+    monkeypatch.setitem(jobs.OPERATIONS, "wait", wait)
+    job = submit_job("wait")
+    assert job_log_folder.is_dir()
+    started.wait(5)
+    assert submit_job("wait")["jobId"] == job["jobId"]
+
+    release.set()
+    assert read_log(wait_for_job(job["jobId"]))["data"] == "waited\n"
+    next_job = submit_job("wait")
+    assert next_job["jobId"] != job["jobId"]
+    wait_for_job(next_job["jobId"])
+
+
+def wait_for_job(job_id: str, timeout: float = 5) -> dict:
+    """
+    Waits for a job to finish and returns it.
+    """
+    deadline = time.monotonic() + timeout
+    while (job := get_job(job_id))["status"] in jobs.UNFINISHED_STATUSES:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return job
@@ -0,0 +1,41 @@
+"""
+Tests the request metrics of the temperature API.
+"""
+
+from constants import DATA_DIR
+from temperature_api import app
+from temperature_api.api.metrics import metrics
+
+
+def request_count(endpoint: str) -> int:
+    """
+    Returns the number of requests to an endpoint recorded in the request duration histogram.
+    """
+    return sum(
+        count
+        for (label_endpoint, _), (_, _, count) in metrics.request_seconds.samples.items()
+        if label_endpoint == endpoint
+    )
+
+
+def test_streamed_response_recorded_once_sent():
+    directory = DATA_DIR / "metered"
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "metered_2026-10-16T01.00.00.csv").write_text(
+        "Datetime,Temperature\n2026-10-16T01:00:00,21.50\n2026-10-16T01:00:10,21.55\n",
+        encoding="utf-8",
+    )
+    before = request_count("streams")
+    response = app.test_client().post(
+        "/api/streams",
+        json={"stream": "metered", "responseFormat": "ndjson"},
+        buffered=False,
+    )
+    assert response.is_streamed
+    # The body hasn't been generated yet.
+    assert request_count("streams") == before
+
+    lines = b"".join(response.response).splitlines()
+    response.close()
+    assert len(lines) == 2
+    assert request_count("streams") == before + 1
@@ -0,0 +1,116 @@
+"""
+Tests planning the pages of a stream.
+"""
+
+import base64
+import datetime
+
+import pytest
+
+from constants import DATA_DIR
+from temperature_api import app
+from temperature_api.api import file_index
+from temperature_api.api.cursor import CursorPagination
+from temperature_api.api.pagination import Pagination
+
+
+def write_hours(stream: str, hours: int, rows: int = 10) -> None:
+    """
+    Writes hourly files with a row every ten seconds, the first hour has one more row than the
+     next and so on, so pages end at different files.
+    """
+    directory = DATA_DIR / stream
+    directory.mkdir(parents=True, exist_ok=True)
+    start = datetime.datetime(2026, 10, 16)
+    for hour in range(hours):
+        hour_start = start + datetime.timedelta(hours=hour)
+        lines = ["Datetime,Temperature"] + [
+            f"{(hour_start + datetime.timedelta(seconds=10 * row)).isoformat()},21.50"
+            for row in range(rows + hour % 3)
+        ]
+        (directory / f"{stream}_{hour_start.isoformat().replace(':', '.')}.csv").write_text(
+            "\n".join(lines) + "\n", encoding="utf-8"
+        )
+
+
+def test_only_files_of_first_page_are_checked(monkeypatch):
+    write_hours("planned", 24)
+    arguments = {
+        "stream": "planned",
+        "start_datetime": datetime.datetime(2026, 10, 16),
+        "end_datetime": datetime.datetime(2026, 10, 17),
+        "minimum_items_per_page": 25,
+    }
+    # Builds the index, which reads every file once.
+    Pagination(**arguments)
+
+    checked = []
+    stat_file = file_index.stat_file
+    monkeypatch.setattr(
+        file_index, "stat_file", lambda path: checked.append(path.name) or stat_file(path)
+    )
+    pagination = CursorPagination(**arguments)
+    assert len(pagination.data) == 3
+    # The files of the page, and the most recent file that the index refreshes.
+    assert set(checked) <= {item["path"].name for item in pagination.data} | {
+        "planned_2026-10-16T23.00.00.csv"
+    }
+
+    checked.clear()
+    pagination = Pagination(**arguments)
+    assert [item["page"] for item in pagination.data] == [hour // 3 for hour in range(24)]
+    assert len(set(checked)) <= 4
+
+
+def walk_pages(body: dict) -> list:
+    """
+    Requests the first page of a range and every page after it through the API, following
+     bodyNextPage, and returns the pages.
+    """
+    client = app.test_client()
+    pages = [client.post("/api/streams", json=body).get_json()]
+    while "bodyNextPage" in pages[-1]:
+        pages.append(client.post("/api/streams", json=pages[-1]["bodyNextPage"]).get_json())
+    return pages
+
+
+def test_cursor_pages_match_id_pages():
+    write_hours("walked", 30, rows=7)
+    body = {
+        "stream": "walked",
+        "startDatetime": "2026-10-16T02:00:25",
+        "endDatetime": "2026-10-17T04:30:00",
+        "minimumItemsPerPage": 20,
+    }
+    id_pages = walk_pages(body)
+    cursor_pages = walk_pages({**body, "paginationMode": "cursor"})
+    assert len(cursor_pages) == len(id_pages) > 1
+    for cursor_page, id_page in zip(cursor_pages, id_pages):
+        assert cursor_page["data"] == id_page["data"]
+
+    datetimes = [value for page in cursor_pages for value in page["data"]["Datetime"]]
+    assert datetimes == sorted(set(datetimes))
+    assert datetimes[0] == "2026-10-16T02:00:30"
+    # The file of hour 28 has 8 rows.
+    assert datetimes[-1] == "2026-10-17T04:01:10"
+    hours = {value[:13] for value in datetimes}
+    assert len(hours) == 27
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        base64.urlsafe_b64encode(b'{"stream": "walked"}').decode(),
+        base64.urlsafe_b64encode(
+            b'{"stream": "walked", "start": "2026-10-16T00:00:00", "end": "yesterday", '
+            b'"minimumItemsPerPage": 20, "after": "2026-10-16T00:00:00", "page": 1}'
+        ).decode(),
+        ["not", "a", "string"],
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor):
+    response = app.test_client().post("/api/streams", json={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.get_data(as_text=True).startswith("Invalid cursor")
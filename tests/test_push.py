@@ -0,0 +1,80 @@
+"""
+Tests the server-sent events of new rows.
+"""
+
+import datetime
+import json
+import time
+
+from constants import DATA_DIR
+from temperature_api import app
+from temperature_api.api import push
+from temperature_api.api.push import get_publisher
+
+
+def test_subscriber_removed_when_closed_after_first_event():
+    directory = DATA_DIR / "pushed"
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "pushed_2026-10-16T01.00.00.csv").write_text(
+        "Datetime,Temperature\n2026-10-16T01:00:00,21.50\n2026-10-16T01:00:10,21.55\n",
+        encoding="utf-8",
+    )
+    client = app.test_client()
+    response = client.get(
+        "/api/push?stream=pushed&since=2026-10-16T00:00:00", buffered=False
+    )
+    events = iter(response.response)
+
+    first_event = next(events)
+    assert b"event: rows" in first_event
+    assert get_publisher("pushed").subscribers == 1
+
+    response.close()
+    assert get_publisher("pushed").subscribers == 0
+
+
+def test_rows_written_while_idle_are_not_pushed(monkeypatch):
+    monkeypatch.setattr(push, "PUSH_HEARTBEAT_INTERVAL", 0.05)
+    directory = DATA_DIR / "idle"
+    directory.mkdir(parents=True, exist_ok=True)
+    file_path = directory / "idle_2026-10-16T01.00.00.csv"
+    file_path.write_text(
+        "Datetime,Temperature\n2026-10-16T01:00:00,21.50\n2026-10-16T01:00:10,21.55\n",
+        encoding="utf-8",
+    )
+    publisher = get_publisher("idle")
+    publisher.subscribe()
+    publisher.unsubscribe()
+    wait_for(lambda: publisher.thread is None)
+
+    append_row(file_path, "2026-10-16T01:00:20,21.60")
+    sequence, high_water_mark = publisher.subscribe()
+    try:
+        assert high_water_mark == datetime.datetime(2026, 10, 16, 1, 0, 20)
+        # Gives the reader time to start watching the directory.
+        time.sleep(0.2)
+        append_row(file_path, "2026-10-16T01:00:30,21.65")
+        events = publisher.iter_events(sequence, heartbeat=0.05)
+        event = next(event for event in events if event.startswith(b"event: rows"))
+        data = json.loads(event.decode().split("data: ", 1)[1])["data"]
+        assert data["Datetime"] == ["2026-10-16T01:00:30"]
+    finally:
+        publisher.unsubscribe()
+
+
+def append_row(file_path, row: str) -> None:
+    """
+    Appends a row to a CSV file.
+    """
+    with open(file_path, "a", encoding="utf-8") as file:
+        file.write(row + "\n")
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    """
+    Waits until a condition holds, failing the test if it doesn't within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
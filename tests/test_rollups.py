@@ -0,0 +1,91 @@
+"""
+Tests that aggregates built from the rollup tiers match aggregating the raw rows.
+"""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from constants import DATA_DIR
+from temperature_api.api.aggregation import aggregate_buckets
+from temperature_api.api.column_store import load_range
+from temperature_api.api.downsampling import aggregate
+
+START = datetime.datetime(2026, 10, 12)
+
+
+def write_hours(stream: str, first_hour: int, hours: int) -> None:
+    """
+    Writes hourly files from hour first_hour after START with a row every 50 seconds, so buckets
+     have different numbers of rows.
+    """
+    directory = DATA_DIR / stream
+    directory.mkdir(parents=True, exist_ok=True)
+    for hour in range(first_hour, first_hour + hours):
+        hour_start = START + datetime.timedelta(hours=hour)
+        lines = ["Datetime,Temperature,Humidity"]
+        for row in range(72):
+            timestamp = hour_start + datetime.timedelta(seconds=50 * row)
+            minute = hour * 60 + row * 50 / 60
+            lines.append(
+                f"{timestamp.isoformat()},{20 + 3 * np.sin(minute / 97):.2f},"
+                f"{50 + 10 * np.cos(minute / 31):.2f}"
+            )
+        (directory / f"{stream}_{hour_start.isoformat().replace(':', '.')}.csv").write_text(
+            "\n".join(lines) + "\n", encoding="utf-8"
+        )
+
+
+def append_rows(stream: str, hour: int, rows: int) -> None:
+    """
+    Appends rows to the file of an hour after the rows write_hours wrote, one every 10 seconds.
+    """
+    hour_start = START + datetime.timedelta(hours=hour)
+    path = DATA_DIR / stream / f"{stream}_{hour_start.isoformat().replace(':', '.')}.csv"
+    with open(path, "a", encoding="utf-8") as file:
+        for row in range(rows):
+            timestamp = hour_start + datetime.timedelta(seconds=3550 + 10 * (row + 1) / rows)
+            file.write(f"{timestamp.isoformat()},{25 + row:.2f},{60 - row:.2f}\n")
+
+
+def assert_matches_raw(
+    stream: str,
+    start_datetime: datetime.datetime,
+    end_datetime: datetime.datetime,
+    bucket_seconds: int,
+    tier: int,
+) -> None:
+    """
+    Asserts that aggregating a range from the rollups gives the aggregates of the raw rows.
+    """
+    columns, _, used_tier = aggregate(stream, start_datetime, end_datetime, bucket_seconds)
+    assert used_tier == tier
+    raw, _ = load_range(stream, start_datetime, end_datetime)
+    timestamps = raw.pop("Datetime")
+    assert set(columns) == set(raw)
+    for name, values in raw.items():
+        expected = aggregate_buckets(timestamps, values, bucket_seconds * 1_000_000)
+        for key in ("Datetime", "count", "min", "max", "last"):
+            np.testing.assert_array_equal(columns[name][key], expected[key], err_msg=key)
+        np.testing.assert_allclose(columns[name]["sum"], expected["sum"])
+
+
+@pytest.mark.parametrize(
+    "bucket_seconds, tier",
+    [(3600, 3600), (86400, 86400), (120, 60)],
+)
+def test_tiers_match_raw_aggregation(bucket_seconds, tier):
+    stream = f"rollup-{bucket_seconds}"
+    write_hours(stream, 0, 80)
+    # Both edges of the range cut through a bucket of every tier.
+    start_datetime = START + datetime.timedelta(hours=5, minutes=7, seconds=25)
+    end_datetime = START + datetime.timedelta(days=5, hours=13, minutes=3)
+    assert_matches_raw(stream, start_datetime, end_datetime, bucket_seconds, tier)
+
+    # The file that was the most recent one is written to, then closed by the next ones.
+    append_rows(stream, 79, 3)
+    assert_matches_raw(stream, start_datetime, end_datetime, bucket_seconds, tier)
+    write_hours(stream, 80, 30)
+    append_rows(stream, 109, 2)
+    assert_matches_raw(stream, start_datetime, end_datetime, bucket_seconds, tier)
@@ -0,0 +1,99 @@
+"""
+Tests reading the rows appended to the file a stream is writing to.
+"""
+
+import datetime
+import os
+from pathlib import Path
+
+import pytest
+
+from temperature_api.api.tail import TailReader
+
+START = datetime.datetime(2026, 10, 16, 1)
+HEADER = "Datetime,Temperature\n"
+
+
+def rows(first: int, count: int, value: float = 21.5) -> str:
+    """
+    Returns CSV rows every ten seconds from first * 10 seconds after START.
+    """
+    return "".join(
+        f"{(START + datetime.timedelta(seconds=10 * row)).isoformat()},{value + row / 100:.2f}\n"
+        for row in range(first, first + count)
+    )
+
+
+def at(row: int) -> datetime.datetime:
+    """
+    Returns the timestamp of a row that rows writes.
+    """
+    return START + datetime.timedelta(seconds=10 * row)
+
+
+@pytest.fixture
+def file_path(tmp_path) -> Path:
+    """
+    Returns a file with a header and five rows.
+    """
+    path = tmp_path / "tailed_2026-10-16T01.00.00.csv"
+    path.write_text(HEADER + rows(0, 5), encoding="utf-8")
+    return path
+
+
+def append(file_path: Path, text: str) -> None:
+    """
+    Appends text to a file.
+    """
+    with open(file_path, "a", encoding="utf-8") as file:
+        file.write(text)
+
+
+def test_only_appended_rows_are_read(file_path):
+    reader = TailReader("tailed")
+    data = reader.read_appended(file_path, START - datetime.timedelta(seconds=1))
+    assert len(data["Datetime"]) == 5
+    append(file_path, rows(5, 3))
+    data = reader.read_appended(file_path, at(4))
+    assert data["Datetime"] == [at(row).isoformat() for row in range(5, 8)]
+    assert data["Temperature"] == ["21.55", "21.56", "21.57"]
+    # Older timestamps are read from an earlier checkpoint.
+    assert reader.read_appended(file_path, at(2))["Datetime"] == [
+        at(row).isoformat() for row in range(3, 8)
+    ]
+    assert reader.read_appended(file_path, at(7)) == {}
+
+
+def test_row_still_being_written_is_read_once_complete(file_path):
+    reader = TailReader("tailed")
+    reader.read_appended(file_path, at(4))
+    line = rows(5, 1)
+    append(file_path, line[:12])
+    assert reader.read_appended(file_path, at(4)) == {}
+    append(file_path, line[12:])
+    assert reader.read_appended(file_path, at(4))["Datetime"] == [at(5).isoformat()]
+
+
+def test_replaced_file_is_read_from_its_start(file_path):
+    reader = TailReader("tailed")
+    reader.read_appended(file_path, at(0))
+    replacement = file_path.with_suffix(".tmp")
+    replacement.write_text(
+        "Datetime,Temperature,Humidity\n"
+        + "".join(f"{at(row).isoformat()},20.0{row},5{row}\n" for row in range(8)),
+        encoding="utf-8",
+    )
+    os.replace(replacement, file_path)
+    data = reader.read_appended(file_path, at(3))
+    assert data["Datetime"] == [at(row).isoformat() for row in range(4, 8)]
+    assert data["Humidity"] == ["54", "55", "56", "57"]
+
+
+def test_truncated_file_is_read_from_its_start(file_path):
+    reader = TailReader("tailed")
+    reader.read_appended(file_path, at(0))
+    file_path.write_text(HEADER + rows(0, 2, 19.0), encoding="utf-8")
+    data = reader.read_appended(file_path, START - datetime.timedelta(seconds=1))
+    assert data["Temperature"] == ["19.00", "19.01"]
+    append(file_path, rows(2, 1, 19.0))
+    assert reader.read_appended(file_path, at(1))["Temperature"] == ["19.02"]